@@ -0,0 +1,265 @@
+import sqlite3
+
+import numpy as np
+
+from db import database_path
+
+from sidecar import has_sidecar
+from sidecar import attach_sidecar
+from sidecar import SIDECAR_DIR
+from sidecar import PRIMARY_KEYS
+from sidecar import ACTIVITY_TABLES
+from sidecar import get_meta
+from sidecar import set_meta
+from sidecar import update_sidecar_tables
+
+from utils import bucket_width
+
+from diagnostics import record_rows
+
+
+ACTIVITY_SCHEMA = "activity"
+ACTIVITY_BUCKETS = 200
+ACTIVITY_CHUNK_ROWS = 1_000_000
+
+# Log records of each process and thread in buckets of `width` seconds. The
+# primary key can't be NULL, records without the process or the thread (with
+# `logging.logProcesses` or `logging.logThreads` off) go to 0.
+_aggregate_sql = (
+    "SELECT ? AS width, ifnull(process, 0) AS process, "
+    "ifnull(thread, 0) AS thread, CAST(created / ? AS INTEGER) AS bucket, "
+    "count(*) AS count, min(created) AS first_created, "
+    "max(created) AS last_created, max(processName) AS process_name, "
+    "max(threadName) AS thread_name FROM {source} WHERE {where} "
+    "GROUP BY process, thread, bucket"
+)
+
+
+class Activity:
+    """
+    Log records of the threads (the lanes) in buckets of `width` seconds.
+
+    `lanes` are `(process, process name, thread, thread name)`, with the
+    number of the `records`, the time of the `first` and the `last` one and the
+    `longest_gap` between two of them in arrays of the same order. The buckets
+    with any records of lane `i` are `buckets[starts[i]:starts[i + 1]]`, the
+    numbers of the records in them in `counts`.
+    """
+
+    __slots__ = (
+        "width",
+        "lanes",
+        "records",
+        "first",
+        "last",
+        "longest_gap",
+        "starts",
+        "buckets",
+        "counts",
+    )
+
+    def __init__(
+        self, width, lanes, records, first, last, longest_gap, starts, buckets, counts
+    ):
+        self.width = width
+        self.lanes = lanes
+        self.records = records
+        self.first = first
+        self.last = last
+        self.longest_gap = longest_gap
+        self.starts = starts
+        self.buckets = buckets
+        self.counts = counts
+
+    def lane_buckets(self, lane):
+        """`(buckets, counts)` of the lane with index `lane`."""
+        start, end = self.starts[lane], self.starts[lane + 1]
+
+        return self.buckets[start:end], self.counts[start:end]
+
+
+def attach_activity(db):
+    """
+    Build (or update) the activity of the threads of the result file opened as
+    `db` and attach it as `activity`. The first call on a big file may take a
+    while, the following ones only add the records logged since.
+    """
+    sidecar_path = update_activity(database_path(db))
+
+    if not has_sidecar(db, ACTIVITY_SCHEMA):
+        attach_sidecar(db, sidecar_path, ACTIVITY_SCHEMA)
+
+
+def update_activity(sqlite_path, sidecar_dir=SIDECAR_DIR):
+    """Count the log records stored since the last update, per thread."""
+    return update_sidecar_tables(
+        sqlite_path, ACTIVITY_TABLES, _update_activity_tables, sidecar_dir
+    )
+
+
+def read_activity(db):
+    """
+    `Activity` of all the threads which logged, in about `ACTIVITY_BUCKETS`
+    buckets over the time of the logs.
+    """
+    try:
+        attach_activity(db)
+    except (OSError, sqlite3.Error):
+        pass  # the cache isn't writable, the logs are aggregated every time
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    if has_sidecar(db, ACTIVITY_SCHEMA):
+        cursor.execute(
+            f"SELECT value FROM {ACTIVITY_SCHEMA}.Meta "
+            "WHERE key = 'LogsActivity.width'"
+        )
+        row = cursor.fetchone()
+        width = row[0] if row else 1
+        source = f"{ACTIVITY_SCHEMA}.LogsActivity WHERE width = ?"
+        parameters = [width]
+    else:
+        cursor.execute("SELECT min(created), max(created) FROM Logs")
+        created_min, created_max = cursor.fetchone()
+        width = bucket_width((created_max or 0) - (created_min or 0), ACTIVITY_BUCKETS)
+        source = "(" + _aggregate_sql.format(source="Logs", where="1") + ")"
+        parameters = [width, width]
+
+    cursor.execute(
+        "SELECT process, thread, bucket, count, first_created, last_created, "
+        f"process_name, thread_name FROM {source} "
+        "ORDER BY process, thread, bucket",
+        parameters,
+    )
+    rows = cursor.fetchall()
+    record_rows(len(rows))
+
+    return _activity_from_rows(width, rows)
+
+
+def _activity_from_rows(width, rows):
+    if not rows:
+        no_lanes = np.zeros(0)
+        no_buckets = np.zeros(0, dtype=np.int64)
+        return Activity(
+            width,
+            [],
+            no_lanes,
+            no_lanes,
+            no_lanes,
+            no_lanes,
+            [0],
+            no_buckets,
+            no_buckets,
+        )
+
+    columns = list(zip(*rows))
+    processes, threads, buckets, counts = (
+        np.array(column, dtype=np.int64) for column in columns[:4]
+    )
+    firsts, lasts = (np.array(column, dtype=np.float64) for column in columns[4:6])
+    process_names, thread_names = columns[6:]
+
+    is_first = np.ones(len(rows), dtype=bool)
+    is_first[1:] = (processes[1:] != processes[:-1]) | (threads[1:] != threads[:-1])
+    starts = np.flatnonzero(is_first)
+    ends = np.append(starts[1:], len(rows))
+
+    # gaps within a bucket aren't seen, they are shorter than the width anyway
+    gaps = np.zeros(len(rows))
+    gaps[1:] = firsts[1:] - lasts[:-1]
+    gaps[is_first] = 0
+
+    # the names of the last bucket, the threads may be renamed
+    lanes = [
+        (
+            int(processes[start]),
+            process_names[end - 1],
+            int(threads[start]),
+            thread_names[end - 1],
+        )
+        for start, end in zip(starts.tolist(), ends.tolist())
+    ]
+
+    return Activity(
+        width,
+        lanes,
+        np.add.reduceat(counts, starts),
+        np.minimum.reduceat(firsts, starts),
+        np.maximum.reduceat(lasts, starts),
+        np.maximum.reduceat(gaps, starts),
+        np.append(starts, len(rows)),
+        buckets,
+        counts,
+    )
+
+
+def _update_activity_tables(sidecar):
+    for table_name, source_table, columns in ACTIVITY_TABLES:
+        high_water_mark = get_meta(sidecar, f"{table_name}.rowid") or 0
+        max_rowid = sidecar.execute(f"SELECT max(rowid) FROM src.{source_table}")
+        max_rowid = max_rowid.fetchone()[0] or 0
+        if max_rowid <= high_water_mark:
+            continue
+
+        # the width for the time of all the records, the new ones included
+        cursor = sidecar.execute(
+            f"SELECT min(created), max(created) FROM src.{source_table} "
+            "WHERE rowid > ? AND rowid <= ?",
+            (high_water_mark, max_rowid),
+        )
+        created_min, created_max = cursor.fetchone()
+        first = get_meta(sidecar, f"{table_name}.first")
+        last = get_meta(sidecar, f"{table_name}.last")
+        if first is None:
+            first, last = created_min or 0, created_max or 0
+        elif created_min is not None:
+            first, last = min(first, created_min), max(last, created_max)
+
+        width = bucket_width(last - first, ACTIVITY_BUCKETS)
+        old_width = get_meta(sidecar, f"{table_name}.width")
+        if old_width is not None and width > old_width:
+            _widen_activity(sidecar, table_name, columns, old_width, width)
+        elif old_width is not None:
+            width = old_width
+
+        # SQLite sorts each chunk by the primary key, the new buckets are
+        # inserted and the ones the thread already logged in are summed up
+        aggregate_sql = _aggregate_sql.format(
+            source=f"src.{source_table}", where="rowid > ? AND rowid <= ?"
+        )
+        for after_rowid in range(high_water_mark, max_rowid, ACTIVITY_CHUNK_ROWS):
+            up_to_rowid = min(after_rowid + ACTIVITY_CHUNK_ROWS, max_rowid)
+            sidecar.execute(
+                f"INSERT INTO main.{table_name} ({', '.join(columns)}) "
+                f"{aggregate_sql} "
+                f"ON CONFLICT ({', '.join(PRIMARY_KEYS[table_name])}) DO UPDATE SET "
+                "count = count + excluded.count, "
+                "first_created = min(first_created, excluded.first_created), "
+                "last_created = max(last_created, excluded.last_created), "
+                "process_name = ifnull(excluded.process_name, process_name), "
+                "thread_name = ifnull(excluded.thread_name, thread_name)",
+                (width, width, after_rowid, up_to_rowid),
+            )
+
+        set_meta(sidecar, f"{table_name}.rowid", max_rowid)
+        set_meta(sidecar, f"{table_name}.width", width)
+        set_meta(sidecar, f"{table_name}.first", first)
+        set_meta(sidecar, f"{table_name}.last", last)
+
+
+def _widen_activity(sidecar, table_name, columns, old_width, width):
+    """
+    Sum up the buckets of `old_width` into the wider ones, when the run got
+    longer. Each of the widths is a multiple of the narrower ones.
+    """
+    ratio = round(width / old_width)
+    sidecar.execute(
+        f"INSERT INTO main.{table_name} ({', '.join(columns)}) "
+        "SELECT ?, process, thread, bucket / ? AS wider_bucket, sum(count), "
+        "min(first_created), max(last_created), max(process_name), "
+        f"max(thread_name) FROM main.{table_name} WHERE width = ? "
+        "GROUP BY process, thread, wider_bucket",
+        (width, ratio, old_width),
+    )
+    sidecar.execute(f"DELETE FROM main.{table_name} WHERE width = ?", (old_width,))
@@ -0,0 +1,246 @@
+import justpy as jp
+import numpy as np
+
+from db import table_has_rows
+
+from activity import read_activity
+
+from columnar import ColumnarGrid
+
+from utils import bucket_width_str
+from utils import iso_strs_from_ts
+from sections import _create_lazy_section
+
+
+LANES_PAGE_SIZE = 50
+LANE_HEIGHT = 18  # pixels of a lane in the timeline
+
+# orders of the lanes in the timeline
+SORT_ORDERS = {
+    "first": "First activity",
+    "records": "Records",
+    "gap": "Longest gap",
+    "process": "Process and thread",
+}
+
+
+def add_activity_section(div_content, db):
+    if not table_has_rows(db, "Logs"):
+        return None
+
+    return _create_lazy_section(
+        div_content,
+        "Activity",
+        _fill_activity_section,
+        read_section=read_activity,
+    )
+
+
+def _fill_activity_section(section_activity, activity):
+    processes = {process for process, _, _, _ in activity.lanes}
+    jp.P(
+        a=section_activity,
+        text=f"{len(activity.lanes)} threads in {len(processes)} processes logged "
+        f"{int(activity.records.sum())} records, counted per "
+        f"{bucket_width_str(activity.width)}.",
+        classes="text-sm text-gray-600",
+    )
+
+    # the controls work only with the server, see export.py
+    div_controls = jp.Div(
+        a=section_activity, classes="flex flex-row flex-wrap items-center export-skip"
+    )
+    chart = jp.HighCharts(a=section_activity, classes="m-2 p-2 border")
+    chart.options = _timeline_chart_def(activity.width)
+
+    timeline = ActivityTimeline(activity, chart)
+    _add_timeline_controls(div_controls, timeline)
+    timeline.show_page()
+
+    table = ColumnarGrid(
+        a=section_activity,
+        options=_lanes_table_options(),
+        style=f"height: {min(600, 60 + 28 * len(activity.lanes))}px; margin: 0.25em",
+    )
+    table.options.rowData = _lanes_to_rows(activity)
+
+
+def _add_timeline_controls(div_controls, timeline):
+    input_classes = "m-1 p-1 border rounded"
+    button_classes = "m-1 px-2 py-1 border rounded bg-gray-100 hover:bg-gray-200"
+
+    jp.Span(a=div_controls, text="Sort by:", classes="m-1")
+    select_sort = jp.Select(a=div_controls, classes=input_classes, value=timeline.sort)
+    for sort, name in SORT_ORDERS.items():
+        jp.Option(a=select_sort, value=sort, text=name)
+    select_sort.on("change", timeline.on_sort_change)
+
+    button_previous = jp.Button(
+        a=div_controls, text="‹ Previous", classes=button_classes
+    )
+    button_previous.on("click", timeline.on_previous_page)
+    button_next = jp.Button(a=div_controls, text="Next ›", classes=button_classes)
+    button_next.on("click", timeline.on_next_page)
+
+    timeline.label = jp.Span(a=div_controls, classes="m-1 text-sm")
+
+
+class ActivityTimeline:
+    """
+    One page of `LANES_PAGE_SIZE` lanes of the `Activity`, each thread in a
+    row of the heatmap of its log records over time. All the lanes are read
+    at once, the pages are only sliced from them.
+    """
+
+    def __init__(self, activity, chart, page_size=LANES_PAGE_SIZE):
+        self.activity = activity
+        self.chart = chart
+        self.page_size = page_size
+        self.label = None
+
+        self.sort = "first"
+        self.order = lane_order(activity, self.sort)
+        self.offset = 0
+
+    def show_page(self):
+        activity = self.activity
+        page = self.order[self.offset : self.offset + self.page_size].tolist()
+
+        categories = []
+        data = []
+        for y, lane in enumerate(page):
+            categories.append(_lane_name(activity.lanes[lane]))
+            buckets, counts = activity.lane_buckets(lane)
+            # the cells are centered on x
+            x = (buckets + 0.5) * activity.width * 1000
+            data.extend(zip(x.tolist(), [y] * len(counts), counts.tolist()))
+
+        chart_def = self.chart.options
+        chart_def["yAxis"]["categories"] = categories
+        chart_def["series"][0]["data"] = data
+        chart_def["chart"]["height"] = 120 + LANE_HEIGHT * len(page)
+
+        if self.label is not None:
+            self.label.text = (
+                f"Threads {self.offset + 1} – {self.offset + len(page)} "
+                f"of {len(activity.lanes)}"
+            )
+
+    async def on_sort_change(self, msg):
+        if msg.value in SORT_ORDERS:
+            self.sort = msg.value
+            self.order = lane_order(self.activity, self.sort)
+            self.offset = 0
+            self.show_page()
+
+    async def on_previous_page(self, msg):
+        self.offset = max(0, self.offset - self.page_size)
+        self.show_page()
+
+    async def on_next_page(self, msg):
+        if self.offset + self.page_size < len(self.activity.lanes):
+            self.offset += self.page_size
+            self.show_page()
+
+
+def lane_order(activity, sort):
+    """Indexes of the lanes of `activity` in the order of `SORT_ORDERS[sort]`."""
+    lanes = np.arange(len(activity.lanes))
+    if sort == "records":
+        return np.lexsort((lanes, -activity.records))
+    elif sort == "gap":
+        return np.lexsort((lanes, -activity.longest_gap))
+    elif sort == "process":
+        return lanes  # ordered by the process and the thread already
+
+    return np.lexsort((lanes, activity.first))
+
+
+def _lane_name(lane):
+    process, process_name, thread, thread_name = lane
+
+    return f"{process_name or process} / {thread_name or thread}"
+
+
+def _timeline_chart_def(width):
+    return {
+        "chart": {"type": "heatmap", "height": 300, "zoomType": "x"},
+        "title": {"text": "Log records per thread"},
+        "xAxis": {"type": "datetime"},
+        "yAxis": {
+            "categories": [],
+            "title": {"text": None},
+            "reversed": True,
+            "labels": {"style": {"fontSize": "10px"}},
+        },
+        "colorAxis": {
+            "type": "logarithmic",
+            "min": 1,
+            "minColor": "#dbeafe",
+            "maxColor": "#1e3a8a",
+        },
+        "legend": {"enabled": True},
+        "tooltip": {
+            "headerFormat": "",
+            "pointFormat": "<b>{point.value}</b> records in "
+            f"{bucket_width_str(width)} around "
+            "{point.x:%Y-%m-%d %H:%M:%S}",
+        },
+        "series": [
+            {
+                "name": "Log records",
+                "data": [],
+                "colsize": width * 1000,
+                "borderWidth": 0,
+                "turboThreshold": 0,
+            }
+        ],
+    }
+
+
+def _lanes_table_options():
+    return {
+        "defaultColDef": {
+            "filter": True,
+            "sortable": True,
+            "resizable": True,
+            "headerClass": "font-bold",
+        },
+        "columnDefs": [
+            {"headerName": "Process", "field": "process"},
+            {"headerName": "Process name", "field": "processName"},
+            {"headerName": "Thread ID", "field": "thread"},
+            {"headerName": "Thread name", "field": "threadName"},
+            {"headerName": "Records", "field": "records"},
+            {"headerName": "First activity", "field": "first"},
+            {"headerName": "Last activity", "field": "last"},
+            {"headerName": "Active (s)", "field": "active"},
+            {"headerName": "Longest gap (s)", "field": "gap"},
+        ],
+        "rowData": [],
+    }
+
+
+def _lanes_to_rows(activity):
+    firsts = iso_strs_from_ts(activity.first)
+    lasts = iso_strs_from_ts(activity.last)
+    actives = np.round(activity.last - activity.first, 3).tolist()
+    gaps = np.round(activity.longest_gap, 3).tolist()
+
+    rows = []
+    for cnt, (process, process_name, thread, thread_name) in enumerate(activity.lanes):
+        rows.append(
+            {
+                "process": process,
+                "processName": process_name,
+                "thread": thread,
+                "threadName": thread_name,
+                "records": int(activity.records[cnt]),
+                "first": firsts[cnt],
+                "last": lasts[cnt],
+                "active": actives[cnt],
+                "gap": gaps[cnt],
+            }
+        )
+
+    return rows
@@ -0,0 +1,72 @@
+import justpy as jp
+
+from utils import bytes_to_readable_str
+from sections import _create_lazy_section
+
+
+def add_diagnostics_section(div_content, diagnostics):
+    return _create_lazy_section(
+        div_content,
+        "Diagnostics",
+        lambda section: _fill_diagnostics_section(section, diagnostics),
+    )
+
+
+def _fill_diagnostics_section(section_diagnostics, diagnostics):
+    details = jp.Details(a=section_diagnostics)
+    jp.Summary(
+        a=details,
+        text="Time, rows and payload of each stage of building this report",
+        classes="cursor-pointer text-gray-700",
+    )
+
+    refresh_button = jp.Button(
+        a=details,
+        text="Refresh",
+        classes="mt-2 px-3 py-1 rounded bg-gray-200 hover:bg-gray-300 export-skip",
+    )
+
+    table_options = {
+        "defaultColDef": {
+            "filter": True,
+            "sortable": True,
+            "resizable": True,
+            "headerClass": "font-bold",
+        },
+        "columnDefs": [
+            {"headerName": "Stage", "field": "stage", "minWidth": 300},
+            {"headerName": "Runs", "field": "runs"},
+            {"headerName": "Seconds", "field": "seconds"},
+            {"headerName": "Rows read", "field": "rows"},
+            {"headerName": "Allocated blocks", "field": "allocated_blocks"},
+            {"headerName": "Last payload", "field": "bytes"},
+        ],
+        "rowData": [],
+    }
+    table = jp.AgGrid(
+        a=details, options=table_options, style="height: 400px; margin: 0.25em"
+    )
+
+    json_details = jp.Details(a=details)
+    jp.Summary(a=json_details, text="JSON", classes="cursor-pointer text-gray-700")
+    pre_json = jp.Pre(a=json_details, classes="text-xs overflow-x-auto")
+
+    def refresh():
+        table.options.rowData = [_summary_to_row(x) for x in diagnostics.summary()]
+        pre_json.text = diagnostics.to_json()
+
+    refresh_button.on("click", lambda self, msg: refresh())
+    refresh()
+
+
+def _summary_to_row(summary):
+    payload = summary.get("bytes")
+
+    return {
+        "stage": summary["stage"],
+        "runs": summary["runs"],
+        "seconds": round(summary["seconds"], 4),
+        "rows": summary["rows"],
+        "allocated_blocks": summary["allocated_blocks"],
+        "bytes": bytes_to_readable_str(payload) if payload is not None else "",
+    }
@@ -0,0 +1,577 @@
+import json
+import sqlite3
+
+import justpy as jp
+
+from db import is_indexed
+from db import run_on_page_db
+from db import table_has_rows
+
+from follow import grid_transaction_js
+
+from columnar import ColumnarGrid
+
+from diagnostics import record_rows
+
+from logs_aggregation import LogsAggregation
+from logs_aggregation import AGGREGATE_COLUMNS
+
+from search import highlight
+from search import fts_query
+from search import SEARCH_SCHEMA
+from search import attach_search_index
+from search import search_terms as search_terms_from
+
+from utils import iso_strs_from_ts
+from sections import _create_lazy_section
+
+LOGS_PAGE_SIZE = 40
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+# (header name, grid field, SQL column)
+LOG_COLUMNS = [
+    ("Created", "created", "created"),
+    ("Level", "levelname", "levelname"),
+    ("Message", "msg", "msg"),
+    ("Filename", "filename", "filename"),
+    ("Line", "lineno", "lineno"),
+    ("Function", "funcname", "funcName"),
+    ("Name", "name", "name"),
+    ("Module", "module", "module"),
+    ("Path", "pathname", "pathname"),
+    ("Process", "process", "process"),
+    ("Process name", "processName", "processName"),
+    ("Thread ID", "thread", "thread"),
+    ("Thread name", "threadName", "threadName"),
+]
+
+MESSAGE_COLUMN_INDEX = [field for _, field, _ in LOG_COLUMNS].index("msg")
+
+# Sorting is done by SQLite, so only whitelisted columns may get to the query.
+# `rowid` is the order in which the records were logged and together with
+# `created` (when the sidecar index is attached) the only one which doesn't
+# need a sort over the whole table.
+SORT_COLUMNS = {
+    "rowid": "Logged order",
+    "created": "Created",
+    "levelname": "Level",
+    "name": "Name",
+    "module": "Module",
+    "processName": "Process name",
+    "threadName": "Thread name",
+}
+
+
+def add_logs_section(div_content, db):
+    if not table_has_rows(db, "Logs"):
+        return None
+
+    # the first page is read before the grid exists, with the default filter
+    pager = LogsPager(db)
+    return _create_lazy_section(
+        div_content,
+        "Logs",
+        lambda section, logs_data: _fill_logs_section(section, pager, logs_data),
+        read_section=read_logs,
+        read_arguments=pager.read_arguments(),
+    )
+
+
+def _fill_logs_section(section_logs, pager, logs_data):
+    div_aggregation = jp.Div(a=section_logs)
+    # the controls work only with the server, see export.py
+    div_controls = jp.Div(
+        a=section_logs, classes="flex flex-row flex-wrap items-center export-skip"
+    )
+    table = ColumnarGrid(
+        a=section_logs,
+        options=_logs_table_options(),
+        style="height: 1200px; margin: 0.25em",
+    )
+    table.html_columns = [MESSAGE_COLUMN_INDEX]  # escaped, with search highlights
+    div_pagination = jp.Div(
+        a=section_logs, classes="flex flex-row items-center export-skip"
+    )
+
+    pager.table = table
+    _add_filter_controls(div_controls, pager)
+    _add_pagination_controls(div_pagination, pager)
+    pager.aggregation = LogsAggregation(pager, div_aggregation)
+    pager.show(*logs_data)
+
+    table.live_read = pager.live_read
+    table.live_update = pager.live_update
+    table.export_rows = pager.iter_all_rows
+    table.export_chunks = pager.iter_export_chunks
+
+
+def _logs_table_options():
+    column_defs = []
+    for header_name, field, _ in LOG_COLUMNS:
+        column_def = {"headerName": header_name, "field": field}
+        if field == "msg":
+            column_def["autoHeight"] = True
+            column_def["editable"] = True
+
+        column_defs.append(column_def)
+
+    return {
+        "defaultColDef": {
+            # sorting and filtering of the whole table is done in SQL by the
+            # LogsPager, grid would only sort / filter the displayed page
+            "filter": False,
+            "sortable": False,
+            "resizable": True,
+            "headerClass": "font-bold",
+            "wrapText": True,
+        },
+        "columnDefs": column_defs,
+        "rowHeight": 120,
+        "rowData": [],
+    }
+
+
+def _add_filter_controls(div_controls, pager):
+    input_classes = "m-1 p-1 border rounded"
+
+    jp.Span(a=div_controls, text="Level:", classes="m-1")
+    select_level = jp.Select(a=div_controls, classes=input_classes, value="")
+    jp.Option(a=select_level, value="", text="All")
+    for level in LOG_LEVELS:
+        jp.Option(a=select_level, value=level, text=level)
+    select_level.on("change", pager.on_level_change)
+
+    jp.Span(a=div_controls, text="Name:", classes="m-1")
+    input_name = jp.Input(
+        a=div_controls, classes=input_classes, placeholder="logger name prefix"
+    )
+    input_name.on("change", pager.on_name_change)
+
+    jp.Span(a=div_controls, text="Message:", classes="m-1")
+    input_message = jp.Input(
+        a=div_controls, classes=input_classes, placeholder="contains"
+    )
+    input_message.on("change", pager.on_message_change)
+
+    jp.Span(a=div_controls, text="Search:", classes="m-1")
+    input_search = jp.Input(
+        a=div_controls, classes=input_classes, placeholder="full text, ranked"
+    )
+    input_search.on("change", pager.on_search_change)
+
+    jp.Span(a=div_controls, text="Sort by:", classes="m-1")
+    select_sort = jp.Select(a=div_controls, classes=input_classes, value=pager.order_by)
+    for column, name in SORT_COLUMNS.items():
+        jp.Option(a=select_sort, value=column, text=name)
+    select_sort.on("change", pager.on_sort_change)
+
+    select_direction = jp.Select(a=div_controls, classes=input_classes, value="ASC")
+    jp.Option(a=select_direction, value="ASC", text="ascending")
+    jp.Option(a=select_direction, value="DESC", text="descending")
+    select_direction.on("change", pager.on_direction_change)
+
+
+def _add_pagination_controls(div_pagination, pager):
+    button_classes = "m-1 px-2 py-1 border rounded bg-gray-100 hover:bg-gray-200"
+
+    button_first = jp.Button(a=div_pagination, text="« First", classes=button_classes)
+    button_first.on("click", pager.on_first_page)
+    button_previous = jp.Button(
+        a=div_pagination, text="‹ Previous", classes=button_classes
+    )
+    button_previous.on("click", pager.on_previous_page)
+    button_next = jp.Button(a=div_pagination, text="Next ›", classes=button_classes)
+    button_next.on("click", pager.on_next_page)
+
+    pager.label = jp.Span(a=div_pagination, classes="m-1 text-sm")
+
+
+class LogsPager:
+    """
+    One page of the logs matching the filter, sorted and filtered by SQLite.
+
+    The page is read by `read_logs()` with the arguments from
+    `read_arguments()`, by a worker of the page when the filter is changed in
+    the browser, and shown by `show()`.
+
+    The pages are read by the keyset: the rows after the sort key and the
+    rowid of the last row of the previous page, so a page deep in the logs
+    doesn't skip over all the rows before it like OFFSET would.
+    """
+
+    def __init__(self, db, table=None, page_size=LOGS_PAGE_SIZE):
+        self.db = db
+        self.table = table
+        self.page_size = page_size
+        self.label = None
+
+        self.offset = 0  # of the page, for the label only
+        self.after_key = None  # (sort key, rowid) the page starts after
+        self.previous_keys = []  # `after_key` of the pages before
+        self.last_key = None  # of the last row of the page
+        self.has_next_page = False
+        self.last_rowid = 0
+        self.generation = 0  # of the last read, older results are dropped
+        self.live_generation = 0  # of the last read of the new records
+
+        self.indexed = is_indexed(db)
+        self.order_by = "created" if self.indexed else "rowid"
+        self.direction = "ASC"
+        self.level = ""
+        self.name_prefix = ""
+        self.message = ""
+        self.search_terms = []  # results are sorted by relevance
+
+        # set by clicking the aggregation panel, see logs_aggregation.py
+        self.column_filters = {}  # column from AGGREGATE_COLUMNS: value
+        self.created_range = None  # (from, to) timestamps, `to` excluded
+        self.aggregation = None
+
+    def where_clause(self, after_rowid=None, include_search=True):
+        conditions = []
+        parameters = []
+
+        if self.search_terms and include_search:
+            conditions.append(
+                f"Logs.rowid IN (SELECT rowid FROM {SEARCH_SCHEMA}.LogsSearch "
+                "WHERE LogsSearch MATCH ?)"
+            )
+            parameters.append(fts_query(self.search_terms))
+
+        if after_rowid is not None:
+            conditions.append("Logs.rowid > ?")
+            parameters.append(after_rowid)
+
+        if self.level:
+            conditions.append("Logs.levelname = ?")
+            parameters.append(self.level)
+        if self.name_prefix:
+            conditions.append("Logs.name LIKE ? ESCAPE '\\'")
+            parameters.append(_escape_like(self.name_prefix) + "%")
+        if self.message:
+            conditions.append("Logs.msg LIKE ? ESCAPE '\\'")
+            parameters.append("%" + _escape_like(self.message) + "%")
+
+        for column, value in self.column_filters.items():
+            if column in AGGREGATE_COLUMNS:
+                conditions.append(f"Logs.{column} = ?")
+                parameters.append(value)
+        if self.created_range:
+            conditions.append("Logs.created >= ? AND Logs.created < ?")
+            parameters.extend(self.created_range)
+
+        if not conditions:
+            return "", parameters
+
+        return " WHERE " + " AND ".join(conditions), parameters
+
+    def select_sql(self, columns=None, after_key=None):
+        """
+        The logs matching the filter, in the order of the page. With
+        `after_key`, `(sort key, rowid)` of a row, only the ones after it.
+        """
+        where, parameters = self.where_clause(include_search=False)
+
+        columns = columns or _logs_columns_sql()
+        source = "Logs"
+        sort_column, rowid_column = f"Logs.{self.order_by}", "Logs.rowid"
+        descending = self.direction == "DESC"
+
+        if self.search_terms:
+            source = (
+                "(SELECT rowid AS search_rowid, rank "
+                f"FROM {SEARCH_SCHEMA}.LogsSearch WHERE LogsSearch MATCH ?) AS s "
+                "JOIN Logs ON Logs.rowid = s.search_rowid"
+            )
+            parameters.insert(0, fts_query(self.search_terms))
+            sort_column, descending = "s.rank", False
+
+        # walk the sidecar index in order and look up the rows by rowid
+        elif self.order_by == "created" and self.indexed:
+            source = "idx.LogsByCreated AS i JOIN Logs ON Logs.rowid = i.source_rowid"
+            sort_column, rowid_column = "i.created", "i.source_rowid"
+
+        direction = "DESC" if descending else "ASC"
+        order_by = f"{sort_column} {direction}"
+        if self.order_by != "rowid" or self.search_terms:
+            order_by += f", {rowid_column} {direction}"
+
+        if after_key is not None:
+            # the time and the rank are never NULL
+            nullable = sort_column not in {"Logs.created", "i.created", "s.rank"}
+            condition, key_parameters = _after_key_condition(
+                sort_column, rowid_column, descending, after_key, nullable
+            )
+            where += (" AND " if where else " WHERE ") + condition
+            parameters += key_parameters
+
+        return f"SELECT {columns} FROM {source}{where} ORDER BY {order_by}", parameters
+
+    def sort_key_sql(self):
+        return "s.rank" if self.search_terms else f"Logs.{self.order_by}"
+
+    def read_arguments(self):
+        """Arguments of `read_logs()` for the current page and filter."""
+        columns = f"{_logs_columns_sql()}, {self.sort_key_sql()} AS sort_key"
+        sql, parameters = self.select_sql(columns, self.after_key)
+
+        # +1 to know whether there is a next page
+        sql += " LIMIT ?"
+        parameters.append(self.page_size + 1)
+
+        return sql, parameters, self.page_size, self.search_terms
+
+    def iter_all_rows(self, batch_size=10000):
+        sql, parameters = self.select_sql()
+
+        cursor = self.db.cursor()
+        cursor.execute(sql, parameters)
+        while True:
+            logs_list = cursor.fetchmany(batch_size)
+            if not logs_list:
+                break
+
+            yield _logs_to_rows(logs_list, self.search_terms)
+
+    def iter_export_chunks(self, chunk_rows):
+        """
+        Like `iter_all_rows()`, only the rowids are read here. Yields
+        `(read_logs_by_rowid, arguments)` of the chunks, for the workers.
+        """
+        sql, parameters = self.select_sql(columns="Logs.rowid")
+
+        cursor = self.db.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, parameters)
+        while True:
+            rowids = [rowid for rowid, in cursor.fetchmany(chunk_rows)]
+            if not rowids:
+                break
+
+            yield read_logs_by_rowid, (rowids, self.search_terms)
+
+    def show(self, rows, has_next_page, last_rowid, last_key):
+        self.table.options.rowData = rows
+        self.has_next_page = has_next_page
+        self.last_rowid = last_rowid
+        self.last_key = last_key
+
+        self.update_label()
+
+    async def reload(self, wp):
+        """Read the page by a worker of the page, dropping the older reads."""
+        self.generation += 1
+        generation = self.generation
+
+        arguments = self.read_arguments()
+        try:
+            logs_data = await run_on_page_db(wp, read_logs, *arguments)
+        except sqlite3.Error as e:
+            if generation == self.generation:
+                self.label.text = f"Can't read the logs: {e}"
+            return
+
+        if generation == self.generation:
+            self.show(*logs_data)
+
+    def update_label(self):
+        if self.label is None:
+            return
+
+        rows_count = len(self.table.options.rowData)
+        if rows_count:
+            first = self.offset + 1
+            last = self.offset + rows_count
+            self.label.text = f"Records {first} – {last}"
+        else:
+            self.label.text = "No records match the filter."
+
+    def live_read(self):
+        """`(read_logs, arguments)` of the records logged after the page."""
+        # new records are only appended to the last page in the logged order,
+        # anything else would need to move the rows between the pages
+        if self.has_next_page or self.direction != "ASC" or self.search_terms:
+            return None
+        if self.order_by not in {"rowid", "created"}:
+            return None
+
+        self.live_generation = self.generation
+        free_rows = self.page_size - len(self.table.options.rowData)
+        where, parameters = self.where_clause(after_rowid=self.last_rowid)
+        sql = (
+            f"SELECT {_logs_columns_sql()}, {self.sort_key_sql()} AS sort_key "
+            f"FROM Logs{where} ORDER BY Logs.rowid LIMIT ?"
+        )
+
+        return read_logs, (sql, parameters + [free_rows + 1], free_rows)
+
+    def live_update(self, logs_data):
+        rows, has_next_page, last_rowid, last_key = logs_data
+        if self.live_generation != self.generation:
+            return None  # the filter or the page changed meanwhile
+
+        if has_next_page:
+            self.has_next_page = True
+        if not rows:
+            return None
+
+        self.last_rowid = last_rowid
+        self.last_key = last_key
+        self.table.options.rowData.extend(rows)
+        self.update_label()
+
+        return grid_transaction_js(self.table, rows)
+
+    async def refilter(self, wp):
+        self.offset = 0
+        self.after_key = None
+        self.previous_keys = []
+        await self.reload(wp)
+
+        # the page goes first, the counts of the whole filter take longer
+        if self.aggregation is not None and self.aggregation.expanded:
+            await wp.update()
+            await self.aggregation.reload(wp)
+
+    async def on_level_change(self, msg):
+        self.level = msg.value
+        await self.refilter(msg.page)
+
+    async def on_name_change(self, msg):
+        self.name_prefix = msg.value.strip()
+        await self.refilter(msg.page)
+
+    async def on_message_change(self, msg):
+        self.message = msg.value.strip()
+        await self.refilter(msg.page)
+
+    async def on_search_change(self, msg):
+        # the search index is created by the first search, see `read_logs()`
+        self.search_terms = search_terms_from(msg.value)
+        await self.refilter(msg.page)
+
+    async def on_sort_change(self, msg):
+        if msg.value in SORT_COLUMNS:
+            self.order_by = msg.value
+        await self.refilter(msg.page)
+
+    async def on_direction_change(self, msg):
+        self.direction = "DESC" if msg.value == "DESC" else "ASC"
+        await self.refilter(msg.page)
+
+    async def on_first_page(self, msg):
+        await self.refilter(msg.page)
+
+    async def on_previous_page(self, msg):
+        if self.previous_keys:
+            self.offset -= self.page_size
+            self.after_key = self.previous_keys.pop()
+        await self.reload(msg.page)
+
+    async def on_next_page(self, msg):
+        if self.has_next_page:
+            self.offset += self.page_size
+            self.previous_keys.append(self.after_key)
+            self.after_key = self.last_key
+            await self.reload(msg.page)
+
+
+def read_logs(db, sql, parameters, page_size, search_terms=()):
+    """
+    One page of the logs by the query from `LogsPager.read_arguments()`, as
+    the rows of the grid.
+
+    Returns the rows, whether there is a next page, the last rowid read and
+    `(sort key, rowid)` of the last row, which the next page starts after.
+    """
+    if search_terms:
+        attach_search_index(db)
+
+    cursor = db.cursor()
+    cursor.execute(sql, parameters)
+    logs_list = cursor.fetchall()
+    record_rows(len(logs_list))
+
+    has_next_page = len(logs_list) > page_size
+    logs_list = logs_list[:page_size]
+
+    last_key = None
+    if logs_list:
+        last_rowid = max(log["log_rowid"] for log in logs_list)
+        last_key = (logs_list[-1]["sort_key"], logs_list[-1]["log_rowid"])
+    else:
+        cursor.execute("SELECT max(rowid) FROM Logs")
+        last_rowid = cursor.fetchone()[0] or 0
+
+    rows = _logs_to_rows(logs_list, search_terms)
+
+    return rows, has_next_page, last_rowid, last_key
+
+
+def read_logs_by_rowid(db, rowids, search_terms=()):
+    """Rows of the grid for the logs with `rowids`, in the same order."""
+    cursor = db.cursor()
+    cursor.execute(
+        f"SELECT {_logs_columns_sql()} FROM Logs "
+        "WHERE Logs.rowid IN (SELECT value FROM json_each(?))",
+        (json.dumps(rowids),),
+    )
+    logs_by_rowid = {log["log_rowid"]: log for log in cursor}
+    record_rows(len(logs_by_rowid))
+
+    logs_list = [logs_by_rowid[rowid] for rowid in rowids]
+
+    return _logs_to_rows(logs_list, search_terms)
+
+
+def _logs_columns_sql():
+    columns = [f"Logs.{sql_column}" for _, _, sql_column in LOG_COLUMNS]
+    return ", ".join(columns + ["Logs.rowid AS log_rowid"])
+
+
+def _after_key_condition(
+    sort_column, rowid_column, descending, after_key, nullable=True
+):
+    """
+    Condition of the rows after `after_key`, `(sort key, rowid)`, in ORDER BY
+    `sort_column`, `rowid_column`. SQLite sorts NULL first, before any value.
+    """
+    value, rowid = after_key
+    operator = "<" if descending else ">"
+    if sort_column == rowid_column:
+        return f"{rowid_column} {operator} ?", [rowid]
+    if not nullable:
+        # a range of the index on both
+        return f"({sort_column}, {rowid_column}) {operator} (?, ?)", [value, rowid]
+
+    if value is None:
+        ties = f"{sort_column} IS NULL AND {rowid_column} {operator} ?"
+        if descending:
+            return ties, [rowid]
+        return f"({sort_column} IS NOT NULL OR {ties})", [rowid]
+
+    condition = (
+        f"({sort_column} {operator} ? "
+        f"OR {sort_column} = ? AND {rowid_column} {operator} ?"
+    )
+    if descending:
+        condition += f" OR {sort_column} IS NULL"
+
+    return condition + ")", [value, value, rowid]
+
+
+def _escape_like(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _logs_to_rows(logs_list, search_terms=()):
+    created = iso_strs_from_ts([log["created"] for log in logs_list])
+
+    rows = []
+    for log, created_str in zip(logs_list, created):
+        row = {field: log[sql_column] for _, field, sql_column in LOG_COLUMNS}
+        row["created"] = created_str
+        row["msg"] = highlight(row["msg"], search_terms)
+        rows.append(row)
+
+    return rows
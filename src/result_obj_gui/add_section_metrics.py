@@ -1,10 +1,54 @@
+import asyncio
+import sqlite3
+import functools
+from array import array
+
 import justpy as jp
+import numpy as np
 
 from result_obj.metrics import Metric
-from result_obj.metrics import MetricInfo
+
+from db import is_indexed
+from db import run_on_page_db
+from db import table_has_rows
+
+from follow import chart_set_data_js
+from follow import chart_add_points_js
+
+from diagnostics import substage
+from diagnostics import record_rows
 
 from utils import bytes_to_gb
-from utils import _create_section
+from utils import bucket_width
+from utils import bucket_width_str
+from utils import seconds_to_readable_str
+from sections import _create_lazy_section
+
+from downsample import lttb
+from downsample import to_chart_data
+from downsample import to_chart_points
+from downsample import downsample_window
+
+from columnar import append_points
+
+from counters import CounterRates
+from counters import read_counter_rates
+
+from rollups import open_rollups
+from rollups import read_rollup_names
+from rollups import read_rollup_points
+
+from spans import Spans
+from spans import duration_stats
+from spans import duration_histogram
+from spans import spans_over_time
+from spans import in_flight_over_time
+
+from correlation import CorrelationPanel
+
+
+# buckets of the start/stop charts over time
+SPAN_BUCKETS = 200
 
 
 synchronize_cursors_js = """
@@ -74,171 +118,604 @@ async def synchronize_cursors(self, msg):
 
 
 def add_metrics_section(div_content, wp, db):
-    section_metrics = _create_section(div_content, "Metrics")
-
-    cursor = db.cursor()
-    cursor.execute("SELECT DISTINCT name, type FROM Metrics")
-    metrics_list = cursor.fetchall()
-
-    if not metrics_list:
+    if not table_has_rows(db, "Metrics"):
         return None
 
     wp.on("synchronize_cursors", synchronize_cursors)
 
-    metric_names = {x["name"] for x in metrics_list}
+    return _create_lazy_section(
+        div_content,
+        "Metrics",
+        lambda section, metrics_data: _fill_metrics_section(section, *metrics_data),
+        read_section=read_metrics_section,
+    )
+
+
+def read_metrics_section(db):
+    """
+    `(metrics, counter rates, last rowid, rollups)`, the values read from the
+    rollups, or all the rows when the cache isn't writable (`rollups` is None).
+    """
+    try:
+        with substage("open_rollups"):
+            rollups = open_rollups(db)
+    except (OSError, sqlite3.Error):
+        rollups = None  # the cache isn't writable, all the rows are read
+
+    if rollups is None:
+        # both reads see the same rows, even when the file is being written to
+        last_rowid = db.execute("SELECT max(rowid) FROM Metrics").fetchone()[0]
+        with substage("read_metrics"):
+            metrics, _ = read_metrics(db, up_to_rowid=last_rowid, counters=False)
+    else:
+        # the values come from the rollups, only the spans are read row by row
+        last_rowid = rollups.high_water_mark
+        with substage("read_metrics"):
+            metrics, _ = read_metrics(
+                db, up_to_rowid=last_rowid, counters=False, values=False
+            )
+        with substage("read_rollup_points"):
+            for metric_name in read_rollup_names(db, rollups, Metric.TYPE_VALUE):
+                metrics[(metric_name, Metric.TYPE_VALUE)] = _read_rollup_series(
+                    db, rollups, metric_name, Metric.TYPE_VALUE
+                )
+
+    # counters are counted by SQLite, not read hit by hit
+    with substage("read_counter_rates"):
+        counter_rates = read_counter_rates(db, up_to_rowid=last_rowid, rollups=rollups)
+
+    return metrics, counter_rates, last_rowid, rollups
+
+
+def _read_rollup_series(db, rollups, name, metric_type, x_min=None, x_max=None):
+    series = MetricSeries(name, metric_type)
+    series.timestamps, series.values = read_rollup_points(
+        db, rollups, name, metric_type, x_min, x_max
+    )
+
+    return series
+
+
+def _fill_metrics_section(
+    section_metrics, metrics, counter_rates, last_rowid, rollups=None
+):
+    # the logs around the time clicked / selected in the charts
+    section_metrics.correlation = CorrelationPanel(section_metrics)
+
+    # charts which can be extended by new metrics in the --follow mode
+    live_charts = {}
 
     excluded = {"debug_mem_available", "debug_disc_free"}
-    if "debug_mem_available" in metric_names:
-        _add_chart_debug(
-            _read_metrics(db, "debug_mem_available", Metric.TYPE_VALUE),
-            "debug_mem_available",
-            "memory",
-            section_metrics,
+    debug_mem_key = ("debug_mem_available", Metric.TYPE_VALUE)
+    debug_mem = metrics.get(debug_mem_key)
+    if debug_mem:
+        live_charts[debug_mem_key] = _add_chart_debug(
+            debug_mem, "debug_mem_available", "memory", section_metrics, rollups
         )
-    if "debug_disc_free" in metric_names:
-        _add_chart_debug(
-            _read_metrics(db, "debug_disc_free", Metric.TYPE_VALUE),
-            "debug_disc_free",
-            "disc",
-            section_metrics,
+    debug_disc_key = ("debug_disc_free", Metric.TYPE_VALUE)
+    debug_disc = metrics.get(debug_disc_key)
+    if debug_disc:
+        live_charts[debug_disc_key] = _add_chart_debug(
+            debug_disc, "debug_disc_free", "disc", section_metrics, rollups
         )
 
     metrics_value = {}
-    metrics_counters = {}
     metrics_start_stop = {}
-    for metric in metrics_list:
-        metric_name = metric["name"]
-        metric_type = metric["type"]
-
+    for (metric_name, metric_type), metric_data in metrics.items():
         if metric_name in excluded:
             continue
 
-        metrics_generator = _read_metrics(db, metric_name, metric_type)
         if metric_type == Metric.TYPE_VALUE:
-            metrics_value[metric_name] = metrics_generator
-        elif metric_type == Metric.TYPE_INCREMENT:
-            metrics_counters[metric_name] = metrics_generator
+            metrics_value[metric_name] = metric_data
         elif metric_type == Metric.TYPE_START:
-            metrics_start_stop[metric_name] = metrics_generator
+            metrics_start_stop[metric_name] = metric_data
 
     for metric_name, metric_data in metrics_value.items():
-        _add_chart_values(metric_data, metric_name, section_metrics)
-    for metric_name, metric_data in metrics_counters.items():
-        _add_chart_counter(metric_data, metric_name, section_metrics)
+        live_charts[(metric_name, Metric.TYPE_VALUE)] = _add_chart_values(
+            metric_data, metric_name, section_metrics, rollups
+        )
+    for metric_name, rates in counter_rates.items():
+        live_charts[(metric_name, Metric.TYPE_INCREMENT)] = _add_chart_counter(
+            rates, section_metrics, rollups
+        )
     for metric_name, metric_data in metrics_start_stop.items():
         _add_chart_start_stop(metric_data, metric_name, section_metrics)
 
-    return section_metrics
+    section_metrics.last_rowid = last_rowid
+    section_metrics.live_charts = live_charts
+    section_metrics.live_read = lambda: (read_metrics, (section_metrics.last_rowid,))
+    section_metrics.live_update = lambda metrics_data: _metrics_live_update(
+        section_metrics, *metrics_data
+    )
+
+
+def _metrics_live_update(section_metrics, metrics, last_rowid):
+    if not metrics:
+        return None
+
+    section_metrics.last_rowid = last_rowid
+
+    javascript = []
+    for key, metric_data in metrics.items():
+        chart = section_metrics.live_charts.get(key)
+        if chart is None:
+            continue
+
+        if hasattr(chart, "counter_rates"):
+            javascript.append(_add_counter_hits(chart, metric_data))
+        else:
+            javascript.append(_append_to_chart(chart, metric_data))
+
+    return "\n".join(js for js in javascript if js)
+
+
+def _append_to_chart(chart, metric_data):
+    x_axis = metric_data.timestamps * 1000
+    y_axis = chart.y_axis_from(metric_data, len(metric_data))
 
+    # charts of the rollups read the new rows from the file with the next zoom
+    if chart.rollups is None:
+        is_sorted = not len(chart.full_x_axis) or chart.full_x_axis[-1] <= x_axis[0]
+        chart.full_x_axis = np.concatenate((chart.full_x_axis, x_axis))
+        chart.full_y_axis = np.concatenate((chart.full_y_axis, y_axis))
+        if not is_sorted:
+            order = np.argsort(chart.full_x_axis, kind="stable")
+            chart.full_x_axis = chart.full_x_axis[order]
+            chart.full_y_axis = chart.full_y_axis[order]
+
+    # zoomed-in chart gets the new points with the next zoom
+    if chart.window != (None, None):
+        return None
+
+    series = chart.options["series"][0]
+    series["data"] = append_points(series["data"], x_axis, y_axis)
+
+    return chart_add_points_js(chart, to_chart_points(x_axis, y_axis))
+
+
+class MetricSeries:
+    """
+    Columns of one metric. Stop events are stored together with the start
+    events of the same name, `is_start` tells them apart.
+    """
+
+    __slots__ = ("name", "type", "timestamps", "values", "is_start")
+
+    def __init__(self, name, metric_type):
+        self.name = name
+        self.type = metric_type
+        self.timestamps = array("d")
+        self.values = array("d")
+        self.is_start = array("b")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def finalize(self):
+        self.timestamps = np.frombuffer(self.timestamps, dtype=np.float64)
+        self.values = np.frombuffer(self.values, dtype=np.float64)
+        self.is_start = np.frombuffer(self.is_start, dtype=np.int8).astype(bool)
+
+        if len(self.timestamps) > 1 and np.any(np.diff(self.timestamps) < 0):
+            order = np.argsort(self.timestamps, kind="stable")
+            self.timestamps = self.timestamps[order]
+            self.values = self.values[order]
+            self.is_start = self.is_start[order]
+
+        return self
+
+
+def read_metrics(db, after_rowid=None, up_to_rowid=None, counters=True, values=True):
+    """
+    Read all metrics in one pass over the table, in the order in which they
+    were stored, and sort each series by timestamp afterwards (which is usually
+    a no-op, as they are appended in time). With the sidecar index attached,
+    the covering index is read instead, already ordered by name, type and time.
+
+    With `after_rowid`, only the metrics stored after that row are read, with
+    `up_to_rowid` only the ones up to that row. Without `counters`, the hits of
+    the counters are left out, without `values` the values.
+
+    Returns tuple `({(name, type): MetricSeries}, last rowid)`.
+    """
+    source = "Metrics"
+    rowid_column = "rowid"
+    if after_rowid is None and is_indexed(db):
+        source = "idx.MetricsByName"
+        rowid_column = "source_rowid"
+
+    conditions = []
+    parameters = []
+    if after_rowid is not None:
+        conditions.append("rowid > ?")
+        parameters.append(after_rowid)
+    if up_to_rowid is not None:
+        conditions.append(f"{rowid_column} <= ?")
+        parameters.append(up_to_rowid)
+    if not counters:
+        conditions.append("type != ?")
+        parameters.append(Metric.TYPE_INCREMENT)
+    if not values:
+        conditions.append("type != ?")
+        parameters.append(Metric.TYPE_VALUE)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
 
-def _read_metrics(db, metric_name, metric_type):
     cursor = db.cursor()
-    if metric_type == Metric.TYPE_START:
-        cursor.execute(
-            "SELECT * FROM Metrics WHERE name=? AND (type=? OR type=?)",
-            (metric_name, Metric.TYPE_START, Metric.TYPE_STOP),
-        )
-    else:
-        cursor.execute(
-            "SELECT * FROM Metrics WHERE name=? AND type=?", (metric_name, metric_type)
-        )
+    cursor.row_factory = None  # plain tuples, no sqlite3.Row per metric
+    cursor.execute(
+        f"SELECT name, type, timestamp, value, {rowid_column} FROM {source}{where}",
+        parameters,
+    )
+
+    nan = float("nan")
+    metrics = {}
+    last_rowid = after_rowid or 0
+    for metric_name, metric_type, timestamp, value, rowid in cursor:
+        if rowid > last_rowid:
+            last_rowid = rowid
 
-    empty_dict = {}
-    for metric in cursor.fetchall():
-        m = MetricInfo(metric["type"], metric_name, empty_dict, metric["value"])
-        m.timestamp = metric["timestamp"]
-        yield m
+        is_start = metric_type == Metric.TYPE_START
+        if metric_type == Metric.TYPE_STOP:
+            metric_type = Metric.TYPE_START
 
+        key = (metric_name, metric_type)
+        series = metrics.get(key)
+        if series is None:
+            series = metrics[key] = MetricSeries(metric_name, metric_type)
 
-def _add_chart_debug(metric_data, metric_name, metric_descr, section_metrics):
-    y_axis = []
-    x_axis = []
-    for metric_info in metric_data:
-        y_axis.append(metric_info.timestamp * 1000)
-        x_axis.append(bytes_to_gb(metric_info.value))
+        series.timestamps.append(timestamp)
+        series.values.append(value if isinstance(value, (int, float)) else nan)
+        series.is_start.append(is_start)
+
+    for series in metrics.values():
+        series.finalize()
+    record_rows(sum(len(series) for series in metrics.values()))
+
+    return metrics, last_rowid
+
+
+def _add_chart_debug(
+    metric_data, metric_name, metric_descr, section_metrics, rollups=None
+):
+    x_axis = metric_data.timestamps * 1000
+    y_axis = bytes_to_gb(metric_data.values)
 
     my_chart_def = {
         "title": {"text": metric_name},
         "xAxis": {"type": "datetime"},
         "yAxis": {"title": {"text": f"Available {metric_descr} (GiB)"}, "min": 0},
-        "series": [
-            {"name": f"Available {metric_descr}", "data": list(zip(y_axis, x_axis))}
-        ],
+        "series": [{"name": f"Available {metric_descr}", "data": []}],
     }
-    my_chart = jp.HighCharts(a=section_metrics, classes="m-2 p-2 border")
-    my_chart.options = my_chart_def
+    my_chart = _add_zoomable_chart(
+        section_metrics, my_chart_def, x_axis, y_axis, lttb, rollups
+    )
+    my_chart.metric_key = (metric_data.name, metric_data.type)
+    my_chart.y_axis_from = lambda metric_data, _: bytes_to_gb(metric_data.values)
 
+    return my_chart
 
-def _add_chart_values(metric_data, metric_name, section_metrics):
-    y_axis = []
-    x_axis = []
-    for metric_info in metric_data:
-        y_axis.append(metric_info.timestamp * 1000)
-        x_axis.append(metric_info.value)
+
+def _add_chart_values(metric_data, metric_name, section_metrics, rollups=None):
+    x_axis = metric_data.timestamps * 1000
+    y_axis = metric_data.values
 
     my_chart_def = {
         "title": {"text": metric_name},
         "xAxis": {"type": "datetime"},
         "yAxis": {"title": {"text": "Value"}, "min": 0},
-        "series": [{"name": "Numeric value", "data": list(zip(y_axis, x_axis))}],
+        "series": [{"name": "Numeric value", "data": []}],
     }
-    my_chart = jp.HighCharts(a=section_metrics, classes="m-2 p-2 border")
-    my_chart.options = my_chart_def
+    my_chart = _add_zoomable_chart(
+        section_metrics, my_chart_def, x_axis, y_axis, lttb, rollups
+    )
+    my_chart.metric_key = (metric_data.name, metric_data.type)
+    my_chart.y_axis_from = lambda metric_data, _: metric_data.values
 
+    return my_chart
 
-def _add_chart_counter(metric_data, metric_name, section_metrics):
-    y_axis = []
-    x_axis = []
-    counter = 0
-    for metric_info in metric_data:
-        y_axis.append(metric_info.timestamp * 1000)
-        x_axis.append(counter)
-        counter += 1
 
-    my_chart_def = {
-        "title": {"text": metric_name},
+def _add_chart_counter(counter_rates, section_metrics, rollups=None):
+    """
+    Hits of the counter per bucket of time and their running total, counted by
+    SQLite (or summed from the `rollups`). Zooming in counts the hits in the
+    visible window again, in smaller buckets.
+    """
+    my_chart = jp.HighCharts(a=section_metrics, classes="m-2 p-2 border")
+    my_chart.options = {
+        "chart": {"zoomType": "x"},
+        "title": {"text": counter_rates.name},
         "xAxis": {"type": "datetime"},
-        "yAxis": {"title": {"text": "Hits"}, "min": 0},
-        "series": [{"name": "Hit increment", "data": list(zip(y_axis, x_axis))}],
+        "yAxis": [
+            {"title": {"text": "Hits per bucket"}, "min": 0},
+            {"title": {"text": "Total hits"}, "min": 0, "opposite": True},
+        ],
+        "tooltip": {"shared": True},
+        "series": [
+            {"name": "Hits", "type": "column", "data": []},
+            {"name": "Total", "type": "line", "yAxis": 1, "data": []},
+        ],
     }
-    my_chart = jp.HighCharts(a=section_metrics, classes="m-2 p-2 border")
-    my_chart.options = my_chart_def
+    my_chart.counter_rates = counter_rates
+    my_chart.rollups = rollups
+    my_chart.window = (None, None)
+    _set_counter_series(my_chart)
 
+    _add_to_zoomable_charts(section_metrics, my_chart)
 
-def _add_chart_start_stop(metric_data, metric_name, section_metrics):
-    y_axis = []
-    x_axis = []
-    start_ts = None
-    for cnt, metric_info in enumerate(sorted(metric_data, key=lambda x: x.timestamp)):
-        # make zero the default
-        if cnt == 0:
-            y_axis.append(metric_info.timestamp * 1000 - 1)
-            x_axis.append(0)
-
-        if metric_info.type == Metric.TYPE_START:
-            x_axis.append(metric_info.timestamp)
-            start_ts = metric_info.timestamp
-        else:
-            if not x_axis:  # prevent showing stop metric before start
-                continue
+    return my_chart
 
-            time_diff = metric_info.timestamp - start_ts
-            x_axis[-1] = time_diff
-            x_axis.append(time_diff)
 
-            # default back to zero
-            y_axis.append(metric_info.timestamp * 1000 + 1)
-            x_axis.append(0)
+def _set_counter_series(chart):
+    rates = chart.counter_rates
+    x_axis = rates.bucket_starts() * 1000
 
-        y_axis.append(metric_info.timestamp * 1000)
+    chart.options["series"][0]["data"] = to_chart_data(x_axis, rates.counts)
+    chart.options["series"][0]["pointRange"] = rates.width * 1000
+    chart.options["series"][0]["name"] = f"Hits per {bucket_width_str(rates.width)}"
+    chart.options["series"][1]["data"] = to_chart_data(x_axis, rates.totals())
 
-    my_chart_def = {
-        "title": {"text": metric_name},
+
+async def _set_counter_window(chart, x_min, x_max, wp):
+    if chart.window == (x_min, x_max):
+        return
+
+    # set before the read, so the result of an older zoom is dropped
+    chart.window = (x_min, x_max)
+
+    name = chart.counter_rates.name
+    read_window = functools.partial(
+        read_counter_rates,
+        name=name,
+        x_min=x_min / 1000 if x_min is not None else None,
+        x_max=x_max / 1000 if x_max is not None else None,
+        rollups=chart.rollups,
+    )
+    rates = await run_on_page_db(wp, read_window)
+    if chart.window != (x_min, x_max):
+        return
+
+    chart.counter_rates = rates.get(name) or CounterRates(name, 0, 1)
+    _set_counter_series(chart)
+    chart.options["xAxis"]["min"] = x_min
+    chart.options["xAxis"]["max"] = x_max
+
+
+def _add_counter_hits(chart, metric_data):
+    # zoomed-in chart counts the new hits with the next zoom
+    if chart.window != (None, None):
+        return None
+
+    chart.counter_rates.add_hits(metric_data.timestamps)
+    _set_counter_series(chart)
+
+    return chart_set_data_js(chart)
+
+
+def _add_chart_start_stop(metric_data, metric_name, section_metrics):
+    """
+    Summary of the spans instead of a point for each event: the duration
+    percentiles, histogram of the durations and the spans and their concurrency
+    over time, in buckets.
+    """
+    spans = Spans(metric_data.timestamps, metric_data.is_start)
+    record_rows(len(spans))
+
+    div_spans = jp.Div(a=section_metrics, classes="m-2 p-2 border")
+    jp.H4(a=div_spans, text=metric_name, classes="text-lg font-semibold")
+    jp.P(a=div_spans, text=_spans_summary_str(spans), classes="text-gray-700")
+
+    if not len(spans):
+        return
+
+    edges, counts = duration_histogram(spans.durations)
+    histogram = jp.HighCharts(a=div_spans, classes="my-2")
+    histogram.options = {
+        "chart": {"type": "column", "height": 250},
+        "title": {"text": "Durations"},
+        "xAxis": {
+            "categories": [seconds_to_readable_str(edge) for edge in edges[:-1]],
+            "title": {"text": "At least"},
+        },
+        "yAxis": {"title": {"text": "Spans"}, "min": 0},
+        "legend": {"enabled": False},
+        "plotOptions": {"column": {"groupPadding": 0, "pointPadding": 0}},
+        "series": [{"name": "Spans", "data": counts.tolist()}],
+    }
+
+    timestamps = spans.event_timestamps
+    width = bucket_width(timestamps[-1] - timestamps[0], SPAN_BUCKETS)
+    starts, span_counts, medians, maximums = spans_over_time(spans, width)
+    in_flight_starts, in_flight = in_flight_over_time(spans, width)
+
+    over_time = jp.HighCharts(a=div_spans, classes="my-2")
+    over_time.correlation = section_metrics.correlation
+    over_time.bucket_width = width
+    over_time.on("point_click", _on_point_click)
+    over_time.on("zoom_x", _on_span_zoom)
+    over_time.options = {
+        "chart": {"zoomType": "x"},
+        "title": {"text": f"Spans per {bucket_width_str(width)}"},
         "xAxis": {"type": "datetime"},
-        "yAxis": {"title": {"text": "Seconds"}, "min": 0},
+        "yAxis": [
+            {"title": {"text": "Seconds"}, "min": 0},
+            {"title": {"text": "Spans"}, "min": 0, "opposite": True},
+        ],
+        "tooltip": {"shared": True},
         "series": [
-            {"name": "How long the start/stop took", "data": list(zip(y_axis, x_axis))}
+            {
+                "name": "Started",
+                "type": "column",
+                "yAxis": 1,
+                "data": to_chart_data(starts * 1000, span_counts),
+            },
+            {
+                "name": "Max in flight",
+                "type": "line",
+                "step": "left",
+                "yAxis": 1,
+                "data": to_chart_data(in_flight_starts * 1000, in_flight),
+            },
+            {
+                "name": "Median duration",
+                "type": "line",
+                "data": to_chart_data(starts * 1000, medians),
+            },
+            {
+                "name": "Max duration",
+                "type": "line",
+                "data": to_chart_data(starts * 1000, maximums),
+            },
         ],
     }
+
+
+def _spans_summary_str(spans):
+    stats = duration_stats(spans.durations)
+    parts = [f"{stats['count']} spans"]
+    for key in ["p50", "p90", "p99", "max", "total"]:
+        if key in stats:
+            parts.append(f"{key} {seconds_to_readable_str(stats[key])}")
+
+    if spans.unclosed:
+        parts.append(f"{spans.unclosed} not stopped")
+    if spans.unmatched_stops:
+        parts.append(f"{spans.unmatched_stops} stops without a start")
+    if len(spans.in_flight):
+        parts.append(f"up to {spans.in_flight.max()} at once")
+
+    return ", ".join(parts)
+
+
+def _add_zoomable_chart(
+    section_metrics, chart_def, x_axis, y_axis, method, rollups=None
+):
+    """
+    Only `POINT_BUDGET` points of the series are sent to the browser. The full
+    resolution series is kept with the chart, so when the user zooms in, the
+    visible window is downsampled again with higher resolution.
+
+    With `rollups`, the series is already downsampled and the points of the
+    visible window are read from the rollups again instead.
+    """
+    chart_def["chart"] = {"zoomType": "x"}
     my_chart = jp.HighCharts(a=section_metrics, classes="m-2 p-2 border")
-    my_chart.options = my_chart_def
+    my_chart.options = chart_def
+    my_chart.rollups = rollups
+
+    if rollups is not None:
+        chart_def["series"][0]["data"] = to_chart_data(x_axis, y_axis)
+        my_chart.window = (None, None)
+    else:
+        x_axis = np.asarray(x_axis, dtype=np.float64)
+        y_axis = np.asarray(y_axis, dtype=np.float64)
+        order = np.argsort(x_axis, kind="stable")
+        my_chart.full_x_axis = x_axis[order]
+        my_chart.full_y_axis = y_axis[order]
+        my_chart.downsample_method = method
+        my_chart.window = None
+        _set_chart_window(my_chart, None, None)
+
+    _add_to_zoomable_charts(section_metrics, my_chart)
+
+    return my_chart
+
+
+def _add_to_zoomable_charts(section_metrics, chart):
+    if not hasattr(section_metrics, "zoomable_charts"):
+        section_metrics.zoomable_charts = []
+    section_metrics.zoomable_charts.append(chart)
+    chart.synchronized_charts = section_metrics.zoomable_charts
+
+    chart.on("zoom_x", _zoom_charts)
+
+    chart.correlation = section_metrics.correlation
+    chart.on("point_click", _on_point_click)
+
+
+def _set_chart_window(chart, x_min, x_max):
+    if chart.window == (x_min, x_max):
+        return False
+
+    x_axis, y_axis = downsample_window(
+        chart.full_x_axis,
+        chart.full_y_axis,
+        x_min,
+        x_max,
+        method=chart.downsample_method,
+    )
+    chart.options["series"][0]["data"] = to_chart_data(x_axis, y_axis)
+    chart.options["xAxis"]["min"] = x_min
+    chart.options["xAxis"]["max"] = x_max
+    chart.window = (x_min, x_max)
+
+    return True
+
+
+async def _set_rollup_window(chart, x_min, x_max, wp):
+    if chart.window == (x_min, x_max):
+        return
+
+    # set before the read, so the result of an older zoom is dropped
+    chart.window = (x_min, x_max)
+
+    name, metric_type = chart.metric_key
+    read_window = functools.partial(
+        _read_rollup_series,
+        rollups=chart.rollups,
+        name=name,
+        metric_type=metric_type,
+        x_min=x_min / 1000 if x_min is not None else None,
+        x_max=x_max / 1000 if x_max is not None else None,
+    )
+    metric_data = await run_on_page_db(wp, read_window)
+    if chart.window != (x_min, x_max):
+        return
+
+    chart.options["series"][0]["data"] = to_chart_data(
+        metric_data.timestamps * 1000, chart.y_axis_from(metric_data, len(metric_data))
+    )
+    chart.options["xAxis"]["min"] = x_min
+    chart.options["xAxis"]["max"] = x_max
+
+
+async def _zoom_charts(self, msg):
+    # the charts are zoomed together, same as with the `syncExtremes`
+    windows = []
+    for chart in self.synchronized_charts:
+        if hasattr(chart, "counter_rates"):
+            windows.append(_set_counter_window(chart, msg.min, msg.max, msg.page))
+        elif chart.rollups is not None:
+            windows.append(_set_rollup_window(chart, msg.min, msg.max, msg.page))
+        else:
+            _set_chart_window(chart, msg.min, msg.max)
+
+    if msg.min is not None:
+        windows.append(
+            self.correlation.show_between(msg.min / 1000, msg.max / 1000, msg.page)
+        )
+
+    # the counters, the rollups and the logs of the window are read again, by
+    # the workers of the page at once
+    await asyncio.gather(*windows)
+
+
+async def _on_span_zoom(self, msg):
+    if msg.min is not None:
+        await self.correlation.show_between(msg.min / 1000, msg.max / 1000, msg.page)
+
+
+async def _on_point_click(self, msg):
+    if msg.x is None:
+        return
+
+    # columns of the counters and the spans stand for their whole bucket
+    if hasattr(self, "counter_rates"):
+        width = self.counter_rates.width
+    else:
+        width = getattr(self, "bucket_width", None)
+
+    timestamp = msg.x / 1000
+    if width:
+        await self.correlation.show_between(timestamp, timestamp + width, msg.page)
+    else:
+        await self.correlation.show_around(timestamp, msg.page)
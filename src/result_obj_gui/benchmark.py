@@ -0,0 +1,400 @@
+#! /usr/bin/env python3
+"""
+Measure how the report scales with the size of the result file.
+
+Generates a synthetic result_obj database of the given size, builds the report
+from it a couple of times and writes the timings of each stage, together with
+the size of the data justpy sends to the browser, as JSON. Compare two outputs
+to see regressions.
+
+The commands called from scripts are timed too, with `python -X importtime`,
+and must stay under the import time budget (the exit status is 1 if not).
+"""
+import os
+import os.path
+import sys
+import json
+import time
+import pickle
+import random
+import sqlite3
+import argparse
+import tempfile
+import platform
+import subprocess
+
+from result_obj.metrics import Metric
+from result_obj.result_obj import DataTypes
+
+from db import open_db
+from sections import _lazy_sections
+from sections import _load_lazy_section
+
+from add_section_metrics import read_metrics
+
+from report import generate_report
+
+
+# only the columns used by the GUI, in the tables created by result_obj
+SCHEMA = """
+CREATE TABLE Metadata (timestamp REAL, argv TEXT, pwd TEXT);
+CREATE TABLE MetadataEnvVars (key TEXT, value TEXT);
+CREATE TABLE StatusHistory (timestamp REAL, status TEXT);
+CREATE TABLE RestorePoint (timestamp REAL, type TEXT, restore_data BLOB);
+CREATE TABLE Result (timestamp REAL, type TEXT, result BLOB);
+CREATE TABLE Logs (
+    created REAL, levelname TEXT, msg TEXT, filename TEXT, lineno INTEGER,
+    funcName TEXT, name TEXT, module TEXT, pathname TEXT, process INTEGER,
+    processName TEXT, thread INTEGER, threadName TEXT
+);
+CREATE TABLE Metrics (timestamp REAL, name TEXT, type TEXT, value REAL);
+"""
+
+LOG_LEVELS = ["DEBUG", "INFO", "INFO", "INFO", "WARNING", "ERROR"]
+METRIC_TYPES = [Metric.TYPE_VALUE, Metric.TYPE_INCREMENT, Metric.TYPE_START]
+BATCH_SIZE = 10000
+
+SCRIPT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "result_obj_gui.py"
+)
+# commands which don't build the report, run by scripts many times a day
+LIGHT_COMMANDS = [
+    ["--help"],
+    ["info", "{sqlite}"],
+    ["metrics", "{sqlite}"],
+    ["dump", "{sqlite}", "Metadata"],
+]
+IMPORT_BUDGET = 0.1  # seconds, of all the imports of one command
+
+
+def generate_database(
+    sqlite_path,
+    logs=10000,
+    metric_names=10,
+    samples=1000,
+    statuses=100,
+    restore_points=1,
+    restore_point_size=1024 * 1024,
+    duration=3600.0,
+    seed=0,
+):
+    """
+    Create result file with `logs` log records, `metric_names` metrics with
+    `samples` samples each (values, counters and start / stop pairs in turns),
+    `statuses` status messages and `restore_points` pickles of about
+    `restore_point_size` bytes, spread over `duration` seconds.
+    """
+    rng = random.Random(seed)
+    start = time.time() - duration
+
+    db = sqlite3.connect(sqlite_path)
+    try:
+        db.executescript(SCHEMA)
+
+        db.execute(
+            "INSERT INTO Metadata VALUES (?, ?, ?)",
+            (start, repr(["benchmark.py"]), os.getcwd()),
+        )
+        db.execute(
+            "INSERT INTO Metadata VALUES (?, ?, ?)",
+            (start + duration, repr(["benchmark.py"]), os.getcwd()),
+        )
+        db.executemany(
+            "INSERT INTO MetadataEnvVars VALUES (?, ?)",
+            [(f"VARIABLE_{i}", "value " * i) for i in range(30)],
+        )
+
+        db.executemany(
+            "INSERT INTO StatusHistory VALUES (?, ?)",
+            (
+                (start + i * duration / max(statuses, 1), f"Step {i} of {statuses}")
+                for i in range(statuses)
+            ),
+        )
+
+        for i in range(restore_points):
+            data = {"step": i, "state": rng.randbytes(restore_point_size)}
+            db.execute(
+                "INSERT INTO RestorePoint VALUES (?, ?, ?)",
+                (start + i, DataTypes.pickle, pickle.dumps(data)),
+            )
+        db.execute(
+            "INSERT INTO Result VALUES (?, ?, ?)",
+            (start + duration, DataTypes.pickle, pickle.dumps({"result": 42})),
+        )
+
+        _insert_batches(db, "Logs", _generate_logs(rng, logs, start, duration))
+        _insert_batches(
+            db,
+            "Metrics",
+            _generate_metrics(rng, metric_names, samples, start, duration),
+        )
+
+        db.commit()
+    finally:
+        db.close()
+
+
+def _insert_batches(db, table_name, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            _insert(db, table_name, batch)
+            batch = []
+
+    if batch:
+        _insert(db, table_name, batch)
+
+
+def _insert(db, table_name, rows):
+    placeholders = ", ".join("?" * len(rows[0]))
+    db.executemany(f"INSERT INTO {table_name} VALUES ({placeholders})", rows)
+
+
+def _generate_logs(rng, count, start, duration):
+    for i in range(count):
+        process = rng.randrange(4)
+        thread = rng.randrange(8)
+        yield (
+            start + i * duration / count,
+            rng.choice(LOG_LEVELS),
+            f"Processing item {i}: {rng.random():.6f}",
+            f"module_{i % 7}.py",
+            rng.randrange(1, 500),
+            f"function_{i % 13}",
+            f"logger.{i % 5}",
+            f"module_{i % 7}",
+            f"/path/to/module_{i % 7}.py",
+            1000 + process,
+            f"Process-{process}",
+            140000 + thread,
+            f"Thread-{thread}",
+        )
+
+
+def _generate_metrics(rng, metric_names, samples, start, duration):
+    # stored as they come, interleaved in time, like from a running program
+    step = duration / max(samples, 1)
+    for sample in range(samples):
+        timestamp = start + sample * step
+        for i in range(metric_names):
+            metric_type = METRIC_TYPES[i % len(METRIC_TYPES)]
+            name = f"metric_{i}_{metric_type}"
+
+            if metric_type == Metric.TYPE_VALUE:
+                yield timestamp, name, metric_type, rng.gauss(100, 15)
+            elif metric_type == Metric.TYPE_INCREMENT:
+                yield timestamp, name, metric_type, None
+            else:
+                yield timestamp, name, Metric.TYPE_START, None
+                yield timestamp + rng.random() * step, name, Metric.TYPE_STOP, None
+
+
+def run_benchmark(sqlite_path, index=False, repeat=3):
+    """
+    Build the report from `sqlite_path` `repeat` times and return the best time
+    of each stage, together with the sizes of the page.
+    """
+    timings = {}
+
+    def measure(stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        timings.setdefault(stage, []).append(time.perf_counter() - start)
+
+        return result
+
+    sizes = {}
+    for _ in range(repeat):
+        db = measure("open_db", open_db, sqlite_path, index)
+        measure("read_metrics", read_metrics, db)
+        db.close()
+
+        wp = measure(
+            "generate_report",
+            lambda: generate_report(sqlite_path, index)(),
+        )
+        first_paint = measure("serialize first paint", _serialize, wp)
+
+        for section in _lazy_sections(wp):
+            measure(f"section {section.id}", _load_lazy_section, section, wp.db)
+
+        all_sections = measure("serialize all sections", _serialize, wp)
+
+        sizes = {
+            "first_paint": len(first_paint.encode("utf-8")),
+            "all_sections": len(all_sections.encode("utf-8")),
+        }
+        wp.db_workers.close()
+        wp.db.close()
+        wp.delete_components()
+
+    return {
+        "seconds": {stage: min(runs) for stage, runs in timings.items()},
+        "runs": timings,
+        "payload_bytes": sizes,
+    }
+
+
+def measure_imports(sqlite_path, budget=IMPORT_BUDGET):
+    """
+    Run each of `LIGHT_COMMANDS` with `python -X importtime` and return the
+    time spent by its imports, with the heaviest modules, the wall time of the
+    whole command and whether the imports fit into the `budget`.
+    """
+    results = {}
+    for command in LIGHT_COMMANDS:
+        argv = [arg.format(sqlite=sqlite_path) for arg in command]
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", SCRIPT_PATH] + argv,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        seconds = time.perf_counter() - start
+
+        imports = _parse_import_times(process.stderr)
+        import_seconds = sum(imports.values())
+        results[command[0]] = {
+            "seconds": seconds,
+            "import_seconds": import_seconds,
+            "heaviest_imports": sorted(imports.items(), key=lambda x: -x[1])[:5],
+            "within_budget": import_seconds <= budget,
+        }
+
+    return results
+
+
+def _parse_import_times(stderr):
+    """Cumulative seconds of the top level imports in `-X importtime` output."""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # the nested imports are indented
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            imports[name.strip()] = int(cumulative) / 1e6
+
+    return imports
+
+
+def _serialize(wp):
+    # what justpy sends through the websocket
+    return json.dumps(wp.build_list(), default=str)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-o", "--output", help="Write the JSON here instead of to stdout."
+    )
+    parser.add_argument(
+        "--sqlite",
+        help="Benchmark this result file instead of generating a synthetic one.",
+    )
+    parser.add_argument("--keep", action="store_true", help="Keep the generated file.")
+    parser.add_argument("--logs", type=int, default=10000, help="Default %(default)s.")
+    parser.add_argument(
+        "--metrics", type=int, default=10, help="Metric names. Default %(default)s."
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=1000,
+        help="Samples of each metric. Default %(default)s.",
+    )
+    parser.add_argument(
+        "--statuses", type=int, default=100, help="Default %(default)s."
+    )
+    parser.add_argument(
+        "--restore-points", type=int, default=1, help="Default %(default)s."
+    )
+    parser.add_argument(
+        "--restore-point-size",
+        type=int,
+        default=1024 * 1024,
+        help="In bytes. Default %(default)s.",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Use the sidecar database with indexes (the time to create it is "
+        "in the first run of `open_db`).",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Default %(default)s.")
+    parser.add_argument("--seed", type=int, default=0, help="Default %(default)s.")
+    parser.add_argument(
+        "--imports",
+        action="store_true",
+        help="Only measure the import time of the commands run from scripts.",
+    )
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=IMPORT_BUDGET,
+        help="Seconds. Default %(default)s.",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+
+    parameters = {
+        "logs": args.logs,
+        "metric_names": args.metrics,
+        "samples": args.samples,
+        "statuses": args.statuses,
+        "restore_points": args.restore_points,
+        "restore_point_size": args.restore_point_size,
+        "seed": args.seed,
+    }
+
+    sqlite_path = args.sqlite
+    if not sqlite_path:
+        fd, sqlite_path = tempfile.mkstemp(prefix="result_obj_bench_", suffix=".sqlite")
+        os.close(fd)
+        os.unlink(sqlite_path)
+
+        start = time.perf_counter()
+        generate_database(sqlite_path, **parameters)
+        parameters["generated_in"] = time.perf_counter() - start
+
+    database_bytes = os.path.getsize(sqlite_path)
+    try:
+        results = {}
+        if not args.imports:
+            results = run_benchmark(sqlite_path, index=args.index, repeat=args.repeat)
+        results["imports"] = measure_imports(sqlite_path, args.import_budget)
+    finally:
+        if not args.sqlite and not args.keep:
+            os.unlink(sqlite_path)
+
+    output = {
+        "sqlite": args.sqlite,
+        "database_bytes": database_bytes,
+        "parameters": parameters if not args.sqlite else None,
+        "index": args.index,
+        "repeat": args.repeat,
+        "import_budget": args.import_budget,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        **results,
+    }
+
+    output_json = json.dumps(output, indent=4, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output_json + "\n")
+    else:
+        print(output_json)
+
+    if not all(command["within_budget"] for command in results["imports"].values()):
+        sys.exit(1)
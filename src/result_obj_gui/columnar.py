@@ -0,0 +1,250 @@
+import base64
+
+import numpy as np
+import justpy as jp
+
+
+_INT32 = np.iinfo(np.int32)
+_MAX_SAFE_INTEGER = 2**53  # of JavaScript numbers
+
+columnar_js = """
+// Grid rows and chart points are sent as columns, see columnar.py. The grids
+// and charts decode them when they are created or updated.
+var COLUMN_ARRAYS = {
+    f64: Float64Array, f32: Float32Array, i32: Int32Array,
+    u8: Uint8Array, u16: Uint16Array, u32: Uint32Array
+};
+
+function isColumnar(data) {
+    return data !== null && typeof data === 'object' && !Array.isArray(data)
+        && data.columnar !== undefined;
+}
+
+function decodeColumn(column) {
+    if (column.values) {
+        return column.values;
+    }
+    if (column.dict) {
+        var codes = decodeColumn(column.codes);
+        var values = new Array(codes.length);
+        for (var i = 0; i < codes.length; i++) {
+            values[i] = column.dict[codes[i]];
+        }
+        return values;
+    }
+    for (var type in COLUMN_ARRAYS) {
+        if (column[type] !== undefined) {
+            var binary = atob(column[type]);
+            var bytes = new Uint8Array(binary.length);
+            for (var i = 0; i < binary.length; i++) {
+                bytes[i] = binary.charCodeAt(i);
+            }
+            return new COLUMN_ARRAYS[type](bytes.buffer);
+        }
+    }
+}
+
+function columnValue(value) {
+    return value !== value ? null : value;  // NaN stands for a missing value
+}
+
+function decodeRows(data) {
+    if (!isColumnar(data)) {
+        return data;
+    }
+    var names = Object.keys(data.columns);
+    var columns = names.map(function (name) {
+        return decodeColumn(data.columns[name]);
+    });
+    var rows = new Array(data.columnar);
+    for (var i = 0; i < data.columnar; i++) {
+        var row = {};
+        for (var j = 0; j < names.length; j++) {
+            row[names[j]] = columnValue(columns[j][i]);
+        }
+        rows[i] = row;
+    }
+    return rows;
+}
+
+function decodePoints(data) {
+    if (!isColumnar(data)) {
+        return data;
+    }
+    var x = decodeColumn(data.columns.x);
+    var y = decodeColumn(data.columns.y);
+    var points = new Array(data.columnar);
+    for (var i = 0; i < data.columnar; i++) {
+        points[i] = [x[i], columnValue(y[i])];
+    }
+    return points;
+}
+
+function decodeChartOptions(options) {
+    if (!options || !Array.isArray(options.series)) {
+        return options;
+    }
+    // a copy, justpy compares the options it sent with the next ones
+    return Object.assign({}, options, {
+        series: options.series.map(function (series) {
+            if (!series || !isColumnar(series.data)) {
+                return series;
+            }
+            return Object.assign({}, series, {data: decodePoints(series.data)});
+        })
+    });
+}
+
+(function () {
+    if (window.agGrid) {
+        var Grid = agGrid.Grid;
+        agGrid.Grid = function (element, options, params) {
+            options.rowData = decodeRows(options.rowData);
+            return new Grid(element, options, params);
+        };
+    }
+
+    if (window.Highcharts) {
+        var chartInit = Highcharts.Chart.prototype.init;
+        Highcharts.Chart.prototype.init = function (options, callback) {
+            return chartInit.call(this, decodeChartOptions(options), callback);
+        };
+        var chartUpdate = Highcharts.Chart.prototype.update;
+        Highcharts.Chart.prototype.update = function (options) {
+            var args = Array.prototype.slice.call(arguments);
+            args[0] = decodeChartOptions(options);
+            return chartUpdate.apply(this, args);
+        };
+    }
+})();
+"""
+
+
+class ColumnarGrid(jp.AgGrid):
+    """
+    AgGrid sending its rows as columns, decoded by `columnar_js` in the page.
+    `options.rowData` stays a list of dicts on the server.
+    """
+
+    def convert_object_to_dict(self):
+        # justpy would deep copy all the rows, they are encoded instead
+        rows = self.options.rowData
+        self.options.rowData = []
+        try:
+            grid_dict = super().convert_object_to_dict()
+        finally:
+            self.options.rowData = rows
+
+        grid_dict["def"]["rowData"] = encode_rows(rows)
+
+        return grid_dict
+
+
+def encode_rows(rows):
+    """
+    Grid rows (dicts with the same keys) as columns: numbers as typed arrays,
+    repeated strings as a dictionary with indexes into it, the rest as lists.
+    """
+    fields = list(rows[0]) if rows else []
+
+    return {
+        "columnar": len(rows),
+        "columns": {
+            field: encode_column([row.get(field) for row in rows]) for field in fields
+        },
+    }
+
+
+def encode_points(x_axis, y_axis):
+    """Points of a Highcharts series as the `x` and `y` columns, NaN for gaps."""
+    return {
+        "columnar": len(x_axis),
+        "columns": {"x": encode_numbers(x_axis), "y": encode_numbers(y_axis)},
+    }
+
+
+def decode_points(data):
+    """Inverse of `encode_points()`, returns the `(x_axis, y_axis)` arrays."""
+    return (
+        decode_numbers(data["columns"]["x"]),
+        decode_numbers(data["columns"]["y"]),
+    )
+
+
+def append_points(data, x_axis, y_axis):
+    x_old, y_old = decode_points(data)
+
+    return encode_points(
+        np.concatenate((x_old, np.asarray(x_axis, dtype=np.float64))),
+        np.concatenate((y_old, np.asarray(y_axis, dtype=np.float64))),
+    )
+
+
+def encode_column(values):
+    if values and all(_is_number(value) for value in values):
+        return encode_numbers(values)
+
+    if all(value is None or isinstance(value, str) for value in values):
+        dictionary = {}
+        codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+        # unique values, like messages, are smaller as they are
+        if len(dictionary) <= len(values) // 2:
+            return {"dict": list(dictionary), "codes": _encode_codes(codes)}
+
+    return {"values": values}
+
+
+def encode_numbers(values):
+    """The smallest typed array holding the `values` exactly."""
+    array = np.asarray(values, dtype=np.float64)
+
+    if _fits_int32(array):
+        return {"i32": _base64(array.astype("<i4"))}
+
+    if np.array_equal(array.astype(np.float32), array, equal_nan=True):
+        return {"f32": _base64(array.astype("<f4"))}
+
+    return {"f64": _base64(array.astype("<f8"))}
+
+
+_DTYPES = {"f64": "<f8", "f32": "<f4", "i32": "<i4"}
+
+
+def decode_numbers(column):
+    for name, dtype in _DTYPES.items():
+        if name in column:
+            buffer = base64.b64decode(column[name])
+            return np.frombuffer(buffer, dtype=dtype).astype(np.float64)
+
+    return np.asarray(column["values"], dtype=np.float64)
+
+
+def _fits_int32(array):
+    if not len(array):
+        return True
+    if not np.isfinite(array).all():
+        return False
+
+    return (
+        np.all(array == np.round(array))
+        and array.min() >= _INT32.min
+        and array.max() <= _INT32.max
+    )
+
+
+def _encode_codes(codes):
+    highest = max(codes, default=0)
+    for name, dtype in (("u8", "<u1"), ("u16", "<u2"), ("u32", "<u4")):
+        if highest <= np.iinfo(dtype).max:
+            return {name: _base64(np.asarray(codes, dtype=dtype))}
+
+
+def _is_number(value):
+    if isinstance(value, int):
+        return not isinstance(value, bool) and abs(value) < _MAX_SAFE_INTEGER
+
+    return isinstance(value, float)
+
+
+def _base64(array):
+    return base64.b64encode(array.tobytes()).decode("ascii")
@@ -0,0 +1,352 @@
+import os
+import os.path
+from concurrent.futures import ThreadPoolExecutor
+
+import justpy as jp
+
+from result_obj.metrics import Metric
+
+from db import open_db
+from db import table_has_rows
+from db import read_metadata_bounds
+
+from diagnostics import Diagnostics
+
+from utils import str_from_ts
+from sections import _add_navigation
+from sections import _create_section
+from sections import observe_lazy_sections
+
+from downsample import lttb
+from downsample import POINT_BUDGET
+from downsample import to_chart_data
+from downsample import min_max_buckets
+
+from columnar import columnar_js
+
+from add_section_diagnostics import add_diagnostics_section
+
+from add_section_metrics import read_metrics_section
+
+from logs_aggregation import level_order
+
+from counters import CounterRates
+
+from spans import Spans
+from spans import PERCENTILES
+from spans import duration_stats
+
+
+# points of one series are shared by all the runs in the chart, but each run
+# keeps at least this many
+MIN_RUN_POINTS = 200
+
+
+class Run:
+    """Everything the comparison needs from one result file."""
+
+    def __init__(self, sqlite_path, index=False):
+        self.sqlite_path = sqlite_path
+        self.name = os.path.basename(sqlite_path)
+
+        # sqlite3 connections can't be shared between threads, so each run is
+        # read by its own connection in the thread which loads it
+        db = open_db(sqlite_path, index)
+        try:
+            metadata_start, metadata_end = read_metadata_bounds(db)
+            self.start_ts = metadata_start["timestamp"]
+            self.end_ts = metadata_end["timestamp"]
+
+            # counters as hits per bucket, the values from the rollups (when
+            # the cache is writable), the spans point by point
+            self.metrics = {}
+            self.rolled_up = False
+            if table_has_rows(db, "Metrics"):
+                self.metrics, counter_rates, _, rollups = read_metrics_section(db)
+                for name, rates in counter_rates.items():
+                    self.metrics[(name, Metric.TYPE_INCREMENT)] = rates
+                self.rolled_up = rollups is not None
+
+            self.level_counts = {}
+            if table_has_rows(db, "Logs"):
+                cursor = db.execute(
+                    "SELECT levelname, count(*) FROM Logs GROUP BY levelname"
+                )
+                self.level_counts = dict(cursor.fetchall())
+        finally:
+            db.close()
+
+    def offsets(self, series):
+        """Timestamps of the `series` as seconds from the start of this run."""
+        return series.timestamps - self.start_ts
+
+
+def load_runs(sqlite_paths, index=False, diagnostics=None):
+    """Read the result files concurrently, returns the runs in the same order."""
+    # the threads don't see the running stage, each run is a stage of its own
+    load_run = diagnostics.wrap("Run", Run) if diagnostics else Run
+
+    max_workers = min(len(sqlite_paths), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda path: load_run(path, index), sqlite_paths))
+
+
+def generate_comparison(sqlite_paths, index=False, diagnostics=None):
+    wp = jp.WebPage(delete_flag=False)
+    wp.body_html = f"<script>{columnar_js}</script>"  # chart points, see columnar.py
+    wp.on("page_ready", observe_lazy_sections)
+    div_container = jp.Div(
+        a=jp.Div(a=wp, classes="md:container md:mx-auto"),
+        classes="min-h-screen flex flex-row bg-gray-100",
+    )
+
+    wp.diagnostics = diagnostics or Diagnostics()
+    wp.diagnostics.watch_page(wp)
+
+    with wp.diagnostics.stage("load_runs"):
+        runs = load_runs(sqlite_paths, index, wp.diagnostics)
+
+    div_content = jp.Div(classes="p-3 w-full")
+    with wp.diagnostics.stage("_generate_comparison_sections"):
+        sections_iterator = _generate_comparison_sections(
+            div_content, runs, wp.diagnostics
+        )
+        div_navigation = _add_navigation(sections_iterator)
+
+    div_container.add(div_navigation)
+    div_container.add(div_content)
+
+    return lambda: wp
+
+
+def _generate_comparison_sections(div_content, runs, diagnostics):
+    section_title = jp.Section(a=div_content)
+    h1 = jp.H1(a=section_title, classes="text-2xl pt-4 text-center")
+    h1.add(jp.Code(text="result_obj"))
+    h1.add(jp.Span(text=f" comparison of {len(runs)} runs"))
+
+    yield _add_runs_section(div_content, runs)
+    yield _add_compared_metrics_section(div_content, runs)
+    yield _add_durations_section(div_content, runs)
+    yield _add_log_levels_section(div_content, runs)
+
+    if diagnostics.enabled:
+        yield add_diagnostics_section(div_content, diagnostics)
+
+
+def _add_runs_section(div_content, runs):
+    section_runs = _create_section(div_content, "Runs")
+
+    table_options = _grid_options(
+        [
+            {"headerName": "Run", "field": "run"},
+            {"headerName": "Path", "field": "path", "minWidth": 400},
+            {"headerName": "Started", "field": "started"},
+            {"headerName": "Duration (s)", "field": "duration"},
+            {"headerName": "Metrics", "field": "metrics"},
+            {"headerName": "Logs", "field": "logs"},
+        ]
+    )
+    for run in runs:
+        table_options["rowData"].append(
+            {
+                "run": run.name,
+                "path": os.path.abspath(run.sqlite_path),
+                "started": str_from_ts(run.start_ts),
+                "duration": round(run.end_ts - run.start_ts, 3),
+                "metrics": len(run.metrics),
+                "logs": sum(run.level_counts.values()),
+            }
+        )
+
+    jp.AgGrid(a=section_runs, options=table_options, style="height: 300px")
+
+    return section_runs
+
+
+def _add_compared_metrics_section(div_content, runs):
+    keys = _metric_keys(runs)
+    if not keys:
+        return None
+
+    section_metrics = _create_section(div_content, "Metrics")
+    jp.P(
+        a=section_metrics,
+        text="Same-named metrics of all the runs, in seconds from the start of "
+        "each run.",
+        classes="text-gray-600",
+    )
+
+    point_budget = max(POINT_BUDGET // len(runs), MIN_RUN_POINTS)
+    for metric_name, metric_type in keys:
+        series = []
+        for run in runs:
+            metric_data = run.metrics.get((metric_name, metric_type))
+            if metric_data is None or not len(metric_data):
+                continue
+
+            x_axis, y_axis, method = _compared_series(run, metric_data)
+            x_axis, y_axis = method(x_axis, y_axis, point_budget)
+            series.append({"name": run.name, "data": to_chart_data(x_axis, y_axis)})
+
+        chart = jp.HighCharts(a=section_metrics, classes="m-2 p-2 border")
+        chart.options = {
+            "chart": {"zoomType": "x"},
+            "title": {"text": metric_name},
+            "xAxis": {"title": {"text": "Seconds from the start"}},
+            "yAxis": {"title": {"text": _Y_AXIS_TITLES[metric_type]}, "min": 0},
+            "legend": {"enabled": True},
+            "tooltip": {"shared": True},
+            "series": series,
+        }
+
+    return section_metrics
+
+
+_Y_AXIS_TITLES = {
+    Metric.TYPE_VALUE: "Value",
+    Metric.TYPE_INCREMENT: "Hits",
+    Metric.TYPE_START: "Seconds",
+}
+
+
+def _metric_keys(runs):
+    """Metrics of all the runs, in the order they first appear."""
+    keys = {}
+    for run in runs:
+        for key in run.metrics:
+            if key[1] in _Y_AXIS_TITLES:
+                keys.setdefault(key, None)
+
+    return list(keys)
+
+
+def _compared_series(run, metric_data):
+    if isinstance(metric_data, CounterRates):
+        x_axis = metric_data.bucket_starts() - run.start_ts
+        return x_axis, metric_data.totals(), lttb
+
+    if metric_data.type == Metric.TYPE_START:
+        spans = Spans(metric_data.timestamps, metric_data.is_start)
+        # min/max keeps the slowest calls, which are the interesting ones
+        return spans.starts - run.start_ts, spans.durations, min_max_buckets
+
+    # the points of the rollups are minima and maxima of buckets already
+    method = min_max_buckets if run.rolled_up else lttb
+    return run.offsets(metric_data), metric_data.values, method
+
+
+def _add_durations_section(div_content, runs):
+    keys = [key for key in _metric_keys(runs) if key[1] == Metric.TYPE_START]
+    if not keys:
+        return None
+
+    section_durations = _create_section(div_content, "Durations")
+    jp.P(
+        a=section_durations,
+        text="Distribution of the start/stop durations in seconds, the changes "
+        "are relative to the first run.",
+        classes="text-gray-600",
+    )
+
+    percentile_columns = [f"p{percentile}" for percentile in PERCENTILES]
+    table_options = _grid_options(
+        [
+            {"headerName": "Metric", "field": "metric", "minWidth": 250},
+            {"headerName": "Run", "field": "run"},
+            {"headerName": "Count", "field": "count"},
+            {"headerName": "Mean", "field": "mean"},
+            *({"headerName": column, "field": column} for column in percentile_columns),
+            {"headerName": "Max", "field": "max"},
+            {"headerName": "Total", "field": "total"},
+            {"headerName": "Median change", "field": "p50_change"},
+            {"headerName": "Total change", "field": "total_change"},
+        ]
+    )
+
+    for metric_name, metric_type in keys:
+        baseline = None
+        for run in runs:
+            metric_data = run.metrics.get((metric_name, metric_type))
+            if metric_data is None:
+                continue
+
+            spans = Spans(metric_data.timestamps, metric_data.is_start)
+            stats = duration_stats(spans.durations)
+            row = {"metric": metric_name, "run": run.name}
+            row.update((key, round(value, 6)) for key, value in stats.items())
+
+            # no changes without the first run to compare with
+            if run is runs[0]:
+                baseline = row
+            elif baseline is not None:
+                row["p50_change"] = _change_str(baseline.get("p50"), row.get("p50"))
+                row["total_change"] = _change_str(
+                    baseline.get("total"), row.get("total")
+                )
+
+            table_options["rowData"].append(row)
+
+    jp.AgGrid(a=section_durations, options=table_options, style="height: 600px")
+
+    return section_durations
+
+
+def _add_log_levels_section(div_content, runs):
+    levels = {level for run in runs for level in run.level_counts}
+    if not levels:
+        return None
+
+    section_levels = _create_section(div_content, "Log levels")
+    jp.P(
+        a=section_levels,
+        text="Count of the log records by level, the changes are relative to "
+        "the first run.",
+        classes="text-gray-600",
+    )
+
+    baseline = runs[0]
+    columns = [{"headerName": "Level", "field": "level"}]
+    for cnt, run in enumerate(runs):
+        columns.append({"headerName": run.name, "field": f"run_{cnt}"})
+        if cnt:
+            columns.append(
+                {"headerName": f"{run.name} change", "field": f"change_{cnt}"}
+            )
+    table_options = _grid_options(columns)
+
+    for level in sorted(levels, key=level_order):
+        row = {"level": level}
+        for cnt, run in enumerate(runs):
+            row[f"run_{cnt}"] = run.level_counts.get(level, 0)
+            if cnt:
+                row[f"change_{cnt}"] = _change_str(
+                    baseline.level_counts.get(level, 0), row[f"run_{cnt}"]
+                )
+        table_options["rowData"].append(row)
+
+    jp.AgGrid(a=section_levels, options=table_options, style="height: 300px")
+
+    return section_levels
+
+
+def _change_str(baseline, value):
+    if baseline is None or value is None:
+        return ""
+    if baseline == 0:
+        return "" if value == 0 else "new"
+
+    return f"{(value - baseline) / baseline:+.1%}"
+
+
+def _grid_options(column_defs):
+    return {
+        "defaultColDef": {
+            "filter": True,
+            "sortable": True,
+            "resizable": True,
+            "headerClass": "font-bold",
+        },
+        "columnDefs": column_defs,
+        "rowData": [],
+    }
@@ -0,0 +1,232 @@
+import html
+import sqlite3
+
+import justpy as jp
+
+from db import database_path
+from db import run_on_page_db
+
+from sidecar import has_sidecar
+from sidecar import attach_sidecar
+from sidecar import update_time_index
+
+from diagnostics import record_rows
+
+from utils import str_from_ts
+from utils import htmls_from_ts
+
+
+TIME_INDEX_SCHEMA = "bytime"
+AROUND_ROWS = 25  # before and after the clicked time
+RANGE_ROWS = 200
+
+# (table, time column, sidecar table ordered by it, shown columns)
+CORRELATED_TABLES = {
+    "status": ("StatusHistory", "timestamp", "StatusHistoryByTimestamp", ["status"]),
+    "logs": ("Logs", "created", "LogsByCreated", ["levelname", "name", "msg"]),
+}
+
+LEVEL_CLASSES = {
+    "WARNING": "text-yellow-700",
+    "ERROR": "text-red-700",
+    "CRITICAL": "text-red-700 font-bold",
+}
+
+
+class CorrelationPanel:
+    """
+    Side panel with the status messages and the logs around the time of the
+    point clicked in a chart of the Metrics section, or in the range selected
+    (zoomed to) in it.
+
+    They are looked up by `read_around()` and `read_between()` in the sidecar
+    tables ordered by time, which are created by the first lookup.
+    """
+
+    def __init__(self, div):
+        self.window = None  # (from, to) of the last lookup, (time, None) around
+
+        self.div = jp.Div(
+            a=div,
+            classes="fixed top-0 right-0 h-screen w-96 overflow-y-auto p-3 z-50 "
+            "text-sm bg-white shadow-xl export-skip",
+            show=False,
+        )
+        div_header = jp.Div(
+            a=self.div, classes="flex flex-row justify-between items-center"
+        )
+        self.title = jp.Span(a=div_header, classes="font-semibold")
+        button_close = jp.Button(
+            a=div_header,
+            text="×",
+            classes="px-2 text-lg text-gray-600 hover:text-black",
+        )
+        button_close.on("click", self.on_close)
+        self.label = jp.Div(a=self.div, classes="text-gray-600")
+
+        jp.H4(a=self.div, text="Status messages", classes="font-semibold pt-3")
+        self.div_status = jp.Div(a=self.div)
+        jp.H4(a=self.div, text="Logs", classes="font-semibold pt-3")
+        self.div_logs = jp.Div(a=self.div)
+
+    async def show_around(self, timestamp, wp):
+        self.title.text = f"Around {str_from_ts(timestamp)}"
+        await self.look_up(wp, (timestamp, None), read_around, timestamp)
+
+    async def show_between(self, time_from, time_to, wp):
+        self.title.text = f"{str_from_ts(time_from)} – {str_from_ts(time_to)}"
+        await self.look_up(wp, (time_from, time_to), read_between, time_from, time_to)
+
+    async def look_up(self, wp, window, read, *arguments):
+        if self.window == window and self.div.show:
+            return
+
+        # set before the read, so the result of an older click is dropped
+        self.window = window
+        self.div.show = True
+
+        try:
+            correlated = await run_on_page_db(wp, read, *arguments)
+        except sqlite3.Error as e:
+            self.label.text = f"Can't read the logs: {e}"
+            return
+
+        if self.window == window:
+            self.show(correlated)
+
+    def show(self, correlated):
+        status_rows, status_marker, more_status = correlated["status"]
+        self.div_status.inner_html = _rows_html(
+            status_rows, status_marker, _status_html
+        )
+        log_rows, log_marker, more_logs = correlated["logs"]
+        self.div_logs.inner_html = _rows_html(log_rows, log_marker, _log_html)
+
+        label = f"{len(status_rows)} status messages, {len(log_rows)} log records"
+        if more_status or more_logs:
+            label += f", the first {RANGE_ROWS} of each shown"
+        self.label.text = label
+
+    async def on_close(self, msg):
+        self.div.show = False
+
+
+def attach_time_index(db):
+    """
+    Build (or update) the sidecar tables of the logs and the status messages
+    ordered by time, for the result file opened as `db`, and attach them as
+    `bytime`. The first call on a big file may take a while, the following
+    ones only add the rows stored since.
+    """
+    sidecar_path = update_time_index(database_path(db))
+
+    if not has_sidecar(db, TIME_INDEX_SCHEMA):
+        attach_sidecar(db, sidecar_path, TIME_INDEX_SCHEMA)
+
+
+def read_around(db, timestamp, rows=AROUND_ROWS):
+    """
+    `rows` status messages and logs before `timestamp` and `rows` from it on.
+
+    Returns `{"status" / "logs": (rows ordered by time, index of the first
+    one from timestamp on, whether there are more in the range)}`.
+    """
+    indexed = _attach_time_index(db)
+
+    correlated = {}
+    for key in CORRELATED_TABLES:
+        before = _read_rows(db, key, indexed, "< ?", [timestamp], "DESC", rows)
+        after = _read_rows(db, key, indexed, ">= ?", [timestamp], "ASC", rows)
+        correlated[key] = (before[::-1] + after, len(before), False)
+
+    return correlated
+
+
+def read_between(db, time_from, time_to, rows=RANGE_ROWS):
+    """Like `read_around()`, the first `rows` between `time_from` and `time_to`."""
+    indexed = _attach_time_index(db)
+
+    correlated = {}
+    for key in CORRELATED_TABLES:
+        found = _read_rows(
+            db, key, indexed, "BETWEEN ? AND ?", [time_from, time_to], "ASC", rows + 1
+        )
+        correlated[key] = (found[:rows], None, len(found) > rows)
+
+    return correlated
+
+
+def _attach_time_index(db):
+    try:
+        attach_time_index(db)
+    except (OSError, sqlite3.Error):
+        pass  # the cache isn't writable, the tables are scanned
+
+    return has_sidecar(db, TIME_INDEX_SCHEMA)
+
+
+def _read_rows(db, key, indexed, condition, parameters, direction, limit):
+    table, time_column, sidecar_table, columns = CORRELATED_TABLES[key]
+
+    # a seek in the sidecar table and a lookup by rowid for each row
+    if indexed:
+        source = (
+            f"{TIME_INDEX_SCHEMA}.{sidecar_table} AS i "
+            f"JOIN {table} ON {table}.rowid = i.source_rowid"
+        )
+        time_expression = f"i.{time_column}"
+        rowid = "i.source_rowid"
+    else:
+        source = table
+        time_expression = f"{table}.{time_column}"
+        rowid = f"{table}.rowid"
+
+    column_list = ", ".join(f"{table}.{column}" for column in [time_column] + columns)
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        f"SELECT {column_list} FROM {source} WHERE {time_expression} {condition} "
+        f"ORDER BY {time_expression} {direction}, {rowid} {direction} LIMIT ?",
+        parameters + [limit],
+    )
+    found = cursor.fetchall()
+    record_rows(len(found))
+
+    return found
+
+
+def _rows_html(rows, marker, row_html):
+    if not rows:
+        return '<div class="text-gray-500">None.</div>'
+
+    times = htmls_from_ts([row[0] for row in rows])
+    parts = []
+    for cnt, (time_html, row) in enumerate(zip(times, rows)):
+        if cnt == marker:
+            parts.append('<div class="border-t-2 border-blue-500 my-1"></div>')
+        parts.append(row_html(time_html, row))
+    if marker == len(rows):
+        parts.append('<div class="border-t-2 border-blue-500 my-1"></div>')
+
+    return "".join(parts)
+
+
+def _status_html(time_html, row):
+    _, status = row
+
+    return (
+        f'<div class="py-1 border-b">{time_html}'
+        f'<div class="break-words">{html.escape(str(status))}</div></div>'
+    )
+
+
+def _log_html(time_html, row):
+    _, levelname, name, msg = row
+    level_classes = LEVEL_CLASSES.get(levelname, "text-gray-700")
+
+    return (
+        f'<div class="py-1 border-b">{time_html} '
+        f'<span class="{level_classes}">{html.escape(str(levelname))}</span> '
+        f'<span class="text-gray-600">{html.escape(str(name))}</span>'
+        f'<div class="break-words">{html.escape(str(msg))}</div></div>'
+    )
@@ -0,0 +1,202 @@
+import numpy as np
+
+from result_obj.metrics import Metric
+
+from db import is_indexed
+
+from diagnostics import record_rows
+
+from utils import bucket_width
+
+from rollups import ROLLUP_WIDTHS
+
+from rollups import read_new_rows
+from rollups import read_rollup_counts
+from rollups import read_rollup_ranges
+
+
+COUNTER_BUCKETS = 200
+
+
+class CounterRates:
+    """
+    Hits of one counter metric counted in buckets of `width` seconds, the first
+    one starting at `first`. `before` is the number of hits before the first
+    bucket, so the running total doesn't start from zero in a zoomed window.
+    """
+
+    __slots__ = ("name", "first", "width", "before", "buckets", "counts")
+
+    def __init__(self, name, first, width, before=0):
+        self.name = name
+        self.first = first
+        self.width = width
+        self.before = before
+        self.buckets = np.array([], dtype=np.int64)
+        self.counts = np.array([], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def bucket_starts(self):
+        return self.first + self.buckets * self.width
+
+    def totals(self):
+        return self.before + np.cumsum(self.counts)
+
+    def add_hits(self, timestamps):
+        """Count the hits with `timestamps` in, new buckets are added as needed."""
+        buckets = ((np.asarray(timestamps) - self.first) // self.width).astype(np.int64)
+        all_buckets = np.concatenate((self.buckets, buckets))
+        weights = np.concatenate((self.counts, np.ones(len(buckets), np.int64)))
+
+        self.buckets, inverse = np.unique(all_buckets, return_inverse=True)
+        self.counts = np.bincount(inverse, weights).astype(np.int64)
+
+
+def read_counter_rates(
+    db,
+    name=None,
+    x_min=None,
+    x_max=None,
+    up_to_rowid=None,
+    max_buckets=COUNTER_BUCKETS,
+    rollups=None,
+):
+    """
+    Count the hits of the counters (or just the one with `name`) between
+    `x_min` and `x_max` in SQLite, so the number of points depends on the time
+    range and not on the number of hits. The width of the buckets is chosen for
+    each counter separately.
+
+    With `rollups` (see rollups.py), the hits are summed from the rollups
+    instead, for the counters with buckets of a second or wider.
+
+    Returns `{name: CounterRates}`.
+    """
+    if rollups is not None and (
+        up_to_rowid is None or up_to_rowid >= rollups.high_water_mark
+    ):
+        return _read_rollup_rates(
+            db, rollups, name, x_min, x_max, up_to_rowid, max_buckets
+        )
+
+    source = "Metrics"
+    rowid_column = "rowid"
+    if is_indexed(db):
+        source = "idx.MetricsByName"
+        rowid_column = "source_rowid"
+
+    conditions = ["m.type = ?"]
+    parameters = [Metric.TYPE_INCREMENT]
+    if name is not None:
+        conditions.append("m.name = ?")
+        parameters.append(name)
+    if x_min is not None:
+        conditions.append("m.timestamp >= ?")
+        parameters.append(x_min)
+    if x_max is not None:
+        conditions.append("m.timestamp <= ?")
+        parameters.append(x_max)
+    if up_to_rowid is not None:
+        conditions.append(f"m.{rowid_column} <= ?")
+        parameters.append(up_to_rowid)
+    where = " AND ".join(conditions)
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        "SELECT m.name, min(m.timestamp), max(m.timestamp) "
+        f"FROM {source} AS m WHERE {where} GROUP BY m.name",
+        parameters,
+    )
+    ranges = cursor.fetchall()
+    if not ranges:
+        return {}
+
+    rates = {}
+    bucket_parameters = []
+    for counter_name, timestamp_min, timestamp_max in ranges:
+        width = bucket_width(timestamp_max - timestamp_min, max_buckets)
+        first = timestamp_min - timestamp_min % width
+        rates[counter_name] = CounterRates(counter_name, first, width)
+        bucket_parameters.extend([counter_name, first, width])
+
+    # the buckets of all the counters in one pass over the table
+    placeholders = ", ".join(["(?, ?, ?)"] * len(ranges))
+    cursor.execute(
+        f"WITH Buckets(name, first, width) AS (VALUES {placeholders}) "
+        "SELECT Buckets.name, "
+        "CAST((m.timestamp - Buckets.first) / Buckets.width AS INTEGER) AS bucket, "
+        f"count(*) FROM {source} AS m JOIN Buckets ON m.name = Buckets.name "
+        f"WHERE {where} GROUP BY Buckets.name, bucket ORDER BY Buckets.name, bucket",
+        bucket_parameters + parameters,
+    )
+    rows = cursor.fetchall()
+    record_rows(len(rows))
+
+    by_name = {}
+    for counter_name, bucket, count in rows:
+        buckets, counts = by_name.setdefault(counter_name, ([], []))
+        buckets.append(bucket)
+        counts.append(count)
+
+    for counter_name, (buckets, counts) in by_name.items():
+        rates[counter_name].buckets = np.array(buckets, dtype=np.int64)
+        rates[counter_name].counts = np.array(counts, dtype=np.int64)
+
+    if x_min is not None:
+        before_where = "type = ? AND name = ? AND timestamp < ?"
+        if up_to_rowid is not None:
+            before_where += f" AND {rowid_column} <= ?"
+        for counter_rates in rates.values():
+            before_parameters = [Metric.TYPE_INCREMENT, counter_rates.name, x_min]
+            if up_to_rowid is not None:
+                before_parameters.append(up_to_rowid)
+            cursor.execute(
+                f"SELECT count(*) FROM {source} WHERE {before_where}",
+                before_parameters,
+            )
+            counter_rates.before = cursor.fetchone()[0]
+
+    return rates
+
+
+def _read_rollup_rates(db, rollups, name, x_min, x_max, up_to_rowid, max_buckets):
+    rates = {}
+    ranges = read_rollup_ranges(db, rollups, Metric.TYPE_INCREMENT, name, x_min, x_max)
+    for counter_name, (timestamp_min, timestamp_max) in sorted(ranges.items()):
+        width = bucket_width(timestamp_max - timestamp_min, max_buckets)
+        if width < ROLLUP_WIDTHS[0]:
+            # too short for the rollups, counted from the rows
+            rates.update(
+                read_counter_rates(
+                    db, counter_name, x_min, x_max, up_to_rowid, max_buckets
+                )
+            )
+            continue
+
+        counter_rates = CounterRates(
+            counter_name, timestamp_min - timestamp_min % width, width
+        )
+        counter_rates.buckets, counter_rates.counts, before = read_rollup_counts(
+            db,
+            rollups,
+            counter_name,
+            Metric.TYPE_INCREMENT,
+            counter_rates.first,
+            width,
+            x_max,
+        )
+        if x_min is not None:
+            counter_rates.before = before
+
+        new_timestamps, _ = read_new_rows(
+            db, rollups, counter_name, Metric.TYPE_INCREMENT, x_min, x_max, up_to_rowid
+        )
+        if len(new_timestamps):
+            counter_rates.add_hits(new_timestamps)
+
+        rates[counter_name] = counter_rates
+
+    return rates
@@ -0,0 +1,189 @@
+import inspect
+import sqlite3
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from sidecar import has_sidecar
+from sidecar import read_only_uri
+from sidecar import attach_sidecar
+from sidecar import update_sidecar
+
+# `info` and the other commands for scripts open the file with `open_db()` too,
+# so asyncio (imported already when `run()` is awaited) and the process pool
+# (only with --processes) are imported where they are used, see
+# `benchmark.py --imports`
+
+DB_THREADS = 4
+
+
+def open_db(sqlite_path, index=False):
+    """
+    Open the result file read-only. With `index`, the sidecar database with the
+    helper indexes is created / updated and attached as `idx`.
+    """
+    db = sqlite3.connect(read_only_uri(sqlite_path), uri=True)
+    db.row_factory = sqlite3.Row
+
+    if index:
+        attach_sidecar(db, update_sidecar(sqlite_path))
+
+    return db
+
+
+def database_path(db, schema_name="main"):
+    for _, name, path in db.execute("PRAGMA database_list"):
+        if name == schema_name:
+            return path
+
+    return None
+
+
+class DatabaseThreads:
+    """
+    Worker threads for the database work of one page, so a slow query doesn't
+    block the event loop serving all the browsers. Each thread opens its own
+    read-only connection to the same result file as `db`, with the same
+    sidecar attached (sqlite3 connections can't be shared between threads).
+    """
+
+    def __init__(self, db, max_workers=DB_THREADS):
+        self.sqlite_path = database_path(db)
+        self.sidecar_path = database_path(db, "idx")
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="result_obj_db"
+        )
+        self.local = threading.local()
+
+    def connection(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = open_db(self.sqlite_path)
+            if self.sidecar_path:
+                attach_sidecar(db, self.sidecar_path)
+
+        return db
+
+    def submit(self, function, *args):
+        """Call `function(db, *args)` in a worker thread, returns the future."""
+        # the copied context keeps the running stage of the diagnostics
+        context = contextvars.copy_context()
+
+        return self.executor.submit(context.run, self._call, function, args)
+
+    async def run(self, function, *args):
+        import asyncio
+
+        return await asyncio.wrap_future(self.submit(function, *args))
+
+    def _call(self, function, args):
+        return function(self.connection(), *args)
+
+    def close(self):
+        # the connections are closed with the threads
+        self.executor.shutdown(wait=False)
+
+
+class DatabaseProcesses:
+    """
+    Like `DatabaseThreads`, with worker processes, so reading and preparing the
+    data of several sections isn't limited by the GIL to one core.
+
+    Each process opens its own connection to the result file. The functions
+    and their arguments must be picklable (defined on the module level), and
+    so must be the results: plain rows for the grids, arrays for the charts,
+    not `sqlite3.Row`. Rows read and stages of the diagnostics inside the
+    workers are not recorded.
+    """
+
+    def __init__(self, db, max_workers=None):
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_open_worker_db,
+            initargs=(database_path(db), database_path(db, "idx")),
+        )
+
+    def submit(self, function, *args):
+        """Call `function(db, *args)` in a worker process, returns the future."""
+        # the measuring wrapper of the diagnostics can't be pickled
+        return self.executor.submit(
+            _call_with_worker_db, inspect.unwrap(function), args
+        )
+
+    async def run(self, function, *args):
+        import asyncio
+
+        return await asyncio.wrap_future(self.submit(function, *args))
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_worker_db = None
+
+
+def _open_worker_db(sqlite_path, sidecar_path):
+    global _worker_db
+
+    _worker_db = open_db(sqlite_path)
+    if sidecar_path:
+        attach_sidecar(_worker_db, sidecar_path)
+
+
+def _call_with_worker_db(function, args):
+    return function(_worker_db, *args)
+
+
+def database_workers(db, processes=0):
+    """
+    Worker processes for the page with `processes`, threads without. The
+    functions they run only read the result file, their only writes are the
+    caches in the sidecars.
+    """
+    if processes:
+        return DatabaseProcesses(db, processes)
+
+    return DatabaseThreads(db)
+
+
+async def run_on_page_db(wp, function, *args):
+    """
+    `function(db, *args)` in a worker of the page, or right away with `wp.db`
+    for pages without them.
+    """
+    db_workers = getattr(wp, "db_workers", None)
+    if db_workers is None:
+        return function(wp.db, *args)
+
+    return await db_workers.run(function, *args)
+
+
+def is_indexed(db):
+    return has_sidecar(db)
+
+
+def table_has_rows(db, table_name):
+    cursor = db.execute(f"SELECT 1 FROM {table_name} LIMIT 1")
+
+    return cursor.fetchone() is not None
+
+
+def read_metadata_bounds(db):
+    cursor = db.cursor()
+    if is_indexed(db):
+        query = (
+            "SELECT Metadata.* FROM idx.MetadataByTimestamp AS i "
+            "JOIN Metadata ON Metadata.rowid = i.source_rowid "
+            "ORDER BY i.timestamp {direction}, i.source_rowid {direction} LIMIT 1"
+        )
+        metadata_start = cursor.execute(query.format(direction="ASC")).fetchone()
+        metadata_end = cursor.execute(query.format(direction="DESC")).fetchone()
+
+        return metadata_start, metadata_end
+
+    cursor.execute("SELECT * FROM Metadata ORDER BY timestamp")
+    metadata_list = cursor.fetchall()
+
+    return metadata_list[0], metadata_list[-1]
@@ -0,0 +1,184 @@
+import sys
+import json
+import functools
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import nullcontext
+
+
+MAX_RECORDS = 500
+
+_current_stage = contextvars.ContextVar("current_stage", default=None)
+_no_stage = nullcontext()
+
+
+class Diagnostics:
+    """
+    Wall time, rows read, allocated memory blocks and bytes sent to the browser
+    for the stages of building a report.
+
+    When disabled, `stage()` returns a shared no-op context manager and nothing
+    is recorded.
+    """
+
+    def __init__(self, enabled=False, json_path=None):
+        self.enabled = enabled or json_path is not None
+        self.json_path = json_path
+        self.records = deque(maxlen=MAX_RECORDS)
+        # the stages read by the worker threads of the page end in them
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        if not self.enabled:
+            return _no_stage
+
+        return Stage(self, name)
+
+    def wrap(self, name, function):
+        if not self.enabled:
+            return function
+
+        @functools.wraps(function)
+        def measured(*args, **kwargs):
+            with self.stage(name):
+                return function(*args, **kwargs)
+
+        return measured
+
+    def watch_page(self, wp):
+        """Measure every serialization of the page justpy sends to the browser."""
+        if not self.enabled:
+            return
+
+        build_list = wp.build_list
+
+        def measured_build_list():
+            with self.stage("serialize page") as stage:
+                page_list = build_list()
+                stage.bytes = len(json.dumps(page_list, default=str))
+
+            return page_list
+
+        wp.build_list = measured_build_list
+
+    def add_record(self, record):
+        with self.lock:
+            self.records.append(record)
+
+            # under the lock, so the file is written by one thread at a time
+            # and the last one written has all the records
+            if self.json_path and record["depth"] == 0:
+                with open(self.json_path, "w") as f:
+                    f.write(_to_json(self.records))
+
+    def summary(self):
+        """Records of the same stage added together, in the order of first run."""
+        with self.lock:
+            return _summary(self.records)
+
+    def to_json(self):
+        with self.lock:
+            return _to_json(self.records)
+
+
+def _summary(records):
+    stages = {}
+    for record in records:
+        summary = stages.setdefault(
+            record["stage"],
+            {
+                "stage": record["stage"],
+                "runs": 0,
+                "seconds": 0.0,
+                "rows": 0,
+                "allocated_blocks": 0,
+            },
+        )
+        summary["runs"] += 1
+        summary["seconds"] += record["seconds"]
+        summary["rows"] += record["rows"]
+        summary["allocated_blocks"] += record["allocated_blocks"]
+        if record["bytes"] is not None:
+            summary["bytes"] = record["bytes"]  # the last one, not a sum
+
+    return list(stages.values())
+
+
+def _to_json(records):
+    return json.dumps(
+        {"summary": _summary(records), "records": list(records)}, indent=4
+    )
+
+
+class Stage:
+    __slots__ = (
+        "diagnostics",
+        "name",
+        "rows",
+        "bytes",
+        "parent",
+        "_token",
+        "_start",
+        "_start_blocks",
+    )
+
+    def __init__(self, diagnostics, name):
+        self.diagnostics = diagnostics
+        self.name = name
+        self.rows = 0
+        self.bytes = None
+
+    def __enter__(self):
+        self.parent = _current_stage.get()
+        self._token = _current_stage.set(self)
+        self._start_blocks = sys.getallocatedblocks()
+        self._start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._start
+        allocated_blocks = sys.getallocatedblocks() - self._start_blocks
+        _current_stage.reset(self._token)
+
+        if self.parent is not None:
+            self.parent.rows += self.rows
+
+        self.diagnostics.add_record(
+            {
+                "stage": self.name,
+                "depth": self.depth(),
+                "started": time.time() - seconds,
+                "seconds": seconds,
+                "rows": self.rows,
+                "allocated_blocks": allocated_blocks,
+                "bytes": self.bytes,
+            }
+        )
+
+    def depth(self):
+        depth = 0
+        parent = self.parent
+        while parent is not None:
+            depth += 1
+            parent = parent.parent
+
+        return depth
+
+
+def substage(name):
+    """Stage nested in the running one; no-op when there is none."""
+    stage = _current_stage.get()
+    if stage is None:
+        return _no_stage
+
+    return stage.diagnostics.stage(name)
+
+
+def record_rows(count):
+    """Add `count` rows read from the database to the running stage, if any."""
+    stage = _current_stage.get()
+    if stage is not None:
+        stage.rows += count
@@ -0,0 +1,122 @@
+import numpy as np
+
+from columnar import encode_points
+
+
+POINT_BUDGET = 2000
+
+
+def lttb(x_axis, y_axis, threshold=POINT_BUDGET):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and the last point and from each bucket in between the one
+    point forming the largest triangle with the previously selected point and
+    the average of the next bucket. Returns the selected `(x_axis, y_axis)`.
+    """
+    x_axis = np.asarray(x_axis, dtype=np.float64)
+    y_axis = np.asarray(y_axis, dtype=np.float64)
+
+    length = len(x_axis)
+    if threshold >= length or threshold < 3:
+        return x_axis, y_axis
+
+    bucket_edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = bucket_edges[bucket], bucket_edges[bucket + 1]
+        next_start = end
+        next_end = (
+            bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else length
+        )
+        if next_end <= next_start:
+            next_end = next_start + 1
+
+        average_x = x_axis[next_start:next_end].mean()
+        average_y = y_axis[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x_axis[previous] - average_x) * (y_axis[start:end] - y_axis[previous])
+            - (x_axis[previous] - x_axis[start:end]) * (average_y - y_axis[previous])
+        )
+        previous = start + int(np.argmax(areas)) if len(areas) else start
+        selected[bucket + 1] = previous
+
+    return x_axis[selected], y_axis[selected]
+
+
+def min_max_buckets(x_axis, y_axis, threshold=POINT_BUDGET):
+    """
+    Split the series into `threshold // 2` buckets and keep the minimum and the
+    maximum of each one, in their original order. Good for spiky series, where
+    no peak may get lost.
+    """
+    x_axis = np.asarray(x_axis, dtype=np.float64)
+    y_axis = np.asarray(y_axis, dtype=np.float64)
+
+    length = len(x_axis)
+    bucket_count = threshold // 2
+    if threshold >= length or bucket_count < 1:
+        return x_axis, y_axis
+
+    bucket_starts = np.linspace(0, length, bucket_count + 1).astype(np.int64)[:-1]
+
+    # NaNs would win both reductions, so they are kept out of the comparison
+    comparable = np.where(np.isnan(y_axis), np.inf, y_axis)
+    min_values = np.minimum.reduceat(comparable, bucket_starts)
+    comparable = np.where(np.isnan(y_axis), -np.inf, y_axis)
+    max_values = np.maximum.reduceat(comparable, bucket_starts)
+
+    bucket_ids = np.repeat(
+        np.arange(bucket_count), np.diff(np.append(bucket_starts, length))
+    )
+    is_min = y_axis == min_values[bucket_ids]
+    is_max = y_axis == max_values[bucket_ids]
+
+    # first occurrence of the minimum and of the maximum in each bucket
+    indexes = np.arange(length)
+    min_indexes = np.full(bucket_count, length, dtype=np.int64)
+    np.minimum.at(min_indexes, bucket_ids[is_min], indexes[is_min])
+    max_indexes = np.full(bucket_count, length, dtype=np.int64)
+    np.minimum.at(max_indexes, bucket_ids[is_max], indexes[is_max])
+
+    selected = np.unique(np.concatenate([min_indexes, max_indexes]))
+    selected = selected[selected < length]
+
+    return x_axis[selected], y_axis[selected]
+
+
+def downsample_window(
+    x_axis, y_axis, x_min=None, x_max=None, threshold=POINT_BUDGET, method=lttb
+):
+    """
+    Downsample only the part of the (sorted) series between `x_min` and
+    `x_max`. One point on each side of the window is kept, so the line doesn't
+    end abruptly on the edges of the zoomed chart.
+    """
+    start = 0
+    end = len(x_axis)
+    if x_min is not None:
+        start = max(0, int(np.searchsorted(x_axis, x_min, side="left")) - 1)
+    if x_max is not None:
+        end = min(end, int(np.searchsorted(x_axis, x_max, side="right")) + 1)
+
+    return method(x_axis[start:end], y_axis[start:end], threshold)
+
+
+def to_chart_data(x_axis, y_axis):
+    """Data of a Highcharts series, sent as columns, see columnar.py."""
+    return encode_points(x_axis, y_axis)
+
+
+def to_chart_points(x_axis, y_axis):
+    """`[x, y]` points, for the JavaScript adding them to a chart."""
+    data = np.column_stack((x_axis, y_axis)).astype(object)
+    data[np.isnan(np.asarray(y_axis, dtype=np.float64)), 1] = None  # NaN is not JSON
+
+    return data.tolist()
@@ -0,0 +1,203 @@
+import csv
+import json
+from datetime import datetime
+
+
+BATCH_ROWS = 10000
+FORMATS = ("csv", "ndjson")
+
+# dumped tables, with the columns the time range and the names filter
+TIME_COLUMNS = {
+    "Logs": "created",
+    "StatusHistory": "timestamp",
+    "Metrics": "timestamp",
+    "Metadata": "timestamp",
+    "MetadataEnvVars": None,
+}
+NAME_COLUMNS = {"Logs": "name", "Metrics": "name", "MetadataEnvVars": "key"}
+
+
+class DumpFilter:
+    """
+    Rows of a table with the time column between `time_from` and `time_to`,
+    `levels` (of the Logs), `names` (of the loggers, the metrics or the
+    environment variables) and `types` (of the Metrics). Empty means any.
+    """
+
+    __slots__ = ("time_from", "time_to", "levels", "names", "types")
+
+    def __init__(self, time_from=None, time_to=None, levels=(), names=(), types=()):
+        self.time_from = time_from
+        self.time_to = time_to
+        self.levels = list(levels)
+        self.names = list(names)
+        self.types = list(types)
+
+    def where(self, table_name):
+        """
+        The ` WHERE …` clause of the filter for `table_name` and its parameters.
+        Raises ValueError for filters the table doesn't have a column for.
+        """
+        conditions = []
+        parameters = []
+
+        time_column = TIME_COLUMNS[table_name]
+        for value, operator in ((self.time_from, ">="), (self.time_to, "<=")):
+            if value is None:
+                continue
+            if time_column is None:
+                raise ValueError(f"{table_name} has no time to filter by")
+
+            conditions.append(f"{time_column} {operator} ?")
+            parameters.append(value)
+
+        columns = [
+            ("levelname", self.levels, table_name == "Logs"),
+            (NAME_COLUMNS.get(table_name), self.names, table_name in NAME_COLUMNS),
+            ("type", self.types, table_name == "Metrics"),
+        ]
+        for column, values, has_column in columns:
+            if not values:
+                continue
+            if not has_column:
+                raise ValueError(
+                    f"{table_name} can't be filtered by {column or 'name'}"
+                )
+
+            conditions.append(f"{column} IN ({', '.join('?' * len(values))})")
+            parameters.extend(values)
+
+        if not conditions:
+            return "", []
+
+        return " WHERE " + " AND ".join(conditions), parameters
+
+
+def dump_table(db, table_name, output, output_format="csv", dump_filter=None):
+    """
+    Write the rows of `table_name` matching `dump_filter` to the text file
+    `output`, in the order they were stored. The rows are read in batches of
+    `BATCH_ROWS`, so tables of any size can be dumped.
+
+    Returns the number of rows written.
+    """
+    where, parameters = (dump_filter or DumpFilter()).where(table_name)
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(f"SELECT * FROM {table_name}{where} ORDER BY rowid", parameters)
+
+    columns = [column[0] for column in cursor.description]
+    writer = WRITERS[output_format](output, columns)
+
+    return _write_batches(cursor, writer)
+
+
+def dump_metrics_pivoted(db, output, output_format="csv", dump_filter=None):
+    """
+    Like `dump_table()` of the Metrics, with a column for each metric and a
+    row for each timestamp, ordered by it. Metrics with more types, like the
+    start and stop of spans, have a column for each of them, `name (type)`.
+
+    Returns the number of rows written.
+    """
+    where, parameters = (dump_filter or DumpFilter()).where("Metrics")
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        f"SELECT name, type FROM Metrics{where} GROUP BY name, type "
+        "ORDER BY min(rowid)",
+        parameters,
+    )
+    metric_keys = cursor.fetchall()
+
+    names = [name for name, _ in metric_keys]
+    indexes = {}
+    columns = ["timestamp"]
+    for index, (name, metric_type) in enumerate(metric_keys, start=1):
+        indexes[name, metric_type] = index
+        columns.append(name if names.count(name) == 1 else f"{name} ({metric_type})")
+
+    writer = WRITERS[output_format](output, columns)
+
+    # SQLite sorts in temporary files when it doesn't fit into its cache
+    cursor.execute(
+        f"SELECT timestamp, name, type, value FROM Metrics{where} "
+        "ORDER BY timestamp, rowid",
+        parameters,
+    )
+
+    rows_written = 0
+    row = None
+    while True:
+        batch = cursor.fetchmany(BATCH_ROWS)
+        if not batch:
+            break
+
+        rows = []
+        for timestamp, name, metric_type, value in batch:
+            if row is None or row[0] != timestamp:
+                if row is not None:
+                    rows.append(row)
+                row = [timestamp] + [None] * len(metric_keys)
+
+            row[indexes[name, metric_type]] = value
+
+        writer.write(rows)
+        rows_written += len(rows)
+
+    if row is not None:
+        writer.write([row])
+        rows_written += 1
+
+    return rows_written
+
+
+def parse_time(value):
+    """Unix timestamp, or ISO 8601 date and time, local without a time zone."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def _write_batches(cursor, writer):
+    rows_written = 0
+    while True:
+        rows = cursor.fetchmany(BATCH_ROWS)
+        if not rows:
+            return rows_written
+
+        writer.write(rows)
+        rows_written += len(rows)
+
+
+class _CsvWriter:
+    __slots__ = ("writer",)
+
+    def __init__(self, output, columns):
+        self.writer = csv.writer(output, lineterminator="\n")
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+
+class _NdjsonWriter:
+    __slots__ = ("output", "columns")
+
+    def __init__(self, output, columns):
+        self.output = output
+        self.columns = columns
+
+    def write(self, rows):
+        columns = self.columns
+        self.output.writelines(
+            json.dumps(dict(zip(columns, row)), default=str, separators=(",", ":"))
+            + "\n"
+            for row in rows
+        )
+
+
+WRITERS = {"csv": _CsvWriter, "ndjson": _NdjsonWriter}
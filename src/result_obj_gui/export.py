@@ -0,0 +1,367 @@
+import os
+import os.path
+import gzip
+import html
+import json
+import base64
+import shutil
+
+import justpy as jp
+
+from columnar import columnar_js
+from columnar import encode_rows
+
+from sections import load_all_lazy_sections
+
+
+CHUNK_ROWS = 10000
+DATA_DIRECTORY = "data"
+ASSETS_DIRECTORY = "assets"
+
+# copies bundled with justpy, so the page works without the network
+JUSTPY_ASSETS = ["tailwind.css", "ag-grid-community.js", "highcharts.js"]
+
+# skipped html attributes, which only make sense with the justpy server
+SKIPPED_ATTRIBUTES = {"id", "rel", "target", "download"}
+
+page_template = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<link href="assets/tailwind.css" rel="stylesheet">
+<script src="assets/ag-grid-community.js"></script>
+<script src="assets/highcharts.js"></script>
+<!-- not bundled with justpy, only the Activity timeline needs it -->
+<script src="https://code.highcharts.com/stock/8.0.4/modules/heatmap.js"></script>
+<script>
+{columnar}
+</script>
+</head>
+<body>
+{body}
+<script>
+var REPORT = {report};
+{loader}
+</script>
+</body>
+</html>
+"""
+
+loader_js = """
+// The chunks are scripts calling `exportedChunk()` (like JSONP), browsers don't
+// let `fetch()` read the files of a page opened from `file://`.
+var pendingChunks = {};
+
+function exportedChunk(url, compressed) {
+    var bytes = Uint8Array.from(atob(compressed), function (character) {
+        return character.charCodeAt(0);
+    });
+    var stream = new Blob([bytes]).stream().pipeThrough(
+        new DecompressionStream('gzip')
+    );
+    new Response(stream).json().then(pendingChunks[url]);
+    delete pendingChunks[url];
+}
+
+function loadChunk(url) {
+    return new Promise(function (resolve, reject) {
+        pendingChunks[url] = resolve;
+        var script = document.createElement('script');
+        script.src = url;
+        script.onload = function () {
+            script.remove();
+        };
+        script.onerror = reject;
+        document.head.appendChild(script);
+    });
+}
+
+async function setupGrid(element, spec) {
+    var options = spec.options;
+    // the grids render these columns as HTML in the page too
+    for (var column of spec.htmlColumns) {
+        options.columnDefs[column].cellRenderer = function (params) {
+            return params.value;
+        };
+    }
+    options.rowData = spec.chunks.length ? await loadChunk(spec.chunks[0]) : [];
+    new agGrid.Grid(element, options);
+
+    var nextChunk = 1;
+    var loading = false;
+    async function loadNextChunk() {
+        if (loading || nextChunk >= spec.chunks.length) {
+            return;
+        }
+        loading = true;
+        var rows = await loadChunk(spec.chunks[nextChunk]);
+        nextChunk += 1;
+        options.api.applyTransaction({add: decodeRows(rows)});
+        loading = false;
+    }
+
+    if (options.pagination) {  // more rows only when the user gets to them
+        options.api.addEventListener('paginationChanged', function () {
+            var api = options.api;
+            if (api.paginationGetCurrentPage() >= api.paginationGetTotalPages() - 2) {
+                loadNextChunk();
+            }
+        });
+    } else {
+        while (nextChunk < spec.chunks.length) {
+            await loadNextChunk();
+        }
+    }
+}
+
+async function setupChart(element, spec) {
+    var options = spec.options;
+    var series = await loadChunk(spec.data);
+    options.series.forEach(function (oneSeries, index) {
+        oneSeries.data = series[index];
+    });
+    Highcharts.chart(element, options);
+}
+
+var observer = new IntersectionObserver(function (entries) {
+    entries.forEach(function (entry) {
+        if (!entry.isIntersecting) {
+            return;
+        }
+        observer.unobserve(entry.target);
+
+        var id = entry.target.getAttribute('data-export-id');
+        if (REPORT.grids[id]) {
+            setupGrid(entry.target, REPORT.grids[id]);
+        } else if (REPORT.charts[id]) {
+            setupChart(entry.target, REPORT.charts[id]);
+        }
+    });
+}, {rootMargin: '200px'});
+
+document.querySelectorAll('[data-export-id]').forEach(function (element) {
+    observer.observe(element);
+});
+"""
+
+
+def export_report(wp, output_directory, title="result_obj report"):
+    """
+    Write the report page `wp` as a static `index.html` to `output_directory`.
+
+    The page is rendered from the same structure justpy sends to the browser.
+    Grid rows and chart series go to scripts in `data/` with gzipped JSON, as
+    columns (see columnar.py), which the page loads when the grid / chart is
+    scrolled into view. With the scripts and the libraries copied to `assets/`,
+    it works when opened from `file://` and, apart from the heatmap of the
+    Activity section, without the network.
+
+    Grids defining `export_rows()` (like the paginated Logs grid) are streamed
+    from the database in chunks of `CHUNK_ROWS`, not limited to the displayed
+    page. With `export_chunks()` too, the chunks are read and written by the
+    workers of the page at once.
+    """
+    workers = getattr(wp, "db_workers", None)
+    load_all_lazy_sections(wp, wp.db, workers)
+
+    os.makedirs(os.path.join(output_directory, DATA_DIRECTORY), exist_ok=True)
+    _copy_assets(output_directory)
+    exporter = _Exporter(output_directory, _components_by_id(wp), workers)
+
+    body = "\n".join(exporter.render(component) for component in wp.build_list())
+    report = {"grids": exporter.grids, "charts": exporter.charts}
+
+    index_path = os.path.join(output_directory, "index.html")
+    with open(index_path, "w", encoding="utf-8") as f:
+        f.write(
+            page_template.format(
+                title=html.escape(title),
+                body=body,
+                report=json.dumps(report, default=str).replace("</", "<\\/"),
+                columnar=columnar_js,
+                loader=loader_js,
+            )
+        )
+
+    return index_path
+
+
+def _copy_assets(output_directory):
+    justpy_assets = os.path.join(os.path.dirname(jp.__file__), "templates", "local")
+    assets_directory = os.path.join(output_directory, ASSETS_DIRECTORY)
+    os.makedirs(assets_directory, exist_ok=True)
+
+    for file_name in JUSTPY_ASSETS:
+        shutil.copyfile(
+            os.path.join(justpy_assets, file_name),
+            os.path.join(assets_directory, file_name),
+        )
+
+
+class _Exporter:
+    def __init__(self, output_directory, components_by_id, workers=None):
+        self.output_directory = output_directory
+        self.components_by_id = components_by_id
+        self.workers = workers
+
+        self.grids = {}
+        self.charts = {}
+
+    def render(self, component):
+        if "export-skip" in (component.get("classes") or "").split():
+            return ""
+        if component.get("show") is False:
+            return ""
+
+        vue_type = component.get("vue_type")
+        if vue_type == "grid":
+            return self.render_grid(component)
+        elif vue_type == "chart":
+            return self.render_chart(component)
+
+        return self.render_html(component)
+
+    def render_html(self, component):
+        tag = component["html_tag"]
+
+        attributes = {
+            key: value
+            for key, value in component.get("attrs", {}).items()
+            if key not in SKIPPED_ATTRIBUTES and value not in (None, "")
+        }
+        if isinstance(component.get("id"), str):  # ids of sections (anchors)
+            attributes["id"] = component["id"]
+        if component.get("classes"):
+            attributes["class"] = component["classes"]
+        if component.get("style"):
+            attributes["style"] = component["style"]
+
+        attributes_html = "".join(
+            f' {key}="{html.escape(str(value))}"' for key, value in attributes.items()
+        )
+
+        content = component.get("inner_html") or ""
+        if not content and component.get("text") is not None:
+            content = html.escape(str(component["text"]))
+        content += "".join(
+            self.render(child) for child in component.get("object_props", [])
+        )
+
+        return f"<{tag}{attributes_html}>{content}</{tag}>"
+
+    def render_grid(self, component):
+        export_id = f"grid-{component['id']}"
+        options = dict(component["def"])
+        rows = options.pop("rowData", [])
+
+        grid = self.components_by_id.get(component["id"])
+        if grid is not None:  # rows of a `ColumnarGrid` are encoded already
+            rows = grid.options.get("rowData", [])
+        if grid is not None and hasattr(grid, "export_rows"):
+            if self.workers is not None and hasattr(grid, "export_chunks"):
+                chunks = self.write_chunks(export_id, grid.export_chunks(CHUNK_ROWS))
+            else:
+                chunks = self.write_batches(export_id, grid.export_rows(CHUNK_ROWS))
+
+            # paged, sorted and filtered by the server otherwise
+            options["pagination"] = True
+            options["paginationPageSize"] = 40
+            options["defaultColDef"] = dict(
+                options.get("defaultColDef", {}), filter=True, sortable=True
+            )
+        else:
+            batches = (
+                rows[i : i + CHUNK_ROWS] for i in range(0, len(rows), CHUNK_ROWS)
+            )
+            chunks = self.write_batches(export_id, batches)
+
+        self.grids[export_id] = {
+            "options": options,
+            "chunks": chunks,
+            "htmlColumns": component.get("html_columns", []),
+        }
+
+        return self.placeholder(export_id, component)
+
+    def render_chart(self, component):
+        export_id = f"chart-{component['id']}"
+        options = json.loads(json.dumps(component["def"], default=str))
+
+        series_data = []
+        for series in options.get("series", []):
+            series_data.append(series.pop("data", []))
+
+        data = self.write_data(f"{export_id}.js", series_data)
+        self.charts[export_id] = {"options": options, "data": data}
+
+        return self.placeholder(export_id, component)
+
+    def placeholder(self, export_id, component):
+        classes = html.escape(component.get("classes") or "")
+        style = html.escape(component.get("style") or "")
+        if component.get("vue_type") == "chart" and "height" not in style:
+            style += "height: 400px;"
+
+        return (
+            f'<div data-export-id="{export_id}" class="{classes}" style="{style}">'
+            "</div>"
+        )
+
+    def write_batches(self, export_id, batches):
+        return [
+            self.write_data(f"{export_id}-{cnt}.js", encode_rows(batch))
+            for cnt, batch in enumerate(batches)
+        ]
+
+    def write_chunks(self, export_id, chunks):
+        """Chunks read, converted and written by the workers, all at once."""
+        relative_paths = []
+        writes = []
+        for cnt, (read_rows, arguments) in enumerate(chunks):
+            file_name = f"{export_id}-{cnt}.js"
+            path = os.path.join(self.output_directory, DATA_DIRECTORY, file_name)
+            writes.append(
+                self.workers.submit(_write_rows_chunk, path, read_rows, *arguments)
+            )
+            relative_paths.append(f"{DATA_DIRECTORY}/{file_name}")
+
+        for write in writes:
+            write.result()  # raises the errors of the workers
+
+        return relative_paths
+
+    def write_data(self, file_name, data):
+        path = os.path.join(self.output_directory, DATA_DIRECTORY, file_name)
+        _write_chunk_js(path, data)
+
+        return f"{DATA_DIRECTORY}/{file_name}"
+
+
+def _write_rows_chunk(db, path, read_rows, *arguments):
+    _write_chunk_js(path, encode_rows(read_rows(db, *arguments)))
+
+
+def _write_chunk_js(path, data):
+    """The script of a chunk, with `data` as gzipped JSON (see `loader_js`)."""
+    # `json.dump()` to a file would use the much slower pure Python encoder
+    encoded = json.dumps(data, default=str, separators=(",", ":"))
+    compressed = gzip.compress(encoded.encode("utf-8"), compresslevel=6)
+
+    url = f"{DATA_DIRECTORY}/{os.path.basename(path)}"
+    with open(path, "w", encoding="ascii") as f:
+        f.write(f'exportedChunk("{url}", "{base64.b64encode(compressed).decode()}");\n')
+
+
+def _components_by_id(component, components_by_id=None):
+    if components_by_id is None:
+        components_by_id = {}
+
+    component_id = getattr(component, "id", None)
+    if component_id is not None:
+        components_by_id[component_id] = component
+
+    for child in getattr(component, "components", []):
+        _components_by_id(child, components_by_id)
+
+    return components_by_id
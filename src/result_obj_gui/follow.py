@@ -0,0 +1,103 @@
+import json
+import asyncio
+
+from db import run_on_page_db
+
+
+FOLLOW_INTERVAL = 2.0
+# new rows in any of them update the page
+FOLLOWED_TABLES = ["StatusHistory", "Logs", "Metrics"]
+
+
+def start_following(wp, interval=FOLLOW_INTERVAL):
+    """
+    Watch the result file of the page for new rows and push them to the page.
+
+    Components showing data which may grow define `live_read()`, returning
+    `(function, arguments)` reading the new rows by `function(db, *arguments)`
+    (or None), and `live_update(data)`, applying what it read and returning
+    JavaScript applying the delta in the browser (or None). They are called
+    only when one of the `FOLLOWED_TABLES` has new rows. Both the check and
+    the reads run in the workers of the page, like the other reads.
+    """
+    return asyncio.get_event_loop().create_task(_follow(wp, interval))
+
+
+async def _follow(wp, interval):
+    table_ends = await run_on_page_db(wp, _read_table_ends)
+
+    while True:
+        await asyncio.sleep(interval)
+
+        new_table_ends = await run_on_page_db(wp, _read_table_ends)
+        if new_table_ends == table_ends:
+            continue
+        table_ends = new_table_ends
+
+        javascript = []
+        for component in list(_live_components(wp)):
+            read = component.live_read()
+            if read is None:
+                continue
+
+            function, arguments = read
+            data = await run_on_page_db(wp, function, *arguments)
+            update_js = component.live_update(data)
+            if update_js:
+                javascript.append(update_js)
+
+        if javascript:
+            await wp.run_javascript("\n".join(javascript), send=False)
+
+
+def _read_table_ends(db):
+    # not `PRAGMA data_version`, which is per connection and each worker has
+    # its own
+    return [
+        db.execute(f"SELECT max(rowid) FROM {table_name}").fetchone()[0]
+        for table_name in FOLLOWED_TABLES
+    ]
+
+
+def _live_components(component):
+    if hasattr(component, "live_read"):
+        yield component
+
+    for child in getattr(component, "components", []):
+        yield from _live_components(child)
+
+
+def grid_transaction_js(grid, rows):
+    transaction = json.dumps({"add": rows}, default=str)
+
+    # the grid may not be rendered in the browser yet
+    return (
+        f"try {{ cached_grid_def['g{grid.id}'].api.applyTransaction({transaction}); }}"
+        " catch (e) {}"
+    )
+
+
+def chart_add_points_js(chart, points, series_index=0):
+    points = json.dumps(points)
+
+    return (
+        "try { (function (chart) {"
+        f" {points}.forEach(function (point) {{"
+        f"  chart.series[{series_index}].addPoint(point, false);"
+        " });"
+        " chart.redraw();"
+        f"}})(cached_graph_def['chart{chart.id}']); }} catch (e) {{}}"
+    )
+
+
+def chart_set_data_js(chart):
+    data = json.dumps([series["data"] for series in chart.options["series"]])
+
+    return (
+        "try { (function (chart) {"
+        f" {data}.forEach(function (data, i) {{"
+        "  chart.series[i].setData(decodePoints(data), false);"
+        " });"
+        " chart.redraw();"
+        f"}})(cached_graph_def['chart{chart.id}']); }} catch (e) {{}}"
+    )
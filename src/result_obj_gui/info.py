@@ -0,0 +1,118 @@
+import os.path
+
+from sidecar import has_sidecar
+
+from utils import str_from_ts
+
+
+# tables of the result file counted by `read_info()`, when they exist
+COUNTED_TABLES = ["StatusHistory", "Logs", "Metrics", "RestorePoint", "Result"]
+
+
+def read_info(db, sqlite_path):
+    """What the Overview section shows, and the number of rows of the tables."""
+    cursor = db.cursor()
+    cursor.execute(
+        "SELECT timestamp, argv, pwd FROM Metadata ORDER BY timestamp LIMIT 1"
+    )
+    metadata_start = cursor.fetchone()
+    cursor.execute("SELECT timestamp FROM Metadata ORDER BY timestamp DESC LIMIT 1")
+    metadata_end = cursor.fetchone()
+
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row["name"] for row in cursor}
+    rows = {}
+    for table_name in COUNTED_TABLES:
+        if table_name in tables:
+            cursor.execute(f"SELECT count(*) FROM {table_name}")
+            rows[table_name] = cursor.fetchone()[0]
+
+    started = metadata_start["timestamp"] if metadata_start else None
+    stopped = metadata_end["timestamp"] if metadata_end else None
+
+    return {
+        "path": os.path.abspath(sqlite_path),
+        "size": os.path.getsize(sqlite_path),
+        "started": started,
+        "stopped": stopped,
+        "duration": stopped - started if metadata_start else None,
+        "argv": metadata_start["argv"] if metadata_start else None,
+        "pwd": metadata_start["pwd"] if metadata_start else None,
+        "rows": rows,
+    }
+
+
+def read_metric_list(db):
+    """
+    Name, type, number of samples and the first and the last timestamp of each
+    metric, in the order they were first stored.
+    """
+    cursor = db.cursor()
+    if has_sidecar(db):
+        # ordered by the name already, no need to sort the whole table
+        cursor.execute(
+            "SELECT name, type, count(*) AS count, min(timestamp) AS first, "
+            "max(timestamp) AS last FROM idx.MetricsByName "
+            "GROUP BY name, type ORDER BY min(source_rowid)"
+        )
+    else:
+        cursor.execute(
+            "SELECT name, type, count(*) AS count, min(timestamp) AS first, "
+            "max(timestamp) AS last FROM Metrics "
+            "GROUP BY name, type ORDER BY min(rowid)"
+        )
+
+    return [dict(row) for row in cursor]
+
+
+def format_info(info):
+    items = [
+        ("File", f"{info['path']} ({info['size']} bytes)"),
+        ("Started", _time_str(info["started"])),
+        ("Stopped", _time_str(info["stopped"])),
+        ("Duration", _duration_str(info["duration"])),
+        ("sys.argv", info["argv"]),
+        ("Directory", info["pwd"]),
+    ]
+    items += [
+        (table_name, f"{count} rows") for table_name, count in info["rows"].items()
+    ]
+
+    width = max(len(label) for label, _ in items) + 1
+
+    return "\n".join(f"{label + ':':<{width}} {value}" for label, value in items)
+
+
+def format_metric_list(metrics):
+    rows = [["Name", "Type", "Samples", "First", "Last"]]
+    for metric in metrics:
+        rows.append(
+            [
+                metric["name"],
+                metric["type"],
+                str(metric["count"]),
+                _time_str(metric["first"]),
+                _time_str(metric["last"]),
+            ]
+        )
+
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+
+    return "\n".join(
+        "  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
+
+
+def _time_str(ts):
+    if ts is None:
+        return "-"
+
+    return str_from_ts(ts)
+
+
+def _duration_str(seconds):
+    if seconds is None:
+        return "-"
+
+    return f"{seconds:.2f} s"
@@ -0,0 +1,313 @@
+import json
+import logging
+import sqlite3
+
+import justpy as jp
+
+from db import database_path
+from db import run_on_page_db
+
+from sidecar import get_meta
+from sidecar import set_meta
+from sidecar import update_sidecar_tables
+
+from search import attach_search_index
+
+from diagnostics import record_rows
+
+from utils import str_from_ts
+from utils import bucket_width
+from utils import bucket_width_str
+
+
+TOP_VALUES = 10
+HISTOGRAM_BUCKETS = 120
+
+# columns counted by the aggregation panel, which may be filtered by clicking
+AGGREGATE_COLUMNS = {
+    "levelname": "Level",
+    "name": "Logger",
+    "module": "Module",
+    "processName": "Process",
+    "threadName": "Thread",
+}
+
+
+class LogsAggregation:
+    """
+    Counts of the logs by level, logger, module, process and thread and their
+    histogram over time, for the records matching the filter of the `pager`.
+
+    Everything is counted by GROUP BY queries in SQLite, see
+    `read_aggregation()`, only when the panel is expanded and after the page
+    of the pager is shown. Clicking a value or a bucket of the histogram adds
+    it to the filter of the pager.
+    """
+
+    def __init__(self, pager, div):
+        self.pager = pager
+        self.expanded = False
+        self.generation = 0  # of the last read, older results are dropped
+
+        div_header = jp.Div(
+            a=div, classes="flex flex-row items-center text-sm export-skip"
+        )
+        self.button_toggle = jp.Button(
+            a=div_header,
+            text="Show counts",
+            classes="m-1 px-2 py-1 border rounded bg-gray-100 hover:bg-gray-200",
+        )
+        self.button_toggle.on("click", self.on_toggle)
+        self.label = jp.Span(a=div_header, classes="m-1 text-gray-600")
+
+        self.div_panel = jp.Div(a=div, show=False)
+        self.div_filters = jp.Div(
+            a=self.div_panel,
+            classes="flex flex-row flex-wrap items-center text-sm export-skip",
+        )
+        self.div_counts = jp.Div(a=self.div_panel, classes="flex flex-row flex-wrap")
+        self.histogram = jp.HighCharts(a=self.div_panel, classes="m-2 p-2 border")
+        self.histogram.options = _histogram_chart_def()
+        self.histogram.on("point_click", self.on_bucket_click)
+        self.bucket_width = 1
+
+    async def reload(self, wp):
+        self.generation += 1
+        generation = self.generation
+
+        self.label.text = "Counting…"
+        try:
+            aggregation = await run_on_page_db(
+                wp,
+                read_aggregation,
+                *self.pager.where_clause(),
+                self.pager.search_terms,
+            )
+        except sqlite3.Error as e:
+            if generation == self.generation:
+                self.label.text = f"Can't count the logs: {e}"
+            return
+
+        if generation == self.generation:
+            self.label.text = ""
+            self.show(aggregation)
+
+    def show(self, aggregation):
+        counts, histogram = aggregation
+        self.show_filters()
+        self.show_counts(counts)
+        self.show_histogram(*histogram)
+
+    def show_filters(self):
+        self.div_filters.delete_components()
+
+        filters = [
+            f"{AGGREGATE_COLUMNS[column]} = {value}"
+            for column, value in self.pager.column_filters.items()
+        ]
+        if self.pager.created_range:
+            created_from, created_to = self.pager.created_range
+            filters.append(
+                f"created {str_from_ts(created_from)} – {str_from_ts(created_to)}"
+            )
+        if not filters:
+            return
+
+        jp.Span(
+            a=self.div_filters,
+            text="Filtered by: " + ", ".join(filters),
+            classes="m-1",
+        )
+        button_clear = jp.Button(
+            a=self.div_filters,
+            text="Clear",
+            classes="m-1 px-2 border rounded bg-gray-100 hover:bg-gray-200",
+        )
+        button_clear.on("click", self.on_clear)
+
+    def show_counts(self, counts):
+        self.div_counts.delete_components()
+
+        for column, title in AGGREGATE_COLUMNS.items():
+            self.add_counts_card(column, title, counts[column])
+
+    def add_counts_card(self, column, title, counts):
+        div_card = jp.Div(a=self.div_counts, classes="m-1 p-2 border rounded w-48")
+        jp.Div(a=div_card, text=title, classes="font-semibold")
+
+        selected_value = self.pager.column_filters.get(column)
+        for value, count in counts[:TOP_VALUES]:
+            classes = "flex flex-row justify-between cursor-pointer hover:bg-gray-100"
+            if value == selected_value:
+                classes += " bg-blue-100"
+
+            div_value = jp.Div(a=div_card, classes=classes)
+            jp.Span(a=div_value, text=str(value), classes="truncate")
+            jp.Span(a=div_value, text=str(count), classes="pl-2 text-gray-600")
+
+            div_value.aggregation = self
+            div_value.column = column
+            div_value.value = value
+            div_value.on("click", _on_value_click)
+
+        if len(counts) > TOP_VALUES:
+            jp.Div(
+                a=div_card,
+                text=f"… {len(counts) - TOP_VALUES} more",
+                classes="text-gray-500",
+            )
+
+    def show_histogram(self, width, created_start, buckets):
+        self.bucket_width = width
+
+        series = {}
+        for bucket, levelname, count in buckets:
+            x = (created_start + bucket * width) * 1000
+            series.setdefault(levelname, []).append([x, count])
+
+        levels = sorted(series, key=level_order)
+        chart_def = self.histogram.options
+        chart_def["series"] = [
+            {"name": level, "data": sorted(series[level])} for level in levels
+        ]
+        chart_def["plotOptions"]["column"]["pointRange"] = width * 1000
+        chart_def["title"]["text"] = f"Logs per {bucket_width_str(width)}"
+
+    async def toggle_filter(self, column, value, wp):
+        column_filters = self.pager.column_filters
+        if column_filters.get(column) == value:
+            del column_filters[column]
+        else:
+            column_filters[column] = value
+
+        await self.pager.refilter(wp)
+
+    async def on_toggle(self, msg):
+        self.expanded = not self.expanded
+        self.div_panel.show = self.expanded
+        self.button_toggle.text = "Hide counts" if self.expanded else "Show counts"
+        if self.expanded:
+            await msg.page.update()
+            await self.reload(msg.page)
+
+    async def on_bucket_click(self, msg):
+        if msg.x is None:
+            return
+
+        created_from = msg.x / 1000
+        self.pager.created_range = (created_from, created_from + self.bucket_width)
+        await self.pager.refilter(msg.page)
+
+    async def on_clear(self, msg):
+        self.pager.column_filters.clear()
+        self.pager.created_range = None
+        await self.pager.refilter(msg.page)
+
+
+def read_aggregation(db, where, parameters, search_terms=()):
+    """
+    Counts of the values of `AGGREGATE_COLUMNS` and of the records per level
+    in the buckets of the histogram, for the logs matching `where`. The counts
+    of all the logs are kept in the sidecar until more records are logged.
+
+    Returns `({column: [(value, count)]}, (bucket width, first bucket, rows))`.
+    """
+    if search_terms:
+        attach_search_index(db)
+    if where:
+        return _aggregate(db, "Logs", where, parameters)
+
+    try:
+        return _read_cached_aggregation(database_path(db))
+    except (OSError, sqlite3.Error):
+        return _aggregate(db, "Logs", "", [])  # the cache isn't writable
+
+
+def _read_cached_aggregation(sqlite_path):
+    aggregation = None
+
+    def fill(sidecar):
+        nonlocal aggregation
+
+        max_rowid = sidecar.execute("SELECT max(rowid) FROM src.Logs")
+        max_rowid = max_rowid.fetchone()[0] or 0
+        if get_meta(sidecar, "LogsAggregation.rowid") == max_rowid:
+            aggregation = json.loads(get_meta(sidecar, "LogsAggregation"))
+            return
+
+        aggregation = _aggregate(sidecar, "src.Logs", "", [])
+        set_meta(sidecar, "LogsAggregation", json.dumps(aggregation))
+        set_meta(sidecar, "LogsAggregation.rowid", max_rowid)
+
+    update_sidecar_tables(sqlite_path, [], fill)
+
+    return aggregation
+
+
+def _aggregate(db, table, where, parameters):
+    # one GROUP BY for each column is faster than grouping by all of them
+    # together, which needs to sort the whole table
+    counts = {}
+    for column in AGGREGATE_COLUMNS:
+        cursor = db.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            f"SELECT {column}, count(*) AS count FROM {table}{where} "
+            f"GROUP BY {column} ORDER BY count DESC",
+            parameters,
+        )
+        counts[column] = cursor.fetchall()
+        record_rows(len(counts[column]))
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(f"SELECT min(created), max(created) FROM {table}{where}", parameters)
+    created_min, created_max = cursor.fetchone()
+    if created_min is None:
+        return counts, (1, 0, [])
+
+    width = bucket_width(created_max - created_min, HISTOGRAM_BUCKETS)
+    created_start = created_min - created_min % width
+
+    cursor.row_factory = None
+    cursor.execute(
+        "SELECT CAST((created - ?) / ? AS INTEGER) AS bucket, "
+        f"levelname, count(*) AS count FROM {table}{where} "
+        "GROUP BY bucket, levelname",
+        [created_start, width] + parameters,
+    )
+    buckets = cursor.fetchall()
+    record_rows(len(buckets))
+
+    return counts, (width, created_start, buckets)
+
+
+async def _on_value_click(self, msg):
+    await self.aggregation.toggle_filter(self.column, self.value, msg.page)
+
+
+def _histogram_chart_def():
+    return {
+        "chart": {"type": "column", "height": 250},
+        "title": {"text": "Logs"},
+        "xAxis": {"type": "datetime"},
+        "yAxis": {"title": {"text": "Records"}, "min": 0},
+        "legend": {"enabled": True},
+        "plotOptions": {
+            "column": {
+                "stacking": "normal",
+                "groupPadding": 0,
+                "pointPadding": 0,
+                "borderWidth": 0,
+                "pointPlacement": "between",
+            }
+        },
+        "tooltip": {"shared": True},
+        "series": [],
+    }
+
+
+def level_order(level_name):
+    # custom levels without a number go after the standard ones
+    level = logging.getLevelName(level_name)
+    return (level if isinstance(level, int) else 100, str(level_name))
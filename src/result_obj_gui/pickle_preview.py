@@ -0,0 +1,390 @@
+import io
+import struct
+import pickletools
+
+from utils import bytes_to_readable_str
+
+
+SAMPLE_ITEMS = 5  # items shown for each container
+MAX_DEPTH = 4
+MAX_VALUE_BYTES = 256  # longer strings and bytes are skipped, not read
+MAX_MEMO = 10000
+MAX_OPCODES = 5_000_000
+
+SCALAR_KINDS = {
+    "int": "int",
+    "int_or_bool": "int",
+    "bool": "bool",
+    "float": "float",
+    "None": "None",
+    "bytes_or_str": "str",
+    "str": "str",
+    "bytes": "bytes",
+    "bytearray": "bytearray",
+    "buffer": "buffer",
+}
+LENGTH_PREFIXES = {
+    pickletools.TAKEN_FROM_ARGUMENT1: struct.Struct("<B"),
+    pickletools.TAKEN_FROM_ARGUMENT4: struct.Struct("<i"),
+    pickletools.TAKEN_FROM_ARGUMENT4U: struct.Struct("<I"),
+    pickletools.TAKEN_FROM_ARGUMENT8U: struct.Struct("<Q"),
+}
+CODE_TO_OPCODE = {
+    opcode.code.encode("latin-1"): opcode for opcode in pickletools.opcodes
+}
+
+MARK = object()
+
+
+class PreviewNode:
+    """
+    What the unpickled object would look like, without creating it.
+
+    `size` is the number of items of containers, or length of skipped values.
+    Only the first `SAMPLE_ITEMS` items are kept.
+    """
+
+    __slots__ = ("kind", "value", "size", "items", "state")
+
+    def __init__(self, kind, value=None, size=None):
+        self.kind = kind
+        self.value = value
+        self.size = size
+        self.items = []
+        self.state = None
+
+    def add(self, item):
+        self.size = (self.size or 0) + 1
+        if len(self.items) < SAMPLE_ITEMS:
+            self.items.append(item)
+
+
+class PicklePreview:
+    def __init__(self):
+        self.root = None
+        self.protocol = 0
+        self.opcodes = 0
+        self.truncated = False
+        self.error = None
+
+
+class _BlobStream(io.RawIOBase):
+    """Adapter making `sqlite3.Blob` usable by `io.BufferedReader`."""
+
+    def __init__(self, blob):
+        self.blob = blob
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.blob.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.blob.seek(offset, whence)
+        return self.blob.tell()
+
+    def tell(self):
+        return self.blob.tell()
+
+
+def preview_pickle_blob(db, table, column, rowid):
+    """
+    Walk the pickle stored in `table`.`column` of row `rowid` opcode by opcode.
+
+    Nothing is unpickled, so no code from the pickle runs. The BLOB is streamed
+    through `Connection.blobopen()` and long strings / bytes are skipped over,
+    so the memory used doesn't depend on the size of the pickle.
+    """
+    with db.blobopen(table, column, rowid, readonly=True) as blob:
+        return preview_pickle_stream(io.BufferedReader(_BlobStream(blob)))
+
+
+def preview_pickle_stream(stream, max_opcodes=MAX_OPCODES):
+    preview = PicklePreview()
+    stack = []
+    memo = {}
+
+    try:
+        for opcode, arg in _iter_opcodes(stream):
+            preview.opcodes += 1
+            if preview.opcodes > max_opcodes:
+                preview.truncated = True
+                break
+
+            if opcode.name == "STOP":
+                preview.root = stack.pop()
+                break
+            elif opcode.name == "PROTO":
+                preview.protocol = arg
+            elif opcode.name in ("PUT", "BINPUT", "LONG_BINPUT"):
+                _memoize(memo, arg, stack[-1])
+            elif opcode.name == "MEMOIZE":
+                _memoize(memo, len(memo), stack[-1])
+            elif opcode.name in ("GET", "BINGET", "LONG_BINGET"):
+                stack.append(memo.get(arg) or PreviewNode("memo reference"))
+            else:
+                _apply_opcode(stack, opcode, arg)
+    except Exception as e:
+        preview.error = f"{e.__class__.__name__}: {e}"
+
+    if preview.root is None and stack and stack[-1] is not MARK:
+        preview.root = stack[-1]
+
+    return preview
+
+
+def _iter_opcodes(stream):
+    while True:
+        code = stream.read(1)
+        if not code:
+            raise ValueError("pickle exhausted before STOP")
+
+        opcode = CODE_TO_OPCODE.get(code)
+        if opcode is None:
+            raise ValueError(f"unknown opcode {code!r} at {stream.tell() - 1}")
+
+        argument = opcode.arg
+        if argument is None:
+            yield opcode, None
+        elif argument.n in LENGTH_PREFIXES:
+            yield opcode, _read_prefixed_value(stream, argument)
+        else:
+            yield opcode, argument.reader(stream)
+
+
+def _read_prefixed_value(stream, argument):
+    length_prefix = LENGTH_PREFIXES[argument.n]
+    (length,) = length_prefix.unpack(stream.read(length_prefix.size))
+
+    data = stream.read(min(length, MAX_VALUE_BYTES))
+    if length > len(data):
+        stream.seek(length - len(data), io.SEEK_CUR)
+
+    if argument.name in ("long1", "long4"):
+        if len(data) < length:
+            return _SkippedValue(None, length)
+        return pickletools.decode_long(data)
+    elif argument.name.startswith("unicodestring"):
+        data = data.decode("utf-8", errors="replace")
+    elif argument.name.startswith("string"):
+        data = data.decode("latin-1")
+
+    return _SkippedValue(data, length) if len(data) < length else data
+
+
+class _SkippedValue:
+    __slots__ = ("prefix", "length")
+
+    def __init__(self, prefix, length):
+        self.prefix = prefix
+        self.length = length
+
+
+def _memoize(memo, index, node):
+    # classes are looked up again for each instance, keep all of them
+    if len(memo) < MAX_MEMO or (node is not MARK and node.kind == "global"):
+        memo[index] = node
+
+
+def _pop_mark(stack):
+    items = []
+    while True:
+        item = stack.pop()
+        if item is MARK:
+            items.reverse()
+            return items
+        items.append(item)
+
+
+def _apply_opcode(stack, opcode, arg):
+    name = opcode.name
+
+    if name == "MARK":
+        stack.append(MARK)
+    elif name == "POP":
+        stack.pop()
+    elif name == "POP_MARK":
+        _pop_mark(stack)
+    elif name == "DUP":
+        stack.append(stack[-1])
+    elif name == "FRAME" or name == "READONLY_BUFFER":
+        pass
+
+    elif name.startswith("EMPTY_"):
+        stack.append(PreviewNode(name[len("EMPTY_") :].lower(), size=0))
+    elif name in ("LIST", "TUPLE", "FROZENSET"):
+        stack.append(_container(name.lower(), _pop_mark(stack)))
+    elif name in ("TUPLE1", "TUPLE2", "TUPLE3"):
+        items = [stack.pop() for _ in range(int(name[-1]))]
+        stack.append(_container("tuple", reversed(items)))
+    elif name == "DICT":
+        stack.append(_container("dict", _pairs(_pop_mark(stack))))
+    elif name == "APPEND":
+        item = stack.pop()
+        stack[-1].add(item)
+    elif name in ("APPENDS", "ADDITEMS"):
+        for item in _pop_mark(stack):
+            stack[-1].add(item)
+    elif name == "SETITEM":
+        value = stack.pop()
+        key = stack.pop()
+        stack[-1].add((key, value))
+    elif name == "SETITEMS":
+        for pair in _pairs(_pop_mark(stack)):
+            stack[-1].add(pair)
+
+    elif name == "GLOBAL":
+        stack.append(PreviewNode("global", arg.replace(" ", ".")))
+    elif name == "STACK_GLOBAL":
+        global_name = stack.pop()
+        module = stack.pop()
+        stack.append(PreviewNode("global", f"{module.value}.{global_name.value}"))
+    elif name == "INST":
+        stack.append(_instance(arg.replace(" ", "."), _pop_mark(stack)))
+    elif name == "OBJ":
+        items = _pop_mark(stack)
+        stack.append(_instance(_global_name(items[0]), items[1:]))
+    elif name in ("REDUCE", "NEWOBJ"):
+        args = stack.pop()
+        cls = stack.pop()
+        class_name = _global_name(cls)
+
+        # protocols 0 and 1 create instances of classes through copyreg
+        if class_name.endswith("._reconstructor") and args.items:
+            stack.append(_instance(_global_name(args.items[0]), []))
+        else:
+            stack.append(_instance(class_name, args.items, args.size))
+    elif name == "NEWOBJ_EX":
+        stack.pop()  # kwargs
+        args = stack.pop()
+        cls = stack.pop()
+        stack.append(_instance(_global_name(cls), args.items, args.size))
+    elif name == "BUILD":
+        state = stack.pop()
+        if stack[-1] is not MARK:
+            stack[-1].state = state
+
+    elif not opcode.stack_before and len(opcode.stack_after) == 1:
+        kind = SCALAR_KINDS.get(opcode.stack_after[0].name, "object")
+        stack.append(_scalar(kind, arg))
+    else:  # PERSID, EXT*, .. - anything unexpected
+        for stack_object in reversed(opcode.stack_before):
+            if stack_object is pickletools.markobject:
+                _pop_mark(stack)
+            elif stack_object is not pickletools.stackslice:
+                stack.pop()
+        for _ in opcode.stack_after:
+            stack.append(PreviewNode("object"))
+
+
+def _container(kind, items):
+    node = PreviewNode(kind, size=0)
+    for item in items:
+        node.add(item)
+
+    return node
+
+
+def _pairs(items):
+    return zip(items[::2], items[1::2])
+
+
+def _instance(class_name, args, size=None):
+    node = PreviewNode(class_name, size=size)
+    node.items = list(args)[:SAMPLE_ITEMS]
+
+    return node
+
+
+def _global_name(node):
+    if node is not MARK and node.kind == "global":
+        return node.value
+    return "object"
+
+
+def _scalar(kind, arg):
+    if isinstance(arg, _SkippedValue):
+        return PreviewNode(kind, arg.prefix, size=arg.length)
+    if kind == "int" and isinstance(arg, bool):
+        kind = "bool"
+
+    return PreviewNode(kind, arg)
+
+
+def format_preview(preview):
+    """Text lines describing the structure of the pickled object."""
+    lines = [f"pickle protocol {preview.protocol}, {preview.opcodes} opcodes"]
+    if preview.truncated:
+        lines.append(f"stopped after {MAX_OPCODES} opcodes, sizes are incomplete")
+    if preview.error:
+        lines.append(f"can't be read to the end: {preview.error}")
+
+    if preview.root is not None:
+        lines.extend(_format_node(preview.root, "", 0))
+
+    return lines
+
+
+def _format_node(node, prefix, depth):
+    indent = "    " * depth
+    lines = [f"{indent}{prefix}{_describe(node)}"]
+    if depth >= MAX_DEPTH:
+        return lines
+
+    for item in node.items:
+        if isinstance(item, tuple):
+            key, value = item
+            key_prefix = f"{_short_value(key)}: "
+            lines.extend(_format_node(value, key_prefix, depth + 1))
+        else:
+            lines.extend(_format_node(item, "", depth + 1))
+
+    if node.size is not None and node.size > len(node.items) and node.items:
+        lines.append(f"{indent}    … {node.size - len(node.items)} more")
+
+    if node.state is not None:
+        lines.extend(_format_node(node.state, "state: ", depth + 1))
+
+    return lines
+
+
+def _describe(node):
+    if node.kind in ("str", "bytes", "bytearray"):
+        value = _short_value(node)
+        if node.size is None and node.kind == "str":
+            return f"{node.kind} {value} ({len(node.value)} chars)"
+
+        length = node.size if node.size is not None else len(node.value)
+        return f"{node.kind} {value} ({bytes_to_readable_str(length)})"
+    elif node.kind in ("None", "buffer"):
+        return node.kind
+    elif node.kind in SCALAR_KINDS.values():
+        return f"{node.kind} {_short_value(node)}"
+    elif node.kind in ("list", "tuple", "dict", "set", "frozenset"):
+        return f"{node.kind} ({node.size} items)"
+    elif node.kind == "global":
+        return f"global {node.value}"
+
+    return node.kind
+
+
+def _short_value(node):
+    if node is MARK:
+        return "?"
+    if node.kind not in SCALAR_KINDS.values():
+        return node.kind
+
+    if node.value is None and node.size is not None:
+        return f"<{bytes_to_readable_str(node.size)}>"
+
+    value = repr(node.value)
+    if len(value) > 60 or (node.size is not None and node.value is not None):
+        value = value[:60] + "…"
+
+    return value
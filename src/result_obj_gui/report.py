@@ -0,0 +1,476 @@
+import sqlite3
+import os.path
+
+import justpy as jp
+
+from result_obj.result_obj import DataTypes
+
+from db import open_db
+from db import run_on_page_db
+from db import database_workers
+from db import is_indexed
+from db import table_has_rows
+from db import read_metadata_bounds
+
+from utils import html_from_ts
+from utils import iso_strs_from_ts
+from utils import bytes_to_readable_str
+from sections import _create_section
+from sections import _add_navigation
+from sections import observe_lazy_sections
+from sections import _create_lazy_section
+
+from add_section_logs import add_logs_section
+from add_section_metrics import add_metrics_section
+from add_section_activity import add_activity_section
+
+from pickle_preview import format_preview
+from pickle_preview import preview_pickle_blob
+
+from columnar import columnar_js
+from columnar import ColumnarGrid
+
+from search import highlight
+from search import fts_query
+from search import search_terms
+from search import SEARCH_SCHEMA
+from search import attach_search_index
+
+from diagnostics import Diagnostics
+from diagnostics import record_rows
+from add_section_diagnostics import add_diagnostics_section
+
+from follow import grid_transaction_js
+
+
+RAW_DATA_LIMIT = 64 * 1024
+
+
+def generate_report(sqlite_path, index=False, diagnostics=None, processes=0):
+    wp = jp.WebPage(delete_flag=False)
+    wp.on("page_ready", observe_lazy_sections)
+    # grid rows and chart points are sent as columns, decoded by the page
+    wp.body_html = f"<script>{columnar_js}</script>"
+    div_container = jp.Div(
+        a=jp.Div(a=wp, classes="md:container md:mx-auto"),
+        classes="min-h-screen flex flex-row bg-gray-100",
+    )
+
+    wp.diagnostics = diagnostics or Diagnostics()
+    wp.diagnostics.watch_page(wp)
+
+    # kept with the page, so the connection can be closed when the page is dropped
+    with wp.diagnostics.stage("open_db"):
+        wp.db = open_db(sqlite_path, index)
+    # the data of the sections are read by the workers, see `_create_lazy_section()`
+    wp.db_workers = database_workers(wp.db, processes)
+
+    div_content = jp.Div(classes="p-3 w-full")
+    with wp.diagnostics.stage("_generate_sections"):
+        sections_iterator = _generate_sections(div_content, wp, wp.db, sqlite_path)
+        div_navigation = _add_navigation(sections_iterator)
+
+    div_container.add(div_navigation)
+    div_container.add(div_content)
+
+    return lambda: wp
+
+
+def _generate_sections(div_content, wp, db, sqlite_path):
+    diagnostics = wp.diagnostics
+    _add_title_section(div_content)
+
+    with diagnostics.stage("section Overview"):
+        section_overview = _add_overview_section(div_content, db, sqlite_path)
+    yield section_overview
+
+    # lazy sections are measured when they are filled
+    yield _measured(diagnostics, _add_status_section(div_content, db))
+    yield _measured(diagnostics, _add_restore_points_section(div_content, db))
+    yield _measured(diagnostics, _add_result_section(div_content, db))
+    yield _measured(diagnostics, add_logs_section(div_content, db))
+    yield _measured(diagnostics, add_activity_section(div_content, db))
+    yield _measured(diagnostics, add_metrics_section(div_content, wp, db))
+
+    if diagnostics.enabled:
+        yield add_diagnostics_section(div_content, diagnostics)
+
+
+def _measured(diagnostics, section):
+    if section is not None and hasattr(section, "fill_section"):
+        section.fill_section = diagnostics.wrap(
+            f"section {section.id}", section.fill_section
+        )
+    if section is not None and getattr(section, "read_section", None):
+        section.read_section = diagnostics.wrap(
+            f"read {section.id}", section.read_section
+        )
+
+    return section
+
+
+def _add_title_section(div_content):
+    section_title = jp.Section(a=div_content)
+    h1 = jp.H1(a=section_title, classes="text-2xl pt-4 text-center")
+    h1.add(jp.Code(text="result_obj"))
+    h1.add(jp.Span(text=" info"))
+
+
+def _add_overview_section(div_content, db, sqlite_path):
+    section_overview = _create_section(div_content, "Overview")
+
+    jp.H2(a=section_overview, text="Analyzed file", classes="text-xl font-semibold")
+    sqlite_size = os.path.getsize(sqlite_path)
+    jp.P(
+        a=section_overview,
+        inner_html=f"<code>{os.path.abspath(sqlite_path)}</code> ({bytes_to_readable_str(sqlite_size)})",
+    )
+
+    metadata_start, metadata_end = read_metadata_bounds(db)
+
+    start_ts = metadata_start["timestamp"]
+    end_ts = metadata_end["timestamp"]
+
+    jp.H2(a=section_overview, text="Started", classes="text-xl font-semibold pt-3")
+    jp.P(
+        a=section_overview,
+        inner_html=f"{html_from_ts(start_ts)}",
+    )
+
+    jp.H2(a=section_overview, text="Stopped", classes="text-xl font-semibold pt-3")
+    jp.P(
+        a=section_overview,
+        inner_html=f"{html_from_ts(end_ts)}",
+    )
+
+    jp.H2(a=section_overview, text="Duration", classes="text-xl font-semibold pt-3")
+    jp.P(
+        a=section_overview,
+        inner_html=f"<em>{end_ts - start_ts:.2}</em> seconds.",
+    )
+
+    jp.H2(a=section_overview, text="sys.argv", classes="text-xl font-semibold pt-3")
+    jp.Code(
+        a=section_overview,
+        text=metadata_start["argv"],
+    )
+
+    jp.H2(a=section_overview, text=f"Directory", classes="text-xl font-semibold pt-3")
+    jp.Code(
+        a=section_overview,
+        text=metadata_start["pwd"],
+    )
+
+    cursor = db.cursor()
+    cursor.execute("SELECT key, value FROM MetadataEnvVars ORDER BY key")
+    env_var_list = cursor.fetchall()
+    record_rows(len(env_var_list))
+
+    jp.H2(
+        a=section_overview, text=f"Env variables", classes="text-xl font-semibold pt-3"
+    )
+
+    table_height = 400
+    if len(env_var_list) > 15:
+        table_height = 1200
+
+    table_options = {
+        "defaultColDef": {
+            "filter": True,
+            "sortable": True,
+            "resizable": True,
+            "headerClass": "font-bold",
+            "wrapText": True,
+        },
+        "columnDefs": [
+            {"headerName": "Name", "field": "key"},
+            {
+                "headerName": "Value",
+                "field": "value",
+                "minWidth": 1050,
+                "autoHeight": True,
+                "editable": True,
+            },
+        ],
+        "rowHeight": 120,
+        "rowData": [],
+    }
+    table = ColumnarGrid(
+        a=section_overview,
+        options=table_options,
+        style=f"height: {table_height}px; margin: 0.25em",
+    )
+    table.options.columnDefs[1].cellStyle = "white-space: normal;"
+    for env_var in env_var_list:
+        table.options.rowData.append({"key": env_var["key"], "value": env_var["value"]})
+
+    return section_overview
+
+
+def _add_status_section(div_content, db):
+    if not table_has_rows(db, "StatusHistory"):
+        return None
+
+    return _create_lazy_section(
+        div_content,
+        "Status messages",
+        lambda section, status_data: _fill_status_section(section, *status_data),
+        read_section=_read_status,
+    )
+
+
+def _read_status(db):
+    cursor = db.cursor()
+    if is_indexed(db):
+        cursor.execute(
+            "SELECT StatusHistory.timestamp, StatusHistory.status, "
+            "StatusHistory.rowid AS status_rowid "
+            "FROM idx.StatusHistoryByTimestamp AS i "
+            "JOIN StatusHistory ON StatusHistory.rowid = i.source_rowid "
+            "ORDER BY i.timestamp, i.source_rowid"
+        )
+    else:
+        cursor.execute(
+            "SELECT timestamp, status, rowid AS status_rowid "
+            "FROM StatusHistory ORDER BY timestamp"
+        )
+    status_list = cursor.fetchall()
+    record_rows(len(status_list))
+
+    last_rowid = max((x["status_rowid"] for x in status_list), default=0)
+
+    return _status_to_rows(status_list), last_rowid
+
+
+def _fill_status_section(section_status, status_rows, last_rowid):
+    height = 400
+    if len(status_rows) > 15:
+        height = 1200
+
+    table_options = {
+        "defaultColDef": {
+            "filter": True,
+            "sortable": True,
+            "resizable": True,
+            "headerClass": "font-bold",
+            "wrapText": True,
+        },
+        "columnDefs": [
+            {"headerName": "Time", "field": "time"},
+            {
+                "headerName": "Status",
+                "field": "status",
+                "minWidth": 1050,
+                "autoHeight": True,
+                "editable": True,
+            },
+        ],
+        "rowHeight": 120,
+        "rowData": [],
+        "pagination": True,
+        "paginationPageSize": 40,
+    }
+    div_search = jp.Div(a=section_status, classes="flex flex-row items-center")
+    jp.Span(a=div_search, text="Search:", classes="m-1")
+    input_search = jp.Input(
+        a=div_search,
+        classes="m-1 p-1 border rounded w-64",
+        placeholder="full text, ranked",
+    )
+    label_search = jp.Span(a=div_search, classes="m-1 text-gray-600")
+
+    table = ColumnarGrid(
+        a=section_status,
+        options=table_options,
+        style=f"height: {height}px; margin: 0.25em",
+    )
+    table.html_columns = [1]  # escaped, with search highlights
+    table.all_rows = status_rows
+    table.options.rowData = table.all_rows
+    table.search_terms = []
+
+    input_search.table = table
+    input_search.label = label_search
+    input_search.on("change", _on_status_search_change)
+
+    table.last_rowid = last_rowid
+    table.live_read = lambda: (_read_new_status, (table.last_rowid,))
+    table.live_update = lambda status_data: _status_live_update(table, *status_data)
+
+
+def _read_new_status(db, after_rowid):
+    cursor = db.cursor()
+    cursor.execute(
+        "SELECT timestamp, status, rowid FROM StatusHistory WHERE rowid > ? "
+        "ORDER BY rowid",
+        (after_rowid,),
+    )
+    status_list = cursor.fetchall()
+    last_rowid = status_list[-1]["rowid"] if status_list else after_rowid
+
+    return _status_to_rows(status_list), last_rowid
+
+
+def _status_live_update(table, rows, last_rowid):
+    if not rows:
+        return None
+
+    table.last_rowid = last_rowid
+    table.all_rows.extend(rows)
+    if table.search_terms:
+        return None  # the search results are sorted by relevance
+
+    return grid_transaction_js(table, rows)
+
+
+async def _on_status_search_change(self, msg):
+    table = self.table
+    terms = search_terms(msg.value)
+    if not terms:
+        table.search_terms = []
+        table.options.rowData = table.all_rows
+        self.label.text = ""
+        return
+
+    try:
+        status_rows = await run_on_page_db(msg.page, _search_status, terms)
+    except sqlite3.Error as e:
+        self.label.text = f"Can't create the search index: {e}"
+        return
+
+    table.search_terms = terms
+    table.options.rowData = status_rows
+    self.label.text = f"{len(status_rows)} matching"
+
+
+def _search_status(db, terms):
+    attach_search_index(db)
+
+    cursor = db.cursor()
+    cursor.execute(
+        "SELECT StatusHistory.timestamp, StatusHistory.status "
+        f"FROM {SEARCH_SCHEMA}.StatusHistorySearch AS s "
+        "JOIN StatusHistory ON StatusHistory.rowid = s.rowid "
+        "WHERE s.StatusHistorySearch MATCH ? ORDER BY s.rank",
+        (fts_query(terms),),
+    )
+
+    return _status_to_rows(cursor.fetchall(), terms)
+
+
+def _status_to_rows(status_list, search_terms=()):
+    times = iso_strs_from_ts([status_data["timestamp"] for status_data in status_list])
+
+    return [
+        {"time": time, "status": highlight(status_data["status"], search_terms)}
+        for time, status_data in zip(times, status_list)
+    ]
+
+
+def _add_restore_points_section(div_content, db):
+    if not table_has_rows(db, "RestorePoint"):
+        return None
+
+    return _create_lazy_section(
+        div_content,
+        "Restore points",
+        _fill_restore_points_section,
+        read_section=_read_restore_points,
+    )
+
+
+def _read_restore_points(db):
+    cursor = db.cursor()
+    cursor.execute(
+        "SELECT rowid, timestamp, type, length(restore_data) AS size "
+        "FROM RestorePoint"
+    )
+    restore_points = cursor.fetchall()
+    record_rows(len(restore_points))
+
+    return [
+        (dict(rp), _read_pickled_obj_info(db, "RestorePoint", "restore_data", rp))
+        for rp in restore_points
+    ]
+
+
+def _fill_restore_points_section(section_restore_points, restore_points):
+    for cnt, (rp, content) in enumerate(restore_points):
+        _display_pickled_obj_info(section_restore_points, "Restore point", rp, content)
+        if cnt < len(restore_points) - 1:
+            jp.P(a=section_restore_points, inner_html="&nbsp;")
+
+
+def _add_result_section(div_content, db):
+    if not table_has_rows(db, "Result"):
+        return None
+
+    return _create_lazy_section(
+        div_content,
+        "Result",
+        _fill_result_section,
+        read_section=_read_result,
+    )
+
+
+def _read_result(db):
+    cursor = db.cursor()
+    cursor.execute("SELECT rowid, timestamp, type, length(result) AS size FROM Result")
+    result = cursor.fetchone()
+
+    return dict(result), _read_pickled_obj_info(db, "Result", "result", result)
+
+
+def _fill_result_section(section_result, result_info):
+    result, content = result_info
+    _display_pickled_obj_info(section_result, "Result", result, content)
+
+
+def _read_pickled_obj_info(db, table, column, row):
+    """
+    The data itself is not loaded: pickles are only walked through by
+    `preview_pickle_blob()`, other types are read up to `RAW_DATA_LIMIT`.
+
+    Returns `("structure", lines)`, `("raw", data)` or None without data.
+    """
+    if row["size"] is None:
+        return None
+
+    if row["type"] == DataTypes.pickle:
+        try:
+            preview = preview_pickle_blob(db, table, column, row["rowid"])
+            lines = format_preview(preview)
+        except sqlite3.Error as e:
+            lines = [f"Can't open the data: {e}"]
+
+        return "structure", lines
+
+    cursor = db.cursor()
+    cursor.execute(
+        f"SELECT substr({column}, 1, ?) FROM {table} WHERE rowid = ?",
+        (RAW_DATA_LIMIT, row["rowid"]),
+    )
+
+    return "raw", cursor.fetchone()[0]
+
+
+def _display_pickled_obj_info(section, name, row, content):
+    jp.P(a=section, inner_html=f"{name} stored: {html_from_ts(row['timestamp'])}")
+    jp.P(a=section, inner_html=f"{name} type: {row['type']}")
+
+    result_size = bytes_to_readable_str(row["size"] or 0)
+    jp.P(a=section, inner_html=f"{name} size: {result_size}")
+
+    if content is None:
+        return
+
+    kind, data = content
+    if kind == "structure":
+        jp.P(a=section, text="Structure:")
+        jp.Pre(a=section, text="\n".join(data), classes="text-sm overflow-x-auto")
+        return
+
+    jp.P(a=section, text="Raw data:")
+    jp.P(a=section, text=data)
+    if row["size"] > RAW_DATA_LIMIT:
+        jp.P(a=section, text=f"… first {bytes_to_readable_str(RAW_DATA_LIMIT)} shown.")
@@ -1,363 +1,352 @@
 #! /usr/bin/env python3
+import sys
+import json
 import os.path
-import sqlite3
 import argparse
 
-import justpy as jp
+from db import open_db
 
-from result_obj.result_obj import DataTypes
+from diagnostics import Diagnostics
 
-from utils import html_from_ts
-from utils import _create_section
-from utils import iso_str_from_ts
-from utils import bytes_to_readable_str
+from info import read_info
+from info import format_info
+from info import read_metric_list
+from info import format_metric_list
 
-from add_section_metrics import add_metrics_section
+from dump import FORMATS
+from dump import TIME_COLUMNS
+from dump import DumpFilter
+from dump import dump_table
+from dump import parse_time
+from dump import dump_metrics_pivoted
 
+# The commands building the report import justpy (with starlette, uvicorn and
+# the rest of the web server), numpy and result_obj when they are run, so the
+# ones called from scripts, like `info`, start fast. Keep the imports on the
+# top of this module light, see `benchmark.py --imports`.
 
-def generate_report(sqlite_path):
-    wp = jp.WebPage(delete_flag=False)
-    div_container = jp.Div(
-        a=jp.Div(a=wp, classes="md:container md:mx-auto"),
-        classes="min-h-screen flex flex-row bg-gray-100",
-    )
-
-    div_content = jp.Div(classes="p-3 w-full")
-    sections_iterator = _generate_sections(div_content, wp, sqlite_path)
-    div_navigation = _add_navigation(sections_iterator)
-
-    div_container.add(div_navigation)
-    div_container.add(div_content)
-
-    return lambda: wp
-
-
-def _generate_sections(div_content, wp, sqlite_path):
-    _add_title_section(div_content)
-
-    db = sqlite3.connect(sqlite_path)
-    db.row_factory = sqlite3.Row
 
-    yield _add_overview_section(div_content, db, sqlite_path)
-    yield _add_status_section(div_content, db)
-    yield _add_restore_points_section(div_content, db)
-    yield _add_result_section(div_content, db)
-    yield _add_logs_section(div_content, db)
-    yield add_metrics_section(div_content, wp, db)
+COMMANDS = ("show", "export", "compare", "info", "metrics", "dump")
 
 
-def _add_title_section(div_content):
-    section_title = jp.Section(a=div_content)
-    h1 = jp.H1(a=section_title, classes="text-2xl pt-4 text-center")
-    h1.add(jp.Code(text="result_obj"))
-    h1.add(jp.Span(text=" info"))
-
-
-def _add_overview_section(div_content, db, sqlite_path):
-    section_overview = _create_section(div_content, "Overview")
-
-    jp.H2(a=section_overview, text="Analyzed file", classes="text-xl font-semibold")
-    sqlite_size = os.path.getsize(sqlite_path)
-    jp.P(
-        a=section_overview,
-        inner_html=f"<code>{os.path.abspath(sqlite_path)}</code> ({bytes_to_readable_str(sqlite_size)})",
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="""Web interface for the `result_obj` project \
+                       https://github.com/Bystroushaak/result_obj"""
     )
+    subparsers = parser.add_subparsers(dest="command", required=True)
 
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM Metadata ORDER BY timestamp")
-    metadata_list = cursor.fetchall()
-
-    metadata_start = metadata_list[0]
-    metadata_end = metadata_list[-1]
-
-    start_ts = metadata_start["timestamp"]
-    end_ts = metadata_end["timestamp"]
+    parser_show = subparsers.add_parser(
+        "show", help="Serve the report(s) on a local web server."
+    )
+    parser_show.add_argument(
+        "SQLITE",
+        help="""Path to the SQLite generated by `obj_result`, or to a directory \
+                with them, which starts a server listing all the reports.""",
+    )
+    _add_index_argument(parser_show)
+    _add_processes_argument(parser_show)
+    _add_diagnostics_arguments(parser_show)
+    parser_show.add_argument(
+        "--cache-pages",
+        type=int,
+        default=32,
+        help="Directory mode: how many built reports to keep. Default %(default)s.",
+    )
+    parser_show.add_argument(
+        "--cache-size",
+        type=int,
+        default=512,
+        help="Directory mode: size of the built reports to keep, in MiB. "
+        "Default %(default)s.",
+    )
+    parser_show.add_argument(
+        "--follow",
+        action="store_true",
+        help="""Single file mode: keep watching the SQLITE file and push new \
+                logs, status messages and metrics to the open page.""",
+    )
 
-    jp.H2(a=section_overview, text="Started", classes="text-xl font-semibold pt-3")
-    jp.P(
-        a=section_overview,
-        inner_html=f"{html_from_ts(start_ts)}",
+    parser_export = subparsers.add_parser(
+        "export",
+        help="Write the report as a static HTML page, which needs no server.",
     )
+    parser_export.add_argument(
+        "SQLITE", help="Path to the SQLite generated by `obj_result`."
+    )
+    parser_export.add_argument(
+        "OUTPUT_DIR",
+        help="""Directory for the `index.html`, the `data/` directory with \
+                compressed rows and series, loaded by the page when needed, and \
+                the `assets/` copied from justpy. The page can be opened from \
+                the disk, only the heatmap of the Activity section is loaded \
+                from the network.""",
+    )
+    _add_index_argument(parser_export)
+    _add_processes_argument(parser_export)
+    _add_diagnostics_arguments(parser_export)
+
+    parser_compare = subparsers.add_parser(
+        "compare",
+        help="Serve a page comparing the metrics, durations and log levels of "
+        "several runs.",
+    )
+    parser_compare.add_argument(
+        "SQLITE",
+        nargs="+",
+        help="""Paths to the SQLite files, the first one is the baseline the \
+                others are compared to.""",
+    )
+    _add_index_argument(parser_compare)
+    _add_diagnostics_arguments(parser_compare)
 
-    jp.H2(a=section_overview, text="Stopped", classes="text-xl font-semibold pt-3")
-    jp.P(
-        a=section_overview,
-        inner_html=f"{html_from_ts(end_ts)}",
+    parser_info = subparsers.add_parser(
+        "info",
+        help="Print when and how the run was started and the number of rows "
+        "of the tables.",
+    )
+    parser_info.add_argument(
+        "SQLITE", help="Path to the SQLite generated by `obj_result`."
     )
+    _add_json_argument(parser_info)
 
-    jp.H2(a=section_overview, text="Duration", classes="text-xl font-semibold pt-3")
-    jp.P(
-        a=section_overview,
-        inner_html=f"<em>{end_ts - start_ts:.2}</em> seconds.",
+    parser_metrics = subparsers.add_parser(
+        "metrics",
+        help="List the metrics with their types, number of samples and the "
+        "first and the last time they were stored.",
+    )
+    parser_metrics.add_argument(
+        "SQLITE", help="Path to the SQLite generated by `obj_result`."
     )
+    _add_index_argument(parser_metrics)
+    _add_json_argument(parser_metrics)
 
-    jp.H2(a=section_overview, text="sys.argv", classes="text-xl font-semibold pt-3")
-    jp.Code(
-        a=section_overview,
-        text=metadata_start["argv"],
+    parser_dump = subparsers.add_parser(
+        "dump",
+        help="Stream the rows of a table as CSV or NDJSON, for other tools.",
     )
+    parser_dump.add_argument(
+        "SQLITE", help="Path to the SQLite generated by `obj_result`."
+    )
+    parser_dump.add_argument("TABLE", choices=list(TIME_COLUMNS))
+    parser_dump.add_argument(
+        "-f", "--format", choices=FORMATS, default="csv", help="Default %(default)s."
+    )
+    parser_dump.add_argument(
+        "-o", "--output", metavar="PATH", help="Write to PATH instead of stdout."
+    )
+    parser_dump.add_argument(
+        "--from",
+        dest="time_from",
+        type=parse_time,
+        metavar="TIME",
+        help="""Only the rows from TIME on, a Unix timestamp or ISO 8601 date \
+                and time (local, without a time zone).""",
+    )
+    parser_dump.add_argument(
+        "--to",
+        dest="time_to",
+        type=parse_time,
+        metavar="TIME",
+        help="Only the rows up to TIME, like --from.",
+    )
+    parser_dump.add_argument(
+        "--level",
+        action="append",
+        default=[],
+        help="Logs: only the records of this level, may be repeated.",
+    )
+    parser_dump.add_argument(
+        "--name",
+        action="append",
+        default=[],
+        help="""Only the logger, metric or environment variable with this \
+                name, may be repeated.""",
+    )
+    parser_dump.add_argument(
+        "--type",
+        action="append",
+        default=[],
+        help="Metrics: only the metrics of this type, may be repeated.",
+    )
+    parser_dump.add_argument(
+        "--pivot",
+        action="store_true",
+        help="""Metrics: a column for each metric and a row for each \
+                timestamp, instead of a row for each sample.""",
+    )
+
+    # `result_obj_gui.py file.sqlite` used to be the only way to call it
+    if argv and argv[0] not in COMMANDS and argv[0] not in ("-h", "--help"):
+        argv = ["show"] + argv
 
-    jp.H2(a=section_overview, text=f"Directory", classes="text-xl font-semibold pt-3")
-    jp.Code(
-        a=section_overview,
-        text=metadata_start["pwd"],
+    return parser.parse_args(argv)
+
+
+def _add_index_argument(parser):
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="""Create (or update) a sidecar database with indexes for the \
+                queries used by the GUI and use it. The sidecar is stored in \
+                `~/.cache/result_obj_gui/`, the SQLITE file is not modified.""",
     )
 
-    cursor.execute("SELECT key, value FROM MetadataEnvVars ORDER BY key")
-    env_var_list = cursor.fetchall()
 
-    jp.H2(
-        a=section_overview, text=f"Env variables", classes="text-xl font-semibold pt-3"
+def _add_processes_argument(parser):
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=0,
+        metavar="N",
+        help="""Read and prepare the data of the sections in N worker \
+                processes, each with its own connection, instead of threads. \
+                Helps with very large files on a machine with more cores.""",
     )
 
-    table_height = 400
-    if len(env_var_list) > 15:
-        table_height = 1200
-
-    table_options = {
-        "defaultColDef": {
-            "filter": True,
-            "sortable": True,
-            "resizable": True,
-            "headerClass": "font-bold",
-            "wrapText": True,
-        },
-        "columnDefs": [
-            {"headerName": "Name", "field": "key"},
-            {
-                "headerName": "Value",
-                "field": "value",
-                "minWidth": 1050,
-                "autoHeight": True,
-                "editable": True,
-            },
-        ],
-        "rowHeight": 120,
-        "rowData": [],
-    }
-    table = jp.AgGrid(
-        a=section_overview,
-        options=table_options,
-        style=f"height: {table_height}px; margin: 0.25em",
+
+def _add_diagnostics_arguments(parser):
+    parser.add_argument(
+        "--diagnostics",
+        action="store_true",
+        help="""Measure time, rows read, allocated memory blocks and bytes sent \
+                to the browser by each stage of building the report and show \
+                them in the Diagnostics section.""",
     )
-    table.options.columnDefs[1].cellStyle = "white-space: normal;"
-    for env_var in env_var_list:
-        table.options.rowData.append({"key": env_var["key"], "value": env_var["value"]})
-
-    return section_overview
-
-
-def _add_status_section(div_content, db):
-    section_status = _create_section(div_content, "Status messages")
-
-    cursor = db.cursor()
-    cursor.execute("SELECT timestamp, status FROM StatusHistory ORDER BY timestamp")
-    status_list = cursor.fetchall()
-
-    if not status_list:
-        return None
-
-    height = 400
-    if len(status_list) > 15:
-        height = 1200
-
-    table_options = {
-        "defaultColDef": {
-            "filter": True,
-            "sortable": True,
-            "resizable": True,
-            "headerClass": "font-bold",
-            "wrapText": True,
-        },
-        "columnDefs": [
-            {"headerName": "Time", "field": "time"},
-            {
-                "headerName": "Status",
-                "field": "status",
-                "minWidth": 1050,
-                "autoHeight": True,
-                "editable": True,
-            },
-        ],
-        "rowHeight": 120,
-        "rowData": [],
-        "pagination": True,
-        "paginationPageSize": 40,
-    }
-    table = jp.AgGrid(
-        a=section_status,
-        options=table_options,
-        style=f"height: {height}px; margin: 0.25em",
+    parser.add_argument(
+        "--diagnostics-json",
+        metavar="PATH",
+        help="""Like --diagnostics, and keep writing the measurements to PATH \
+                as JSON. Not used in the directory mode.""",
     )
-    for status_data in status_list:
-        table.options.rowData.append(
-            {
-                "time": iso_str_from_ts(status_data["timestamp"]),
-                "status": status_data["status"],
-            }
-        )
 
-    return section_status
 
+def _add_json_argument(parser):
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print JSON instead of the text meant for people.",
+    )
 
-def _add_restore_points_section(div_content, db):
-    section_restore_points = _create_section(div_content, "Restore points")
 
-    cursor = db.cursor()
-    cursor.execute("SELECT timestamp, type, restore_data FROM RestorePoint")
-    restore_points = cursor.fetchall()
+def _show(args):
+    import justpy as jp
 
-    if not restore_points:
-        return None
+    from report import generate_report
+    from follow import start_following
+    from server import serve_directory
 
-    for cnt, rp in enumerate(restore_points):
-        _display_pickled_obj_info(
-            section_restore_points,
-            "Restore point",
-            rp["timestamp"],
-            rp["type"],
-            rp["restore_data"],
+    if os.path.isdir(args.SQLITE):
+        serve_directory(
+            args.SQLITE,
+            lambda sqlite_path: generate_report(
+                sqlite_path, args.index, Diagnostics(args.diagnostics), args.processes
+            )(),
+            max_pages=args.cache_pages,
+            max_bytes=args.cache_size * 1024 * 1024,
         )
-        if cnt < len(restore_points) - 1:
-            jp.P(a=section_restore_points, inner_html="&nbsp;")
+    else:
+        diagnostics = Diagnostics(args.diagnostics, args.diagnostics_json)
+        report = generate_report(args.SQLITE, args.index, diagnostics, args.processes)
+        startup = None
+        if args.follow:
+            startup = lambda: start_following(report())
 
-    return section_restore_points
+        jp.justpy(report, startup=startup)
 
 
-def _add_result_section(div_content, db):
-    section_result = _create_section(div_content, "Result")
+def _export(args):
+    from report import generate_report
+    from export import export_report
 
-    cursor = db.cursor()
-    cursor.execute("SELECT timestamp, type, result FROM Result")
-    result = cursor.fetchone()
+    diagnostics = Diagnostics(args.diagnostics, args.diagnostics_json)
+    wp = generate_report(args.SQLITE, args.index, diagnostics, args.processes)()
+    try:
+        title = f"result_obj: {os.path.basename(args.SQLITE)}"
+        with diagnostics.stage("export_report"):
+            index_path = export_report(wp, args.OUTPUT_DIR, title=title)
+    finally:
+        wp.db_workers.close()
+        wp.db.close()
 
-    if not result:
-        return None
+    print(index_path)
 
-    _display_pickled_obj_info(
-        section_result, "Result", result["timestamp"], result["type"], result["result"]
-    )
 
-    return section_result
-
-
-def _display_pickled_obj_info(section, name, added, data_type, data):
-    jp.P(a=section, inner_html=f"{name} stored: {html_from_ts(added)}")
-    jp.P(a=section, inner_html=f"{name} type: {data_type}")
-
-    result_len = len(data)
-    result_size = bytes_to_readable_str(result_len)
-    jp.P(a=section, inner_html=f"{name} size: {result_size}")
-
-    if result_len < 1024 or data_type != DataTypes.pickle:
-        jp.P(a=section, text="Raw data:")
-        jp.P(a=section, text=data)
-
-
-def _add_logs_section(div_content, db):
-    section_logs = _create_section(div_content, "Logs")
-
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM Logs ORDER BY created")
-    logs_list = cursor.fetchall()
-
-    if not logs_list:
-        return None
-
-    table_options = {
-        "defaultColDef": {
-            "filter": True,
-            "sortable": True,
-            "resizable": True,
-            "headerClass": "font-bold",
-            "wrapText": True,
-        },
-        "columnDefs": [
-            {"headerName": "Created", "field": "created"},
-            {"headerName": "Level", "field": "levelname"},
-            {
-                "headerName": "Message",
-                "field": "msg",
-                # "minWidth": 1050,
-                "autoHeight": True,
-                "editable": True,
-            },
-            {"headerName": "Filename", "field": "filename"},
-            {"headerName": "Line", "field": "lineno"},
-            {"headerName": "Function", "field": "funcname"},
-            {"headerName": "Name", "field": "name"},
-            {"headerName": "Module", "field": "module"},
-            {"headerName": "Path", "field": "pathname"},
-            {"headerName": "Process", "field": "process"},
-            {"headerName": "Process name", "field": "processName"},
-            {"headerName": "Thread ID", "field": "thread"},
-            {"headerName": "Thread name", "field": "threadName"},
-        ],
-        "rowHeight": 120,
-        "pagination": True,
-        "paginationPageSize": 40,
-        "rowData": [],
-    }
-
-    height = 400
-    if len(logs_list) > 15:
-        height = 1200
-
-    table = jp.AgGrid(
-        a=section_logs,
-        options=table_options,
-        style=f"height: {height}px; margin: 0.25em",
-    )
-    for log in logs_list:
-        table.options.rowData.append(
-            {
-                "created": iso_str_from_ts(log["created"]),
-                "levelname": log["levelname"],
-                "msg": log["msg"],
-                "filename": log["filename"],
-                "lineno": log["lineno"],
-                "funcname": log["funcName"],
-                "module": log["module"],
-                "name": log["name"],
-                "pathname": log["pathname"],
-                "process": log["process"],
-                "processName": log["processName"],
-                "thread": log["thread"],
-                "threadName": log["threadName"],
-            }
-        )
+def _compare(args):
+    import justpy as jp
 
-    return section_logs
+    from compare import generate_comparison
 
+    diagnostics = Diagnostics(args.diagnostics, args.diagnostics_json)
+    jp.justpy(generate_comparison(args.SQLITE, args.index, diagnostics))
 
-def _add_navigation(items):
-    div = jp.Div()
-    div_ul_container = jp.Div(
-        a=div,
-        classes="sticky top-0 mt-20 w-32 pl-3 pt-2 ml-2 text-sm rounded-lg shadow-md bg-white",
-    )
 
-    ul = jp.Ul(a=div_ul_container, classes="nav")
+def _info(args):
+    db = open_db(args.SQLITE)
+    try:
+        info = read_info(db, args.SQLITE)
+    finally:
+        db.close()
 
-    for section in items:
-        if not section:
-            continue
+    print(json.dumps(info, indent=4) if args.json else format_info(info))
 
-        link = "#" + section.id
-        name = section.components[0].text
 
-        li = jp.Li(a=ul, classes="py-1")
-        jp.A(a=li, classes="nav-link", href=link, text=name)  # , scroll=True
+def _metrics(args):
+    db = open_db(args.SQLITE, args.index)
+    try:
+        metrics = read_metric_list(db)
+    finally:
+        db.close()
 
-    return div
+    print(json.dumps(metrics, indent=4) if args.json else format_metric_list(metrics))
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(
-        description="""Web interface for the `result_obj` project \
-                       https://github.com/Bystroushaak/result_obj"""
+def _dump(args):
+    dump_filter = DumpFilter(
+        args.time_from,
+        args.time_to,
+        [level.upper() for level in args.level],
+        args.name,
+        args.type,
     )
-    parser.add_argument("SQLITE", help="Path to the SQLite generated by `obj_result`.")
-    args = parser.parse_args()
+    if args.pivot and args.TABLE != "Metrics":
+        sys.exit("Only the Metrics can be pivoted.")
+
+    db = open_db(args.SQLITE)
+    output = sys.stdout
+    if args.output:
+        output = open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        if args.pivot:
+            dump_metrics_pivoted(db, output, args.format, dump_filter)
+        else:
+            dump_table(db, args.TABLE, output, args.format, dump_filter)
+        output.flush()
+    except ValueError as e:
+        sys.exit(f"Can't dump {args.TABLE}: {e}")
+    except BrokenPipeError:
+        # the reading end was closed (like by `head`), python would complain
+        # again when flushing the stdout on exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        db.close()
+
 
-    jp.justpy(generate_report(args.SQLITE))
+if __name__ == "__main__":
+    args = _parse_args(sys.argv[1:])
+
+    if args.command == "export":
+        _export(args)
+    elif args.command == "compare":
+        _compare(args)
+    elif args.command == "info":
+        _info(args)
+    elif args.command == "metrics":
+        _metrics(args)
+    elif args.command == "dump":
+        _dump(args)
+    else:
+        _show(args)
@@ -0,0 +1,511 @@
+import numpy as np
+
+from result_obj.metrics import Metric
+
+from db import is_indexed
+from db import database_path
+
+from sidecar import has_sidecar
+from sidecar import attach_sidecar
+from sidecar import SIDECAR_DIR
+from sidecar import PRIMARY_KEYS
+from sidecar import ROLLUP_TABLES
+from sidecar import get_meta
+from sidecar import set_meta
+from sidecar import update_sidecar_tables
+
+from utils import BUCKET_WIDTHS
+
+from diagnostics import record_rows
+
+from downsample import POINT_BUDGET
+from downsample import min_max_buckets
+
+
+ROLLUP_SCHEMA = "rollup"
+ROLLUP_WIDTHS = [width for width in BUCKET_WIDTHS if width >= 1]
+# the columns after the primary key
+ROLLUP_VALUE_COLUMNS = ROLLUP_TABLES[0][2][4:]
+ROLLUP_CHUNK_ROWS = 1_000_000
+ROLLUP_TYPES = [Metric.TYPE_VALUE, Metric.TYPE_INCREMENT]
+
+_number = "CASE WHEN typeof(value) IN ('integer', 'real') THEN value END"
+
+
+class Rollups:
+    """
+    Rollups of the metrics of one result file, up to the row `high_water_mark`
+    of Metrics. Only the path of the sidecar is kept, so it can be passed to
+    the worker processes, each connection attaches it when it reads first.
+    """
+
+    __slots__ = ("sidecar_path", "high_water_mark")
+
+    def __init__(self, sidecar_path, high_water_mark):
+        self.sidecar_path = sidecar_path
+        self.high_water_mark = high_water_mark
+
+
+def open_rollups(db):
+    """
+    Build (or update) the rollups of the metrics of the result file opened as
+    `db` and attach them as `rollup`. The first call on a big file may take a
+    while, the following ones only roll up the rows added since.
+    """
+    sidecar_path = update_rollups(database_path(db))
+    rollups = Rollups(sidecar_path, 0)
+    _attach(db, rollups)
+
+    cursor = db.execute(
+        f"SELECT value FROM {ROLLUP_SCHEMA}.Meta WHERE key = 'MetricsRollup.rowid'"
+    )
+    row = cursor.fetchone()
+    rollups.high_water_mark = row[0] if row else 0
+
+    return rollups
+
+
+def update_rollups(sqlite_path, sidecar_dir=SIDECAR_DIR):
+    """Roll up the metrics stored since the last update."""
+    return update_sidecar_tables(
+        sqlite_path, ROLLUP_TABLES, _update_rollup_tables, sidecar_dir
+    )
+
+
+def read_rollup_names(db, rollups, metric_type):
+    """Names of the metrics of `metric_type`, in the order they were first stored."""
+    _attach(db, rollups)
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        f"SELECT name FROM {ROLLUP_SCHEMA}.MetricsRollup "
+        "WHERE width = ? AND type = ? GROUP BY name ORDER BY min(first_rowid)",
+        (ROLLUP_WIDTHS[-1], metric_type),
+    )
+
+    return [name for name, in cursor]
+
+
+def read_rollup_points(
+    db, rollups, name, metric_type, x_min=None, x_max=None, threshold=POINT_BUDGET
+):
+    """
+    About `threshold` points of the metric between the timestamps `x_min` and
+    `x_max`. When there are more rows than that, the minimum and the maximum
+    of each bucket of the narrowest rollup with fewer than `threshold / 2`
+    buckets in the window, like `min_max_buckets()` does. Fewer rows are read
+    from the sidecar index by the name and the time when it's attached,
+    otherwise from the narrowest rollup. The rows stored after the rollups
+    were built are added to them.
+
+    Returns `(timestamps, values)`, non-numeric values and empty buckets as NaN.
+    """
+    _attach(db, rollups)
+    cursor = db.cursor()
+    cursor.row_factory = None
+
+    widest = ROLLUP_WIDTHS[-1]
+    where, parameters = _window(widest, metric_type, name, x_min, x_max)
+    cursor.execute(
+        f"SELECT total(count) FROM {ROLLUP_SCHEMA}.MetricsRollup WHERE {where}",
+        parameters,
+    )
+    rows = cursor.fetchone()[0]
+
+    if rows <= threshold and is_indexed(db):
+        timestamps, values = _read_indexed_rows(
+            db, rollups, name, metric_type, x_min, x_max
+        )
+    elif rows <= threshold:
+        timestamps, values = _read_bucket_points(
+            db, name, metric_type, ROLLUP_WIDTHS[0], x_min, x_max
+        )
+    else:
+        width = widest
+        for narrower in reversed(ROLLUP_WIDTHS[:-1]):
+            where, parameters = _window(narrower, metric_type, name, x_min, x_max)
+            cursor.execute(
+                f"SELECT count(*) FROM {ROLLUP_SCHEMA}.MetricsRollup WHERE {where}",
+                parameters,
+            )
+            if cursor.fetchone()[0] > threshold // 2:
+                break
+            width = narrower
+
+        timestamps, values = _read_bucket_points(
+            db, name, metric_type, width, x_min, x_max
+        )
+
+    new_timestamps, new_values = read_new_rows(
+        db, rollups, name, metric_type, x_min, x_max
+    )
+    if len(new_timestamps):
+        new_timestamps, new_values = min_max_buckets(
+            new_timestamps, new_values, max(threshold - len(timestamps), 2)
+        )
+        timestamps = np.concatenate((timestamps, new_timestamps))
+        values = np.concatenate((values, new_values))
+
+    order = np.argsort(timestamps, kind="stable")
+
+    return timestamps[order], values[order]
+
+
+def read_new_rows(
+    db, rollups, name, metric_type, x_min=None, x_max=None, up_to_rowid=None
+):
+    """
+    `(timestamps, values)` of the rows of the metric stored after the rollups
+    were built, between `x_min` and `x_max`.
+    """
+    conditions = ["rowid > ?"]
+    parameters = [rollups.high_water_mark]
+    if up_to_rowid is not None:
+        conditions.append("rowid <= ?")
+        parameters.append(up_to_rowid)
+    if x_min is not None:
+        conditions.append("timestamp >= ?")
+        parameters.append(x_min)
+    if x_max is not None:
+        conditions.append("timestamp <= ?")
+        parameters.append(x_max)
+
+    return _read_rows(db, name, metric_type, " AND ".join(conditions), parameters)
+
+
+def read_rollup_ranges(db, rollups, metric_type, name=None, x_min=None, x_max=None):
+    """
+    The first and the last timestamp of the metrics of `metric_type` (or just
+    the one with `name`) between `x_min` and `x_max`, to the second.
+
+    Returns `{name: (first timestamp, last timestamp)}`.
+    """
+    _attach(db, rollups)
+
+    # any width has the same first and last timestamps, the widest is the
+    # smallest, within a window the narrowest is the most precise
+    width = ROLLUP_WIDTHS[-1] if x_min is None and x_max is None else ROLLUP_WIDTHS[0]
+    where, parameters = _window(width, metric_type, name, x_min, x_max)
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        "SELECT name, min(first_timestamp), max(last_timestamp) "
+        f"FROM {ROLLUP_SCHEMA}.MetricsRollup WHERE {where} GROUP BY name",
+        parameters,
+    )
+
+    ranges = {}
+    for metric_name, first_timestamp, last_timestamp in cursor:
+        if x_min is not None:
+            first_timestamp = max(first_timestamp, x_min)
+        if x_max is not None:
+            last_timestamp = min(last_timestamp, x_max)
+        ranges[metric_name] = (first_timestamp, max(first_timestamp, last_timestamp))
+
+    return ranges
+
+
+def read_rollup_counts(db, rollups, name, metric_type, first, width, x_max=None):
+    """
+    Number of rows of the metric in buckets of `width` seconds, a multiple of
+    one of `ROLLUP_WIDTHS`, starting at `first` (a multiple of `width`) and
+    ending with the one with `x_max` in. Whole buckets are counted, also the
+    ones only partly in the window.
+
+    Returns `(buckets, counts, rows before first)`.
+    """
+    _attach(db, rollups)
+
+    width = int(width)
+    rollup_width = max(w for w in ROLLUP_WIDTHS if width % w == 0)
+    first_bucket = round(first / width)
+    first_rollup_bucket = first_bucket * width // rollup_width
+
+    conditions = ["width = ?", "type = ?", "name = ?"]
+    parameters = [rollup_width, metric_type, name]
+    if x_max is not None:
+        conditions.append("bucket <= ?")
+        parameters.append(int(x_max // rollup_width))
+    where = " AND ".join(conditions)
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        "SELECT bucket * ? / ? - ? AS counter_bucket, sum(count) "
+        f"FROM {ROLLUP_SCHEMA}.MetricsRollup WHERE {where} AND bucket >= ? "
+        "GROUP BY counter_bucket ORDER BY counter_bucket",
+        [rollup_width, width, first_bucket] + parameters + [first_rollup_bucket],
+    )
+    rows = cursor.fetchall()
+    record_rows(len(rows))
+
+    cursor.execute(
+        f"SELECT total(count) FROM {ROLLUP_SCHEMA}.MetricsRollup "
+        f"WHERE {where} AND bucket < ?",
+        parameters + [first_rollup_bucket],
+    )
+    before = int(cursor.fetchone()[0])
+
+    buckets = np.array([bucket for bucket, _ in rows], dtype=np.int64)
+    counts = np.array([count for _, count in rows], dtype=np.int64)
+
+    return buckets, counts, before
+
+
+def _attach(db, rollups):
+    if not has_sidecar(db, ROLLUP_SCHEMA):
+        attach_sidecar(db, rollups.sidecar_path, ROLLUP_SCHEMA)
+
+
+def _window(width, metric_type, name=None, x_min=None, x_max=None):
+    conditions = ["width = ?", "type = ?"]
+    parameters = [width, metric_type]
+    if name is not None:
+        conditions.append("name = ?")
+        parameters.append(name)
+    if x_min is not None:
+        conditions.append("bucket >= ?")
+        parameters.append(int(x_min // width))
+    if x_max is not None:
+        conditions.append("bucket <= ?")
+        parameters.append(int(x_max // width))
+
+    return " AND ".join(conditions), parameters
+
+
+def _read_rows(db, name, metric_type, where, parameters):
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        f"SELECT timestamp, {_number} FROM Metrics "
+        f"WHERE {where} AND name = ? AND type = ?",
+        parameters + [name, metric_type],
+    )
+    rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 2)
+    record_rows(len(rows))
+
+    return rows[:, 0], rows[:, 1]
+
+
+def _read_indexed_rows(db, rollups, name, metric_type, x_min, x_max):
+    # the narrowest buckets on the edges too, so the line doesn't end abruptly
+    # on the edges of a zoomed chart
+    narrowest = ROLLUP_WIDTHS[0]
+    window = []
+    parameters = []
+    if x_min is not None:
+        window.append("timestamp >= ?")
+        parameters.append(x_min // narrowest * narrowest)
+    if x_max is not None:
+        window.append("timestamp < ?")
+        parameters.append((x_max // narrowest + 1) * narrowest)
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute("SELECT value FROM idx.Meta WHERE key = 'MetricsByName.rowid'")
+    row = cursor.fetchone()
+    indexed_rowid = min(row[0] if row else 0, rollups.high_water_mark)
+
+    conditions = " AND ".join(["name = ?", "type = ?", "source_rowid <= ?"] + window)
+    cursor.execute(
+        f"SELECT timestamp, {_number} FROM idx.MetricsByName WHERE {conditions}",
+        [name, metric_type, indexed_rowid] + parameters,
+    )
+    rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 2)
+    record_rows(len(rows))
+    timestamps, values = rows[:, 0], rows[:, 1]
+
+    # stored after the index was updated, but before the rollups were
+    if indexed_rowid < rollups.high_water_mark:
+        conditions = " AND ".join(["rowid > ? AND rowid <= ?"] + window)
+        gap_timestamps, gap_values = _read_rows(
+            db,
+            name,
+            metric_type,
+            conditions,
+            [indexed_rowid, rollups.high_water_mark] + parameters,
+        )
+        timestamps = np.concatenate((timestamps, gap_timestamps))
+        values = np.concatenate((values, gap_values))
+
+    return timestamps, values
+
+
+def _read_bucket_points(db, name, metric_type, width, x_min, x_max):
+    where, parameters = _window(width, metric_type, name, x_min, x_max)
+
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(
+        "SELECT minimum_timestamp, minimum, maximum_timestamp, maximum, "
+        f"first_timestamp FROM {ROLLUP_SCHEMA}.MetricsRollup WHERE {where}",
+        parameters,
+    )
+    rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 5)
+    record_rows(len(rows))
+
+    minimum_timestamps, minimums, maximum_timestamps, maximums, firsts = rows.T
+    # buckets without a numeric value are gaps in the line
+    empty = np.isnan(minimums)
+    minimum_timestamps = np.where(empty, firsts, minimum_timestamps)
+    both = ~empty & (maximum_timestamps != minimum_timestamps)
+
+    return (
+        np.concatenate((minimum_timestamps, maximum_timestamps[both])),
+        np.concatenate((minimums, maximums[both])),
+    )
+
+
+def _update_rollup_tables(sidecar):
+    for table_name, source_table, columns in ROLLUP_TABLES:
+        high_water_mark = get_meta(sidecar, f"{table_name}.rowid") or 0
+        max_rowid = sidecar.execute(f"SELECT max(rowid) FROM src.{source_table}")
+        max_rowid = max_rowid.fetchone()[0] or 0
+
+        # the new rows are rolled up on their own, chunk by chunk, and merged
+        # into the buckets they fall into
+        for after_rowid in range(high_water_mark, max_rowid, ROLLUP_CHUNK_ROWS):
+            up_to_rowid = min(after_rowid + ROLLUP_CHUNK_ROWS, max_rowid)
+            rows = _read_rollup_source(sidecar, source_table, after_rowid, up_to_rowid)
+            _merge_rollups(sidecar, table_name, columns, _roll_up_all_widths(*rows))
+
+        if max_rowid > high_water_mark:
+            set_meta(sidecar, f"{table_name}.rowid", max_rowid)
+
+
+def _read_rollup_source(sidecar, source_table, after_rowid, up_to_rowid):
+    """
+    Rows of the metrics as one-row rollups: `(metric keys, columns)`, where
+    `key` in the columns is the index into the `(type, name)` keys.
+    """
+    placeholders = ", ".join("?" * len(ROLLUP_TYPES))
+    cursor = sidecar.execute(
+        "SELECT type, name, timestamp, "
+        "CASE WHEN typeof(value) IN ('integer', 'real') THEN value END, rowid "
+        f"FROM src.{source_table} "
+        f"WHERE rowid > ? AND rowid <= ? AND type IN ({placeholders})",
+        [after_rowid, up_to_rowid] + ROLLUP_TYPES,
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return [], {}
+
+    types, names, timestamps, numbers, rowids = zip(*rows)
+    metric_keys = sorted(set(zip(types, names)))
+    key_indexes = {metric_key: index for index, metric_key in enumerate(metric_keys)}
+
+    timestamps = np.array(timestamps, dtype=np.float64)
+    numbers = np.array(numbers, dtype=np.float64)  # None is NaN
+    rowids = np.array(rowids, dtype=np.int64)
+    columns = {
+        "key": np.array([key_indexes[key] for key in zip(types, names)]),
+        "bucket": (timestamps // ROLLUP_WIDTHS[0]).astype(np.int64),
+        "count": np.ones(len(rows), dtype=np.int64),
+        "value_count": (~np.isnan(numbers)).astype(np.int64),
+        "total": np.nan_to_num(numbers),
+        "minimum": numbers,
+        "minimum_timestamp": timestamps,
+        "maximum": numbers,
+        "maximum_timestamp": timestamps,
+        "first_timestamp": timestamps,
+        "last_timestamp": timestamps,
+        "first_rowid": rowids,
+        "last_rowid": rowids,
+    }
+
+    return metric_keys, columns
+
+
+def _roll_up_all_widths(metric_keys, columns):
+    """Rows of the rollup table for each of `ROLLUP_WIDTHS`, in its order."""
+    rows = []
+    source_width = ROLLUP_WIDTHS[0]
+    for width in ROLLUP_WIDTHS:
+        if not metric_keys:
+            break
+
+        columns = _roll_up(columns, columns["bucket"] * source_width // width)
+        source_width = width
+
+        types = [metric_keys[key][0] for key in columns["key"].tolist()]
+        names = [metric_keys[key][1] for key in columns["key"].tolist()]
+        rows.extend(
+            zip(
+                [width] * len(types),
+                types,
+                names,
+                columns["bucket"].tolist(),
+                *(columns[column].tolist() for column in ROLLUP_VALUE_COLUMNS),
+            )
+        )
+
+    return rows
+
+
+def _roll_up(columns, buckets):
+    """
+    `columns` of rollup rows summed into the `buckets`, also the keys of the
+    rows in the result are sorted like the primary key.
+    """
+    keys = columns["key"]
+    order = np.lexsort((buckets, keys))
+    keys = keys[order]
+    buckets = buckets[order]
+    columns = {column: values[order] for column, values in columns.items()}
+
+    is_first = np.ones(len(keys), dtype=bool)
+    is_first[1:] = (keys[1:] != keys[:-1]) | (buckets[1:] != buckets[:-1])
+    starts = np.flatnonzero(is_first)
+    groups = np.cumsum(is_first) - 1
+
+    # the rows ordered by the value within each bucket, NaN go last
+    by_minimum = np.lexsort((columns["minimum"], groups))[starts]
+    by_maximum = np.lexsort((-columns["maximum"], groups))[starts]
+
+    return {
+        "key": keys[starts],
+        "bucket": buckets[starts],
+        "count": np.add.reduceat(columns["count"], starts),
+        "value_count": np.add.reduceat(columns["value_count"], starts),
+        "total": np.add.reduceat(columns["total"], starts),
+        "minimum": columns["minimum"][by_minimum],
+        "minimum_timestamp": columns["minimum_timestamp"][by_minimum],
+        "maximum": columns["maximum"][by_maximum],
+        "maximum_timestamp": columns["maximum_timestamp"][by_maximum],
+        "first_timestamp": np.minimum.reduceat(columns["first_timestamp"], starts),
+        "last_timestamp": np.maximum.reduceat(columns["last_timestamp"], starts),
+        "first_rowid": np.minimum.reduceat(columns["first_rowid"], starts),
+        "last_rowid": np.maximum.reduceat(columns["last_rowid"], starts),
+    }
+
+
+def _merge_rollups(sidecar, table_name, columns, rows):
+    def choose(condition, column):
+        return f"CASE WHEN {condition} THEN excluded.{column} ELSE {column} END"
+
+    new_minimum = "minimum IS NULL OR excluded.minimum < minimum"
+    new_maximum = "maximum IS NULL OR excluded.maximum > maximum"
+    updates = {
+        "count": "count + excluded.count",
+        "value_count": "value_count + excluded.value_count",
+        "total": "total + excluded.total",
+        "minimum": choose(new_minimum, "minimum"),
+        "minimum_timestamp": choose(new_minimum, "minimum_timestamp"),
+        "maximum": choose(new_maximum, "maximum"),
+        "maximum_timestamp": choose(new_maximum, "maximum_timestamp"),
+        "first_timestamp": "min(first_timestamp, excluded.first_timestamp)",
+        "last_timestamp": "max(last_timestamp, excluded.last_timestamp)",
+        "first_rowid": "min(first_rowid, excluded.first_rowid)",
+        "last_rowid": "max(last_rowid, excluded.last_rowid)",
+    }
+    assignments = ", ".join(f"{column} = {updates[column]}" for column in updates)
+
+    sidecar.executemany(
+        f"INSERT INTO main.{table_name} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT ({', '.join(PRIMARY_KEYS[table_name])}) "
+        f"DO UPDATE SET {assignments}",
+        rows,
+    )
@@ -0,0 +1,71 @@
+import re
+import html
+
+from db import database_path
+
+from sidecar import has_sidecar
+from sidecar import attach_sidecar
+from sidecar import update_search_index
+
+
+SEARCH_SCHEMA = "search"
+
+# what FTS5's default `unicode61` tokenizer considers to be a part of a word
+_word_re = re.compile(r"\w+")
+
+
+def attach_search_index(db):
+    """
+    Build (or update) the full-text index of the result file opened as `db`
+    and attach it as `search`. The first call on a big file may take a while,
+    the following ones only index the rows added since.
+    """
+    sqlite_path = database_path(db)
+    sidecar_path = update_search_index(sqlite_path)
+
+    if not has_sidecar(db, SEARCH_SCHEMA):
+        attach_sidecar(db, sidecar_path, SEARCH_SCHEMA)
+
+
+def search_terms(text):
+    return _word_re.findall(text)
+
+
+def fts_query(terms):
+    """
+    FTS5 query matching records with all the `terms`, the last one as a prefix
+    (so it works while typing). Each term is quoted, so user input can't be
+    a syntax error.
+    """
+    if not terms:
+        return None
+
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+    quoted[-1] += "*"
+
+    return " ".join(quoted)
+
+
+def highlight(text, terms):
+    """HTML-escaped `text`, with the words starting with the `terms` marked."""
+    if text is None:
+        return ""
+
+    text = str(text)
+    if not terms:
+        return html.escape(text)
+
+    pattern = re.compile(
+        r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*",
+        re.IGNORECASE,
+    )
+
+    parts = []
+    position = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[position : match.start()]))
+        parts.append(f'<mark class="bg-yellow-200">{html.escape(match[0])}</mark>')
+        position = match.end()
+    parts.append(html.escape(text[position:]))
+
+    return "".join(parts)
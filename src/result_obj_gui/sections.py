@@ -0,0 +1,200 @@
+import justpy as jp
+
+
+def _create_section(div_content, name):
+    section_id = name.replace(" ", "-")
+    section = jp.Section(
+        a=div_content,
+        id=section_id,
+        classes="overflow-hidden rounded-lg shadow-md bg-white hover:shadow-xl transition-shadow duration-300 ease-in-out p-4 mt-4",
+    )
+    section.add(jp.H3(classes="text-2xl font-semibold pb-3", text=name))
+
+    return section
+
+
+observe_lazy_sections_js = """
+(function () {
+    var observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                entry.target.click();  // handled by `_load_lazy_section()`
+            }
+        });
+    }, {rootMargin: '200px'});
+
+    function observeNewPlaceholders() {
+        document.querySelectorAll('.lazy-section:not([data-observed])').forEach(
+            function (placeholder) {
+                placeholder.setAttribute('data-observed', 'true');
+                observer.observe(placeholder);
+            }
+        );
+    }
+
+    // justpy re-renders the page after each update
+    new MutationObserver(observeNewPlaceholders).observe(
+        document.body, {childList: true, subtree: true}
+    );
+    observeNewPlaceholders();
+})();
+"""
+
+
+async def observe_lazy_sections(self, msg):
+    jp.run_task(self.run_javascript(observe_lazy_sections_js, send=False))
+
+
+def _create_lazy_section(
+    div_content, name, fill_section, read_section=None, read_arguments=()
+):
+    """
+    Create section with just a placeholder in it. The content is built when
+    the placeholder is scrolled into view, or when the section is clicked in
+    the navigation.
+
+    With `read_section(db, *read_arguments)`, its data is read first, by a
+    worker of the page (see `db.database_workers()`), and
+    `fill_section(section, data)` builds the content on the event loop.
+    Without it, `fill_section(section)` does both. To be run by a worker
+    process, `read_section`, its arguments and its result must be picklable.
+    """
+    section = _create_section(div_content, name)
+    section.fill_section = fill_section
+    section.read_section = read_section
+    section.read_arguments = read_arguments
+    section.loaded = False
+
+    placeholder = jp.Div(
+        a=section,
+        text="Loading…",
+        classes="lazy-section p-4 text-gray-500 cursor-pointer",
+    )
+    placeholder.section = section
+    placeholder.on("click", _on_placeholder_click)
+    section.placeholder = placeholder
+
+    return section
+
+
+async def _on_placeholder_click(self, msg):
+    await _load_lazy_section_async(self.section, msg.page)
+
+
+def _load_lazy_section(section, db=None):
+    """Build the section right away, its data are read with `db`."""
+    if getattr(section, "loaded", True):
+        return
+
+    section.loaded = True
+    if section.read_section is None:
+        _fill_lazy_section(section)
+    else:
+        data = section.read_section(db, *section.read_arguments)
+        _fill_lazy_section(section, data)
+
+
+async def _load_lazy_section_async(section, wp):
+    """
+    Read the data of the section by a worker of the page `wp`, so more
+    sections may be loaded at once and the other pages stay responsive.
+    """
+    if getattr(section, "loaded", True):
+        return
+    if section.read_section is None or getattr(wp, "db_workers", None) is None:
+        _load_lazy_section(section, getattr(wp, "db", None))
+        _on_section_loaded(wp)
+        return
+
+    section.loaded = True
+    placeholder = section.placeholder
+    placeholder.text = f"Reading {section.components[0].text.lower()}…"
+    placeholder.classes += " animate-pulse"
+    await wp.update()
+
+    try:
+        data = await wp.db_workers.run(section.read_section, *section.read_arguments)
+    except Exception as e:
+        # e.g. a locked file or a crashed worker, clicking the placeholder retries
+        placeholder.text = f"Can't read the data: {e}"
+        placeholder.classes = placeholder.classes.replace(" animate-pulse", "")
+        section.loaded = False
+        return
+
+    _fill_lazy_section(section, data)
+    _on_section_loaded(wp)
+
+
+def _on_section_loaded(wp):
+    # e.g. `server.ReportCache` measuring the page again
+    on_section_loaded = getattr(wp, "on_section_loaded", None)
+    if on_section_loaded is not None:
+        on_section_loaded()
+
+
+def _fill_lazy_section(section, *data):
+    section.remove_component(section.placeholder)
+    section.fill_section(section, *data)
+
+
+def load_all_lazy_sections(component, db=None, workers=None):
+    """
+    Build all the lazy sections in `component`. With `workers` (see
+    `db.database_workers()`), the data of all of them are read at once and the
+    sections are filled in order as they come.
+    """
+    sections = list(_lazy_sections(component))
+    if workers is None:
+        for section in sections:
+            _load_lazy_section(section, db)
+        return
+
+    reads = [
+        workers.submit(section.read_section, *section.read_arguments)
+        if section.read_section
+        else None
+        for section in sections
+    ]
+    for section, read in zip(sections, reads):
+        if read is None:
+            _load_lazy_section(section, db)
+        elif not section.loaded:
+            section.loaded = True
+            _fill_lazy_section(section, read.result())
+
+
+def _lazy_sections(component):
+    if hasattr(component, "fill_section"):
+        yield component
+
+    for child in list(getattr(component, "components", [])):
+        yield from _lazy_sections(child)
+
+
+def _add_navigation(items):
+    div = jp.Div()
+    div_ul_container = jp.Div(
+        a=div,
+        classes="sticky top-0 mt-20 w-32 pl-3 pt-2 ml-2 text-sm rounded-lg shadow-md bg-white",
+    )
+
+    ul = jp.Ul(a=div_ul_container, classes="nav")
+
+    for section in items:
+        if not section:
+            continue
+
+        link = "#" + section.id
+        name = section.components[0].text
+
+        li = jp.Li(a=ul, classes="py-1")
+        a = jp.A(a=li, classes="nav-link", href=link, text=name)  # , scroll=True
+        a.section = section
+        a.on("click", _on_navigation_click)
+
+    return div
+
+
+async def _on_navigation_click(self, msg):
+    await _load_lazy_section_async(self.section, msg.page)
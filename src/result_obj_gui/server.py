@@ -0,0 +1,217 @@
+import os
+import os.path
+import json
+import html
+from urllib.parse import quote
+from collections import OrderedDict
+from functools import partial
+
+import justpy as jp
+import numpy as np
+
+from utils import str_from_ts
+from utils import bytes_to_readable_str
+
+
+RESULT_FILE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+class ReportCache:
+    """
+    LRU cache of built report pages, together with their open connections.
+
+    Entries are dropped when the file changed since the page was built, and the
+    least recently used ones when there is more than `max_pages` of them, or
+    when their estimated size exceeds `max_bytes`. The size of a page is
+    estimated again when one of its lazy sections is built, since it grows with
+    them.
+    """
+
+    def __init__(self, build_report, max_pages=32, max_bytes=512 * 1024 * 1024):
+        self.build_report = build_report
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+
+        self.total_bytes = 0
+        self.entries = OrderedDict()  # path -> (mtime_ns, size, page_bytes, wp)
+
+    def get(self, sqlite_path):
+        sqlite_path = os.path.abspath(sqlite_path)
+        stat = os.stat(sqlite_path)
+
+        entry = self.entries.get(sqlite_path)
+        if entry:
+            mtime_ns, size, _, wp = entry
+            if (mtime_ns, size) == (stat.st_mtime_ns, stat.st_size):
+                self.entries.move_to_end(sqlite_path)
+                return wp
+
+            self.evict(sqlite_path)
+
+        wp = self.build_report(sqlite_path)
+        wp.on_section_loaded = partial(self.update_size, sqlite_path, wp)
+        page_bytes = _estimate_page_size(wp)
+
+        self.entries[sqlite_path] = (stat.st_mtime_ns, stat.st_size, page_bytes, wp)
+        self.total_bytes += page_bytes
+        self._shrink()
+
+        return wp
+
+    def update_size(self, sqlite_path, wp):
+        entry = self.entries.get(sqlite_path)
+        if entry is None or entry[3] is not wp:
+            return  # evicted already
+
+        mtime_ns, size, page_bytes, _ = entry
+        new_page_bytes = _estimate_page_size(wp)
+        self.entries[sqlite_path] = (mtime_ns, size, new_page_bytes, wp)
+        self.total_bytes += new_page_bytes - page_bytes
+
+        # in use, so the others go first
+        self.entries.move_to_end(sqlite_path)
+        self._shrink()
+
+    def evict(self, sqlite_path):
+        _, _, page_bytes, wp = self.entries.pop(sqlite_path)
+        self.total_bytes -= page_bytes
+
+        db_workers = getattr(wp, "db_workers", None)
+        if db_workers is not None:
+            db_workers.close()
+
+        db = getattr(wp, "db", None)
+        if db is not None:
+            db.close()
+
+        wp.delete_components()
+        wp.remove_page()
+
+    def _shrink(self):
+        # always keep the newest one, even if it alone is over the limit
+        while len(self.entries) > 1 and (
+            len(self.entries) > self.max_pages or self.total_bytes > self.max_bytes
+        ):
+            oldest_path = next(iter(self.entries))
+            self.evict(oldest_path)
+
+
+def _estimate_page_size(wp):
+    # size of what justpy sends to the browser, which is what the page holds,
+    # and of the arrays the components keep besides, e.g. for zooming charts
+    page_bytes = len(json.dumps(wp.build_list(), default=str))
+
+    return page_bytes + _arrays_size(wp)
+
+
+def _arrays_size(component):
+    size = sum(
+        value.nbytes
+        for value in vars(component).values()
+        if isinstance(value, np.ndarray)
+    )
+    for child in getattr(component, "components", []):
+        size += _arrays_size(child)
+
+    return size
+
+
+def serve_directory(directory, build_report, max_pages=32, max_bytes=512 * 1024**2):
+    directory = os.path.abspath(directory)
+    cache = ReportCache(build_report, max_pages=max_pages, max_bytes=max_bytes)
+
+    def report_page(request):
+        relative_path = request.path_params["path"]
+        sqlite_path = _resolve_result_path(directory, relative_path)
+        if sqlite_path is None:
+            return _message_page(f"No result file `{relative_path}`.")
+
+        return cache.get(sqlite_path)
+
+    def listing_page(request):
+        return _listing_page(directory, cache)
+
+    jp.Route("/report/{path:path}", report_page)
+    jp.justpy(listing_page)
+
+
+def list_result_files(directory):
+    result_files = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            if file_name.endswith(RESULT_FILE_SUFFIXES):
+                result_files.append(os.path.join(root, file_name))
+
+    return result_files
+
+
+def _resolve_result_path(directory, relative_path):
+    sqlite_path = os.path.abspath(os.path.join(directory, relative_path))
+
+    # don't let `..` in the URL out of the served directory
+    if os.path.commonpath([directory, sqlite_path]) != directory:
+        return None
+    if not sqlite_path.endswith(RESULT_FILE_SUFFIXES):
+        return None
+    if not os.path.isfile(sqlite_path):
+        return None
+
+    return sqlite_path
+
+
+def _listing_page(directory, cache):
+    wp = jp.WebPage()
+    div = jp.Div(a=wp, classes="md:container md:mx-auto p-3")
+
+    h1 = jp.H1(a=div, classes="text-2xl pt-4 pb-3 text-center")
+    h1.add(jp.Code(text="result_obj"))
+    h1.add(jp.Span(text=" reports"))
+    jp.P(a=div, inner_html=f"<code>{html.escape(directory)}</code>")
+
+    table_options = {
+        "defaultColDef": {
+            "filter": True,
+            "sortable": True,
+            "resizable": True,
+            "headerClass": "font-bold",
+        },
+        "columnDefs": [
+            {"headerName": "File", "field": "file", "minWidth": 600},
+            {"headerName": "Modified", "field": "modified"},
+            {"headerName": "Size", "field": "size"},
+            {"headerName": "Cached", "field": "cached"},
+        ],
+        "rowData": [],
+    }
+    table = jp.AgGrid(
+        a=div, options=table_options, style="height: 80vh; margin: 0.25em"
+    )
+    table.html_columns = [0]
+
+    for sqlite_path in list_result_files(directory):
+        relative_path = os.path.relpath(sqlite_path, directory)
+        stat = os.stat(sqlite_path)
+        link = (
+            f'<a class="text-blue-700" href="/report/{quote(relative_path)}">'
+            f"{html.escape(relative_path)}</a>"
+        )
+        table.options.rowData.append(
+            {
+                "file": link,
+                "modified": str_from_ts(stat.st_mtime),
+                "size": bytes_to_readable_str(stat.st_size),
+                "cached": "yes" if sqlite_path in cache.entries else "",
+            }
+        )
+
+    return wp
+
+
+def _message_page(message):
+    wp = jp.WebPage()
+    div = jp.Div(a=wp, classes="md:container md:mx-auto p-3")
+    jp.P(a=div, text=message, classes="text-xl pt-4")
+    jp.A(a=div, href="/", text="Back to the list of reports.", classes="text-blue-700")
+
+    return wp
@@ -0,0 +1,359 @@
+import os
+import os.path
+import sqlite3
+import hashlib
+from urllib.parse import quote
+
+
+SIDECAR_VERSION = 1
+SIDECAR_DIR = os.path.join(os.path.expanduser("~"), ".cache", "result_obj_gui")
+
+# SQLite can't index a table from a different (attached) database, so the
+# sidecar keeps the indexed columns in WITHOUT ROWID tables, which are b-trees
+# ordered by the primary key - covering indexes pointing to the rowid of the
+# original row.
+#
+# (sidecar table, source table, indexed columns)
+INDEXED_TABLES = [
+    ("MetricsByName", "Metrics", ["name", "type", "timestamp", "value"]),
+    ("LogsByCreated", "Logs", ["created"]),
+    ("StatusHistoryByTimestamp", "StatusHistory", ["timestamp"]),
+    ("MetadataByTimestamp", "Metadata", ["timestamp"]),
+]
+# the ones ordered by time, which `update_time_index()` updates alone
+TIME_INDEXED_TABLES = ["LogsByCreated", "StatusHistoryByTimestamp"]
+# Full-text indexes, created only when the search is used for the first time.
+# They are contentless FTS5 tables, with the rowid of the original row.
+#
+# (sidecar table, source table, indexed columns)
+SEARCH_TABLES = [
+    ("LogsSearch", "Logs", ["msg", "pathname", "funcName"]),
+    ("StatusHistorySearch", "StatusHistory", ["status"]),
+]
+# Rollups of the metrics, created when the Metrics section is opened for the
+# first time: count, sum, minimum and maximum of the numeric values (with the
+# time they were reached) in buckets of each of `ROLLUP_WIDTHS` seconds, so the
+# charts don't have to read all the rows again. Each width is a multiple of the
+# previous one, the buckets of a width are summed from the narrower ones.
+# Summing them up in numpy is several times faster than GROUP BY the names.
+#
+# (sidecar table, source table, columns)
+ROLLUP_TABLES = [
+    (
+        "MetricsRollup",
+        "Metrics",
+        [
+            "width",
+            "type",
+            "name",
+            "bucket",
+            "count",
+            "value_count",
+            "total",
+            "minimum",
+            "minimum_timestamp",
+            "maximum",
+            "maximum_timestamp",
+            "first_timestamp",
+            "last_timestamp",
+            "first_rowid",
+            "last_rowid",
+        ],
+    ),
+]
+# Activity of the processes and threads which logged: the number of the log
+# records of each thread in buckets of `width` seconds, with the time of the
+# first and the last one. Created when the Activity section is opened for the
+# first time, in buckets of a single width, which grows with the duration of
+# the run, see activity.py.
+#
+# (sidecar table, source table, columns)
+ACTIVITY_TABLES = [
+    (
+        "LogsActivity",
+        "Logs",
+        [
+            "width",
+            "process",
+            "thread",
+            "bucket",
+            "count",
+            "first_created",
+            "last_created",
+            "process_name",
+            "thread_name",
+        ],
+    ),
+]
+PRIMARY_KEYS = {
+    "MetricsByName": ["name", "type", "timestamp", "source_rowid"],
+    "LogsByCreated": ["created", "source_rowid"],
+    "StatusHistoryByTimestamp": ["timestamp", "source_rowid"],
+    "MetadataByTimestamp": ["timestamp", "source_rowid"],
+    "MetricsRollup": ["width", "type", "name", "bucket"],
+    "LogsActivity": ["width", "process", "thread", "bucket"],
+}
+
+
+def read_only_uri(sqlite_path):
+    return "file:" + quote(os.path.abspath(sqlite_path)) + "?mode=ro"
+
+
+def sidecar_path_for(sqlite_path, sidecar_dir=SIDECAR_DIR):
+    abs_path = os.path.abspath(sqlite_path)
+    digest = hashlib.sha1(abs_path.encode("utf-8")).hexdigest()[:16]
+
+    return os.path.join(sidecar_dir, f"{os.path.basename(abs_path)}.{digest}.sqlite")
+
+
+def update_sidecar(sqlite_path, sidecar_dir=SIDECAR_DIR):
+    """
+    Create the sidecar database for `sqlite_path`, or extend the existing one
+    with the rows appended since the last time. The result file itself is only
+    ever opened read-only.
+
+    Returns path to the sidecar.
+    """
+
+    def update(sidecar):
+        for table_name, source_table, columns in INDEXED_TABLES:
+            _update_sidecar_table(sidecar, table_name, source_table, columns)
+        _update_search_tables(sidecar)
+
+    # the search tables only once `update_search_index()` created them
+    return _update_sidecar_file(
+        sqlite_path, sidecar_dir, update, INDEXED_TABLES, SEARCH_TABLES
+    )
+
+
+def update_search_index(sqlite_path, sidecar_dir=SIDECAR_DIR):
+    """Index the logs and the status messages for the full-text search."""
+
+    def update(sidecar):
+        _create_search_tables(sidecar)
+        _update_search_tables(sidecar)
+
+    return _update_sidecar_file(sqlite_path, sidecar_dir, update, SEARCH_TABLES)
+
+
+def update_time_index(sqlite_path, sidecar_dir=SIDECAR_DIR):
+    """Index only the `TIME_INDEXED_TABLES` by time, not the metrics."""
+
+    time_indexed_tables = [
+        table for table in INDEXED_TABLES if table[0] in TIME_INDEXED_TABLES
+    ]
+
+    def update(sidecar):
+        for table_name, source_table, columns in time_indexed_tables:
+            _update_sidecar_table(sidecar, table_name, source_table, columns)
+
+    return _update_sidecar_file(sqlite_path, sidecar_dir, update, time_indexed_tables)
+
+
+def update_sidecar_tables(sqlite_path, tables, fill, sidecar_dir=SIDECAR_DIR):
+    """
+    Create the sidecar `tables` when they don't exist yet and `fill(sidecar)`
+    them, with the result file attached as `src`. Without new rows for any of
+    the `tables` (their high-water marks, `"<table>.rowid"` in Meta, are at the
+    end of the source tables), `fill` isn't called. Returns path to the sidecar.
+    """
+
+    def update(sidecar):
+        _create_tables(sidecar, tables)
+        fill(sidecar)
+
+    return _update_sidecar_file(sqlite_path, sidecar_dir, update, tables)
+
+
+def _update_sidecar_file(
+    sqlite_path, sidecar_dir, update, tables=(), optional_tables=()
+):
+    """
+    `update(sidecar)` in a write transaction, skipped when the sidecar has all
+    the rows of the `tables`, and of the `optional_tables` which exist, already.
+    """
+    os.makedirs(sidecar_dir, exist_ok=True)
+    sidecar_path = sidecar_path_for(sqlite_path, sidecar_dir)
+
+    sidecar = sqlite3.connect(sidecar_path, uri=True)
+    try:
+        sidecar.execute("ATTACH DATABASE ? AS src", (read_only_uri(sqlite_path),))
+        if not tables or not _is_up_to_date(sidecar, tables, optional_tables):
+            with sidecar:
+                _create_sidecar_tables(sidecar)
+                if not _is_sidecar_valid(sidecar):
+                    _clear_sidecar(sidecar)
+                    set_meta(sidecar, "version", SIDECAR_VERSION)
+                    set_meta(sidecar, "source_path", os.path.abspath(sqlite_path))
+                    set_meta(sidecar, "source_start", _read_source_start(sidecar))
+
+                update(sidecar)
+        sidecar.execute("DETACH DATABASE src")
+    finally:
+        sidecar.close()
+
+    return sidecar_path
+
+
+def attach_sidecar(db, sidecar_path, schema_name="idx"):
+    db.execute(f"ATTACH DATABASE ? AS {schema_name}", (read_only_uri(sidecar_path),))
+
+
+def has_sidecar(db, schema_name="idx"):
+    return any(row[1] == schema_name for row in db.execute("PRAGMA database_list"))
+
+
+def _create_sidecar_tables(sidecar):
+    sidecar.execute(
+        "CREATE TABLE IF NOT EXISTS main.Meta (key TEXT PRIMARY KEY, value)"
+    )
+    for table_name, _, columns in INDEXED_TABLES:
+        all_columns = ", ".join(columns + ["source_rowid"])
+        primary_key = ", ".join(PRIMARY_KEYS[table_name])
+        sidecar.execute(
+            f"CREATE TABLE IF NOT EXISTS main.{table_name} "
+            f"({all_columns}, PRIMARY KEY ({primary_key})) WITHOUT ROWID"
+        )
+
+
+def _is_up_to_date(sidecar, tables, optional_tables):
+    if not _table_exists(sidecar, "Meta") or not _is_sidecar_valid(sidecar):
+        return False
+
+    existing_tables = [
+        table for table in optional_tables if _table_exists(sidecar, table[0])
+    ]
+    for table_name, source_table, _ in list(tables) + existing_tables:
+        if not _table_exists(sidecar, table_name):
+            return False
+
+        high_water_mark = get_meta(sidecar, f"{table_name}.rowid") or 0
+        max_rowid = sidecar.execute(f"SELECT max(rowid) FROM src.{source_table}")
+        if (max_rowid.fetchone()[0] or 0) != high_water_mark:
+            return False
+
+    return True
+
+
+def _is_sidecar_valid(sidecar):
+    if get_meta(sidecar, "version") != SIDECAR_VERSION:
+        return False
+
+    # the file was replaced by a different run, or truncated (the start is
+    # written with the version, None when the run hadn't stored it yet)
+    if get_meta(sidecar, "source_start") != _read_source_start(sidecar):
+        return False
+
+    checked_tables = INDEXED_TABLES + SEARCH_TABLES + ROLLUP_TABLES + ACTIVITY_TABLES
+    for table_name, source_table, _ in checked_tables:
+        high_water_mark = get_meta(sidecar, f"{table_name}.rowid")
+        if high_water_mark is None:
+            continue
+
+        max_rowid = sidecar.execute(f"SELECT max(rowid) FROM src.{source_table}")
+        if (max_rowid.fetchone()[0] or 0) < high_water_mark:
+            return False
+
+    return True
+
+
+def _clear_sidecar(sidecar):
+    sidecar.execute("DELETE FROM main.Meta")
+    for table_name, _, _ in INDEXED_TABLES:
+        sidecar.execute(f"DELETE FROM main.{table_name}")
+
+    for table_name, _, _ in ROLLUP_TABLES + ACTIVITY_TABLES:
+        if _table_exists(sidecar, table_name):
+            sidecar.execute(f"DELETE FROM main.{table_name}")
+
+    # contentless FTS5 tables can't be DELETEd from
+    for table_name, _, _ in SEARCH_TABLES:
+        if _table_exists(sidecar, table_name):
+            sidecar.execute(
+                f"INSERT INTO main.{table_name} ({table_name}) VALUES ('delete-all')"
+            )
+
+
+def _create_search_tables(sidecar):
+    for table_name, _, columns in SEARCH_TABLES:
+        sidecar.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS main.{table_name} "
+            f"USING fts5({', '.join(columns)}, content='')"
+        )
+
+
+def _update_search_tables(sidecar):
+    for table_name, source_table, columns in SEARCH_TABLES:
+        if not _table_exists(sidecar, table_name):
+            continue
+
+        high_water_mark = get_meta(sidecar, f"{table_name}.rowid") or 0
+        max_rowid = sidecar.execute(f"SELECT max(rowid) FROM src.{source_table}")
+        max_rowid = max_rowid.fetchone()[0] or 0
+        if max_rowid <= high_water_mark:
+            continue
+
+        column_list = ", ".join(columns)
+        sidecar.execute(
+            f"INSERT INTO main.{table_name} (rowid, {column_list}) "
+            f"SELECT rowid, {column_list} FROM src.{source_table} "
+            "WHERE rowid > ? AND rowid <= ?",
+            (high_water_mark, max_rowid),
+        )
+        set_meta(sidecar, f"{table_name}.rowid", max_rowid)
+
+
+def _create_tables(sidecar, tables):
+    for table_name, _, columns in tables:
+        primary_key = ", ".join(PRIMARY_KEYS[table_name])
+        sidecar.execute(
+            f"CREATE TABLE IF NOT EXISTS main.{table_name} "
+            f"({', '.join(columns)}, PRIMARY KEY ({primary_key})) WITHOUT ROWID"
+        )
+
+
+def _table_exists(sidecar, table_name):
+    cursor = sidecar.execute(
+        "SELECT 1 FROM main.sqlite_master WHERE name = ?", (table_name,)
+    )
+
+    return cursor.fetchone() is not None
+
+
+def _update_sidecar_table(sidecar, table_name, source_table, columns):
+    high_water_mark = get_meta(sidecar, f"{table_name}.rowid") or 0
+    max_rowid = sidecar.execute(f"SELECT max(rowid) FROM src.{source_table}")
+    max_rowid = max_rowid.fetchone()[0] or 0
+
+    if max_rowid <= high_water_mark:
+        return
+
+    column_list = ", ".join(columns)
+    sidecar.execute(
+        f"INSERT OR IGNORE INTO main.{table_name} ({column_list}, source_rowid) "
+        f"SELECT {column_list}, rowid FROM src.{source_table} "
+        "WHERE rowid > ? AND rowid <= ?",
+        (high_water_mark, max_rowid),
+    )
+    set_meta(sidecar, f"{table_name}.rowid", max_rowid)
+
+
+def _read_source_start(sidecar):
+    cursor = sidecar.execute(
+        "SELECT timestamp FROM src.Metadata ORDER BY rowid LIMIT 1"
+    )
+    row = cursor.fetchone()
+
+    return row[0] if row else None
+
+
+def get_meta(sidecar, key):
+    row = sidecar.execute("SELECT value FROM main.Meta WHERE key=?", (key,)).fetchone()
+
+    return row[0] if row else None
+
+
+def set_meta(sidecar, key, value):
+    sidecar.execute(
+        "INSERT OR REPLACE INTO main.Meta (key, value) VALUES (?, ?)", (key, value)
+    )
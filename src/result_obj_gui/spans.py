@@ -0,0 +1,155 @@
+import numpy as np
+
+
+PERCENTILES = [50, 90, 99]
+DURATION_HISTOGRAM_BINS = 40
+
+
+class Spans:
+    """
+    Start/stop events of one metric paired into spans.
+
+    Events carry no id, so a stop closes the oldest start which is still open,
+    like the requests of a queue served in order. Spans of concurrent workers
+    which overlap are paired right when they finish in the order they started;
+    when they don't, the durations get swapped between them, but their
+    distribution and the concurrency stay the same.
+    """
+
+    __slots__ = (
+        "starts",
+        "stops",
+        "durations",
+        "unclosed",
+        "unmatched_stops",
+        "event_timestamps",
+        "in_flight",
+    )
+
+    def __init__(self, timestamps, is_start):
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        is_start = np.asarray(is_start, dtype=bool)
+
+        # a stop without any open start is dropped, it would take the depth
+        # below zero
+        steps = np.where(is_start, 1, -1)
+        depth = np.cumsum(steps)
+        lowest = np.minimum.accumulate(np.minimum(depth, 0))
+        is_unmatched = ~is_start & (depth < np.concatenate(([0], lowest[:-1])))
+        self.unmatched_stops = int(np.count_nonzero(is_unmatched))
+
+        timestamps = timestamps[~is_unmatched]
+        is_start = is_start[~is_unmatched]
+        depth = np.cumsum(np.where(is_start, 1, -1))
+
+        # with the depth never below zero, the n-th stop comes after the n-th
+        # start
+        start_indexes = np.flatnonzero(is_start)
+        stop_indexes = np.flatnonzero(~is_start)
+        pair_starts = start_indexes[: len(stop_indexes)]
+
+        self.starts = timestamps[pair_starts]
+        self.stops = timestamps[stop_indexes]
+        self.durations = self.stops - self.starts
+        self.unclosed = int(np.count_nonzero(is_start)) - len(self.starts)
+
+        # spans open right after each event
+        self.event_timestamps = timestamps
+        self.in_flight = depth
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def duration_stats(durations):
+    """Count, mean, percentiles, max and total of the `durations` as a dict."""
+    stats = {"count": len(durations)}
+    if not len(durations):
+        return stats
+
+    values = np.percentile(durations, PERCENTILES)
+    stats.update(
+        (f"p{percentile}", float(value))
+        for percentile, value in zip(PERCENTILES, values)
+    )
+    stats["mean"] = float(durations.mean())
+    stats["max"] = float(durations.max())
+    stats["total"] = float(durations.sum())
+
+    return stats
+
+
+def duration_histogram(durations, bins=DURATION_HISTOGRAM_BINS):
+    """
+    Counts of the `durations` in logarithmic bins, which show both the fast
+    majority and the slow tail. Returns `(bin edges, counts)`.
+    """
+    positive = durations[durations > 0]
+    if not len(positive):
+        return np.array([0.0, 0.0]), np.array([len(durations)])
+
+    low, high = positive.min(), positive.max()
+    if low == high:
+        high = low * 2
+    edges = np.geomspace(low, high, bins + 1)
+
+    counts, _ = np.histogram(np.clip(durations, low, high), edges)
+
+    return edges, counts
+
+
+def spans_over_time(spans, width):
+    """
+    Spans grouped into buckets of `width` seconds by their start. Returns the
+    bucket starts and, for each bucket, the count, the median and the maximum
+    duration.
+    """
+    if not len(spans):
+        empty = np.array([])
+        return empty, empty, empty, empty
+
+    first = spans.starts[0] - spans.starts[0] % width
+    buckets = ((spans.starts - first) // width).astype(np.int64)
+
+    # sorted by bucket and duration, the median is in the middle of each run
+    order = np.lexsort((spans.durations, buckets))
+    sorted_buckets = buckets[order]
+    sorted_durations = spans.durations[order]
+
+    used, run_starts, counts = np.unique(
+        sorted_buckets, return_index=True, return_counts=True
+    )
+    medians = sorted_durations[run_starts + (counts - 1) // 2]
+    maximums = sorted_durations[run_starts + counts - 1]
+
+    return first + used * width, counts, medians, maximums
+
+
+def in_flight_over_time(spans, width):
+    """
+    The highest number of spans open at once in each bucket of `width`
+    seconds. Returns `(bucket starts, maximums)`, including the buckets without
+    any event, which keep the concurrency of the previous one.
+    """
+    timestamps = spans.event_timestamps
+    if not len(timestamps):
+        empty = np.array([])
+        return empty, empty
+
+    first = timestamps[0] - timestamps[0] % width
+    buckets = ((timestamps - first) // width).astype(np.int64)
+    bucket_count = int(buckets[-1]) + 1
+
+    maximums = np.zeros(bucket_count, dtype=np.int64)
+    np.maximum.at(maximums, buckets, spans.in_flight)
+
+    # the spans open at the end of the previous bucket are open in this one too
+    has_events = np.zeros(bucket_count, dtype=bool)
+    has_events[buckets] = True
+    last_event = np.full(bucket_count, -1, dtype=np.int64)
+    last_event[buckets] = np.arange(len(timestamps))
+    last_event = np.maximum.accumulate(last_event)
+    carried = np.concatenate(([0], spans.in_flight[last_event[:-1]]))
+    maximums = np.where(has_events, np.maximum(maximums, carried), carried)
+
+    return first + np.arange(bucket_count) * width, maximums
@@ -1,7 +1,9 @@
 from datetime import datetime
 from datetime import timezone
 
-import justpy as jp
+# The functions formatting whole columns import numpy themselves, `info` and
+# `metrics` format single timestamps with this module and must start fast
+# (see `benchmark.py --imports`).
 
 LOCAL_TIMEZONE = datetime.now(timezone.utc).astimezone().tzinfo
 
@@ -30,6 +32,116 @@ def html_from_ts(ts):
     return f'<em title="{iso_str}">{short_str[:-4]}</em>'
 
 
+def _local_datetime64(timestamps):
+    """
+    Timestamps as `datetime64[us]` of the wall clock in `LOCAL_TIMEZONE`, with
+    microseconds rounded the same way `datetime.fromtimestamp()` does.
+    """
+    import numpy as np
+
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    fractions, seconds = np.modf(timestamps)
+    microseconds = np.round(fractions * 1e6).astype(np.int64)
+    microseconds += seconds.astype(np.int64) * 1_000_000
+
+    offset = LOCAL_TIMEZONE.utcoffset(None)
+    microseconds += (offset.days * 86400 + offset.seconds) * 1_000_000
+
+    return microseconds.view("datetime64[us]")
+
+
+def _utc_offset_suffix():
+    # the same as the end of `datetime.isoformat()`
+    return datetime.now(LOCAL_TIMEZONE).isoformat()[-6:]
+
+
+def strs_from_ts(timestamps):
+    """`str_from_ts()` of a whole column at once."""
+    import numpy as np
+
+    if not len(timestamps):
+        return []
+
+    local = _local_datetime64(timestamps)
+    strings = np.datetime_as_string(local.astype("datetime64[s]"), unit="s")
+
+    return np.char.replace(strings, "T", " ").tolist()
+
+
+def iso_strs_from_ts(timestamps):
+    """`iso_str_from_ts()` of a whole column at once."""
+    import numpy as np
+
+    if not len(timestamps):
+        return []
+
+    local = _local_datetime64(timestamps)
+    strings = np.datetime_as_string(local, unit="us")
+
+    # `isoformat()` leaves out zero microseconds
+    whole_seconds = local.view(np.int64) % 1_000_000 == 0
+    if whole_seconds.any():
+        strings = strings.astype(object)
+        strings[whole_seconds] = np.datetime_as_string(local[whole_seconds], unit="s")
+
+    suffix = _utc_offset_suffix()
+    return [string + suffix for string in strings.tolist()]
+
+
+def htmls_from_ts(timestamps):
+    """`html_from_ts()` of a whole column at once."""
+    import numpy as np
+
+    local = _local_datetime64(timestamps)
+    short_strings = np.datetime_as_string(local, unit="us")
+    iso_strings = iso_strs_from_ts(timestamps)
+
+    return [
+        f'<em title="{iso_str}">{short_str[:-4].replace("T", " ")}</em>'
+        for short_str, iso_str in zip(short_strings.tolist(), iso_strings)
+    ]
+
+
+# round widths of the buckets of histograms over time, in seconds
+BUCKET_WIDTHS = [
+    0.001,
+    0.01,
+    0.1,
+    1,
+    5,
+    10,
+    30,
+    60,
+    5 * 60,
+    10 * 60,
+    30 * 60,
+    3600,
+    6 * 3600,
+    12 * 3600,
+    86400,
+    7 * 86400,
+]
+
+
+def bucket_width(duration, max_buckets):
+    """The smallest round width splitting `duration` into `max_buckets` at most."""
+    for width in BUCKET_WIDTHS:
+        if duration / width <= max_buckets:
+            return width
+
+    weeks = duration / BUCKET_WIDTHS[-1] / max_buckets
+    return BUCKET_WIDTHS[-1] * (int(weeks) + 1)
+
+
+def bucket_width_str(width):
+    for unit, seconds in [("day", 86400), ("hour", 3600), ("minute", 60)]:
+        if width >= seconds and width % seconds == 0:
+            count = int(width // seconds)
+            return unit if count == 1 else f"{count} {unit}s"
+
+    return f"{width:g} s"
+
+
 def bytes_to_readable_str(size):
     for unit in ["B", "KiB", "MiB", "GiB", "TiB"]:
         if size < 1024.0:
@@ -42,17 +154,13 @@ def bytes_to_readable_str(size):
     return size
 
 
-def bytes_to_gb(size):
-    return size / 1024.0 / 1024.0 / 1024.0
+def seconds_to_readable_str(seconds):
+    for unit, unit_seconds in [("h", 3600), ("min", 60), ("s", 1), ("ms", 1e-3)]:
+        if seconds >= unit_seconds:
+            return f"{seconds / unit_seconds:.3g} {unit}"
 
+    return f"{seconds * 1e6:.3g} µs"
 
-def _create_section(div_content, name):
-    section_id = name.replace(" ", "-")
-    section = jp.Section(
-        a=div_content,
-        id=section_id,
-        classes="overflow-hidden rounded-lg shadow-md bg-white hover:shadow-xl transition-shadow duration-300 ease-in-out p-4 mt-4",
-    )
-    section.add(jp.H3(classes="text-2xl font-semibold pb-3", text=name))
 
-    return section
+def bytes_to_gb(size):
+    return size / 1024.0 / 1024.0 / 1024.0
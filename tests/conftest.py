@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the modules import each other by their names, like when result_obj_gui.py
+# is run as a script
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), os.pardir, "src", "result_obj_gui")
+)
@@ -0,0 +1,58 @@
+import numpy as np
+
+from columnar import decode_numbers
+from columnar import encode_numbers
+
+
+def _round_trip(values):
+    column = encode_numbers(values)
+    (dtype,) = column
+
+    return dtype, decode_numbers(column)
+
+
+def test_integers_as_int32():
+    values = [0, 1, -5, 2**31 - 1, -(2**31)]
+
+    dtype, decoded = _round_trip(values)
+
+    assert dtype == "i32"
+    assert decoded.tolist() == values
+
+
+def test_big_integers_as_float():
+    dtype, decoded = _round_trip([0, 2**31])
+
+    assert dtype == "f32"
+    assert decoded.tolist() == [0, 2**31]
+
+    dtype, decoded = _round_trip([1, 2**53 - 1])
+
+    assert dtype == "f64"
+    assert decoded.tolist() == [1, 2**53 - 1]
+
+
+def test_fractions_as_float32_only_when_exact():
+    dtype, decoded = _round_trip([0.5, 0.25, -1.75])
+
+    assert dtype == "f32"
+    assert decoded.tolist() == [0.5, 0.25, -1.75]
+
+    dtype, decoded = _round_trip([0.1, 1.7e9 + 0.001])
+
+    assert dtype == "f64"
+    assert decoded.tolist() == [0.1, 1.7e9 + 0.001]
+
+
+def test_nan_is_not_an_integer():
+    dtype, decoded = _round_trip([1, np.nan, 3])
+
+    assert dtype == "f32"
+    assert np.array_equal(decoded, [1, np.nan, 3], equal_nan=True)
+
+
+def test_empty():
+    dtype, decoded = _round_trip([])
+
+    assert dtype == "i32"
+    assert len(decoded) == 0
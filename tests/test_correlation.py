@@ -0,0 +1,134 @@
+import sqlite3
+from functools import partial
+
+import pytest
+
+import correlation
+from db import open_db
+from sidecar import update_time_index
+from correlation import read_around
+from correlation import read_between
+from correlation import TIME_INDEX_SCHEMA
+
+START = 1.7e9
+
+
+def _create_result_file(path, count=400):
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE Metadata (timestamp REAL, argv TEXT, pwd TEXT)")
+    db.execute("CREATE TABLE StatusHistory (timestamp REAL, status TEXT)")
+    db.execute("CREATE TABLE Metrics (timestamp REAL, name TEXT, type TEXT, value)")
+    db.execute("CREATE TABLE Logs (created REAL, levelname TEXT, name TEXT, msg TEXT)")
+    db.execute("INSERT INTO Metadata VALUES (?, 'run', '/')", (START,))
+    db.commit()
+    _append_rows(db, 0, count)
+
+    return db
+
+
+def _append_rows(db, start, count):
+    # a few out of order, and several at the same time
+    db.executemany(
+        "INSERT INTO Logs VALUES (?, 'INFO', 'app', ?)",
+        [
+            (START + i // 2 - (i % 9 == 0) * 3, f"log {i}")
+            for i in range(start, start + count)
+        ],
+    )
+    db.executemany(
+        "INSERT INTO StatusHistory VALUES (?, ?)",
+        [(START + i, f"status {i}") for i in range(start, start + count, 10)],
+    )
+    db.commit()
+
+
+@pytest.fixture(params=[True, False], ids=["indexed", "scanned"])
+def result_db(request, tmp_path, monkeypatch):
+    if request.param:
+        update = partial(update_time_index, sidecar_dir=str(tmp_path / "sidecars"))
+    else:
+        # like a cache directory that isn't writable
+        update = partial(update_time_index, sidecar_dir="/dev/null/sidecars")
+    monkeypatch.setattr(correlation, "update_time_index", update)
+
+    sqlite_path = str(tmp_path / "result.sqlite")
+    writable_db = _create_result_file(sqlite_path)
+    db = open_db(sqlite_path)
+    yield db, writable_db, request.param
+    db.close()
+    writable_db.close()
+
+
+def _ordered(db, table, time_column, columns):
+    """All the rows, as `read_around()` orders them."""
+    rows = db.execute(
+        f"SELECT rowid, {time_column}, {', '.join(columns)} FROM {table}"
+    ).fetchall()
+    rows.sort(key=lambda row: (row[1], row[0]))
+
+    return [tuple(row[1:]) for row in rows]
+
+
+def _expected(db):
+    return {
+        "status": _ordered(db, "StatusHistory", "timestamp", ["status"]),
+        "logs": _ordered(db, "Logs", "created", ["levelname", "name", "msg"]),
+    }
+
+
+def _schemas(db):
+    return {name for _, name, _ in db.execute("PRAGMA database_list")}
+
+
+def test_read_around(result_db):
+    db, _, indexed = result_db
+    timestamp = START + 100
+
+    correlated = read_around(db, timestamp, rows=7)
+
+    for key, all_rows in _expected(db).items():
+        first_after = next(
+            cnt for cnt, row in enumerate(all_rows) if row[0] >= timestamp
+        )
+        rows, marker, more = correlated[key]
+        assert rows == all_rows[first_after - 7 : first_after + 7]
+        assert marker == 7 and not more
+    assert (TIME_INDEX_SCHEMA in _schemas(db)) == indexed
+
+
+def test_read_around_the_ends(result_db):
+    db, _, _ = result_db
+    expected = _expected(db)
+
+    rows, marker, _ = read_around(db, START - 100, rows=5)["logs"]
+    assert rows == expected["logs"][:5] and marker == 0
+
+    rows, marker, _ = read_around(db, START + 10000, rows=5)["logs"]
+    assert rows == expected["logs"][-5:] and marker == 5
+
+
+def test_read_between(result_db):
+    db, _, _ = result_db
+    time_from, time_to = START + 50, START + 60
+
+    correlated = read_between(db, time_from, time_to, rows=30)
+
+    for key, all_rows in _expected(db).items():
+        in_range = [row for row in all_rows if time_from <= row[0] <= time_to]
+        rows, marker, more = correlated[key]
+        assert rows == in_range and marker is None and not more
+
+    rows, _, more = read_between(db, time_from, time_to, rows=10)["logs"]
+    in_range = [row for row in _expected(db)["logs"] if time_from <= row[0] <= time_to]
+    assert rows == in_range[:10] and more
+
+
+def test_new_rows_are_read(result_db):
+    db, writable_db, _ = result_db
+    read_around(db, START)
+
+    _append_rows(writable_db, 400, 100)
+    rows, _, _ = read_around(db, START + 10000, rows=5)["logs"]
+
+    assert rows == _expected(db)["logs"][-5:]
+    assert rows[-1][3] == "log 499"
@@ -0,0 +1,181 @@
+import sqlite3
+from collections import Counter
+from functools import partial
+
+import numpy as np
+import pytest
+
+from result_obj.metrics import Metric
+
+import rollups
+from db import open_db
+from db import database_path
+from utils import bucket_width
+from rollups import open_rollups
+from rollups import update_rollups
+from sidecar import attach_sidecar
+from sidecar import update_sidecar
+from counters import CounterRates
+from counters import read_counter_rates
+
+COUNTERS = ["requests", "errors", "retries"]
+
+
+def _create_result_file(path, count=3000):
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE Metadata (timestamp REAL, argv TEXT, pwd TEXT)")
+    db.execute("CREATE TABLE StatusHistory (timestamp REAL, status TEXT)")
+    db.execute("CREATE TABLE Metrics (timestamp REAL, name TEXT, type TEXT, value)")
+    db.execute("CREATE TABLE Logs (created REAL, msg TEXT)")
+    db.execute("INSERT INTO Metadata VALUES (1.7e9, 'run', '/')")
+
+    # hits over a day, a bit out of order, and some values among them
+    rng = np.random.default_rng(0)
+    timestamps = 1.7e9 + np.sort(rng.random(count)) * 86400 + rng.normal(0, 20, count)
+    rows = []
+    for i, timestamp in enumerate(timestamps.tolist()):
+        if i % 5 == 0:
+            rows.append((timestamp, "load", Metric.TYPE_VALUE, float(i)))
+        else:
+            # the errors only in the second half of the day
+            name = COUNTERS[i % 3]
+            if name != "errors" or i > count // 2:
+                rows.append((timestamp, name, Metric.TYPE_INCREMENT, 1))
+    db.executemany("INSERT INTO Metrics VALUES (?, ?, ?, ?)", rows)
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    sqlite_path = str(tmp_path / "result.sqlite")
+    _create_result_file(sqlite_path)
+
+    db = open_db(sqlite_path)
+    yield db
+    db.close()
+
+
+def _hits(db, name, up_to_rowid=None):
+    rows = db.execute(
+        "SELECT rowid, timestamp FROM Metrics WHERE name = ? AND type = ?",
+        (name, Metric.TYPE_INCREMENT),
+    )
+    return [
+        timestamp
+        for rowid, timestamp in rows
+        if up_to_rowid is None or rowid <= up_to_rowid
+    ]
+
+
+def _expected_rates(hits, x_min=None, x_max=None, max_buckets=200):
+    """`(first, width, before, {bucket: count})` counted in Python."""
+    window = [
+        timestamp
+        for timestamp in hits
+        if (x_min is None or timestamp >= x_min)
+        and (x_max is None or timestamp <= x_max)
+    ]
+    width = bucket_width(max(window) - min(window), max_buckets)
+    first = min(window) - min(window) % width
+    before = 0 if x_min is None else sum(timestamp < x_min for timestamp in hits)
+    counts = Counter(int((timestamp - first) / width) for timestamp in window)
+
+    return first, width, before, counts
+
+
+def _assert_rates(counter_rates, expected):
+    first, width, before, counts = expected
+    assert (counter_rates.first, counter_rates.width) == (first, width)
+    assert counter_rates.before == before
+    assert dict(zip(counter_rates.buckets.tolist(), counter_rates.counts.tolist())) == (
+        counts
+    )
+    assert counter_rates.totals()[-1] == before + sum(counts.values())
+
+
+def _attach_index(db, tmp_path):
+    sidecar_path = update_sidecar(database_path(db), str(tmp_path / "sidecars"))
+    attach_sidecar(db, sidecar_path)
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_all_counters(db, tmp_path, indexed):
+    if indexed:
+        _attach_index(db, tmp_path)
+
+    rates = read_counter_rates(db)
+
+    assert sorted(rates) == sorted(COUNTERS)
+    for name, counter_rates in rates.items():
+        _assert_rates(counter_rates, _expected_rates(_hits(db, name)))
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_zoomed_window_counts_the_hits_before(db, tmp_path, indexed):
+    if indexed:
+        _attach_index(db, tmp_path)
+    x_min, x_max = 1.7e9 + 30000, 1.7e9 + 33600
+
+    rates = read_counter_rates(db, "requests", x_min, x_max)
+
+    assert list(rates) == ["requests"]
+    expected = _expected_rates(_hits(db, "requests"), x_min, x_max)
+    assert expected[2] > 0
+    _assert_rates(rates["requests"], expected)
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_rows_up_to_the_rowid(db, tmp_path, indexed):
+    if indexed:
+        _attach_index(db, tmp_path)
+    x_min, up_to_rowid = 1.7e9 + 20000, 1000
+
+    rates = read_counter_rates(db, x_min=x_min, up_to_rowid=up_to_rowid)
+
+    # no errors in the first rows
+    assert sorted(rates) == ["requests", "retries"]
+    for name, counter_rates in rates.items():
+        hits = _hits(db, name, up_to_rowid)
+        _assert_rates(counter_rates, _expected_rates(hits, x_min))
+
+
+def test_no_counters_in_the_window(db):
+    assert read_counter_rates(db, "errors", x_max=1.7e9 - 1) == {}
+    assert read_counter_rates(db, "load") == {}
+
+
+def test_rollups_count_the_same(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        rollups,
+        "update_rollups",
+        partial(update_rollups, sidecar_dir=str(tmp_path / "sidecars")),
+    )
+    metric_rollups = open_rollups(db)
+    x_min = 1.7e9 + 3600
+
+    from_rollups = read_counter_rates(db, x_min=x_min, rollups=metric_rollups)
+    from_rows = read_counter_rates(db, x_min=x_min)
+
+    assert sorted(from_rollups) == sorted(from_rows)
+    for name, counter_rates in from_rows.items():
+        counter_rollups = from_rollups[name]
+        assert counter_rollups.width == counter_rates.width
+        # the rollup buckets start at whole seconds
+        assert np.array_equal(
+            counter_rollups.bucket_starts(), counter_rates.bucket_starts()
+        )
+        # the hits before `x_min` in the first bucket are in it, not before it
+        assert np.array_equal(counter_rollups.totals(), counter_rates.totals())
+        assert np.array_equal(counter_rollups.counts[1:], counter_rates.counts[1:])
+
+
+def test_add_hits():
+    counter_rates = CounterRates("requests", 100.0, 10.0, before=5)
+    counter_rates.add_hits([101.0, 125.0, 109.9])
+    counter_rates.add_hits([95.0, 125.0, 140.0])
+
+    assert counter_rates.buckets.tolist() == [-1, 0, 2, 4]
+    assert counter_rates.counts.tolist() == [1, 2, 2, 1]
+    assert counter_rates.bucket_starts().tolist() == [90.0, 100.0, 120.0, 140.0]
+    assert counter_rates.totals().tolist() == [6, 8, 10, 11]
@@ -0,0 +1,63 @@
+import numpy as np
+
+from downsample import lttb
+from downsample import min_max_buckets
+
+
+def _spiky_series(length=10000, seed=0):
+    rng = np.random.default_rng(seed)
+    x_axis = np.arange(length, dtype=np.float64)
+    y_axis = rng.normal(0, 1, length)
+    y_axis[length // 3] = 100
+    y_axis[length * 2 // 3] = -100
+
+    return x_axis, y_axis
+
+
+def test_lttb_keeps_the_ends_and_the_spikes():
+    x_axis, y_axis = _spiky_series()
+
+    x_sampled, y_sampled = lttb(x_axis, y_axis, 200)
+
+    assert len(x_sampled) == 200
+    assert x_sampled[0] == 0 and x_sampled[-1] == len(x_axis) - 1
+    assert np.all(np.diff(x_sampled) > 0)
+    assert 3333 in x_sampled and 6666 in x_sampled
+    assert y_sampled.max() == 100 and y_sampled.min() == -100
+
+
+def test_lttb_short_series_unchanged():
+    x_axis, y_axis = _spiky_series(100)
+
+    x_sampled, y_sampled = lttb(x_axis, y_axis, 200)
+
+    assert np.array_equal(x_sampled, x_axis)
+    assert np.array_equal(y_sampled, y_axis)
+
+
+def test_min_max_buckets_keeps_the_extrema_of_each_bucket():
+    x_axis, y_axis = _spiky_series()
+    threshold = 200
+
+    x_sampled, y_sampled = min_max_buckets(x_axis, y_axis, threshold)
+
+    assert len(x_sampled) <= threshold
+    assert np.all(np.diff(x_sampled) > 0)
+    assert y_sampled.max() == 100 and y_sampled.min() == -100
+
+    bucket_starts = np.linspace(0, len(x_axis), threshold // 2 + 1).astype(int)
+    for start, end in zip(bucket_starts[:-1], bucket_starts[1:]):
+        in_bucket = (x_sampled >= start) & (x_sampled < end)
+        assert y_sampled[in_bucket].min() == y_axis[start:end].min()
+        assert y_sampled[in_bucket].max() == y_axis[start:end].max()
+
+
+def test_min_max_buckets_skips_nan():
+    x_axis, y_axis = _spiky_series(1000)
+    y_axis[::3] = np.nan
+
+    _, y_sampled = min_max_buckets(x_axis, y_axis, 100)
+
+    assert not np.isnan(y_sampled).any()
+    assert y_sampled.max() == np.nanmax(y_axis)
+    assert y_sampled.min() == np.nanmin(y_axis)
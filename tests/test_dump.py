@@ -0,0 +1,167 @@
+import io
+import csv
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import dump
+from db import open_db
+from dump import DumpFilter
+from dump import dump_table
+from dump import parse_time
+from dump import dump_metrics_pivoted
+
+
+def _create_result_file(path):
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE Metadata (timestamp REAL, argv TEXT, pwd TEXT)")
+    db.execute("CREATE TABLE MetadataEnvVars (key TEXT, value TEXT)")
+    db.execute("CREATE TABLE Metrics (timestamp REAL, name TEXT, type TEXT, value)")
+    db.execute("CREATE TABLE Logs (created REAL, levelname TEXT, name TEXT, msg TEXT)")
+    db.execute("INSERT INTO Metadata VALUES (1.7e9, 'run', '/')")
+    db.executemany(
+        "INSERT INTO MetadataEnvVars VALUES (?, ?)", [("HOME", "/root"), ("LANG", "C")]
+    )
+    db.executemany(
+        "INSERT INTO Logs VALUES (?, ?, ?, ?)",
+        [
+            (1.7e9 + i, ["INFO", "ERROR"][i % 2], ["app", "db"][i % 3 == 0], f"m {i}")
+            for i in range(20)
+        ],
+    )
+    # a few metrics at the same time, and a span with a start and a stop
+    db.executemany(
+        "INSERT INTO Metrics VALUES (?, ?, ?, ?)",
+        [
+            (1.7e9 + 1, "load", "value", 0.5),
+            (1.7e9 + 1, "hits", "increment", 1),
+            (1.7e9 + 2, "query", "start", 1),
+            (1.7e9 + 3, "query", "stop", 1),
+            (1.7e9 + 3, "load", "value", "high"),
+            (1.7e9 + 2, "hits", "increment", 1),
+            (1.7e9 + 4, "load", "value", 0.25),
+        ],
+    )
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    sqlite_path = str(tmp_path / "result.sqlite")
+    _create_result_file(sqlite_path)
+
+    db = open_db(sqlite_path)
+    yield db
+    db.close()
+
+
+def _dump_csv(db, table_name, dump_filter=None):
+    output = io.StringIO()
+    rows_written = dump_table(db, table_name, output, "csv", dump_filter)
+    rows = list(csv.reader(io.StringIO(output.getvalue())))
+
+    assert rows_written == len(rows) - 1
+    return rows
+
+
+def test_filter_by_time_level_and_name(db):
+    dump_filter = DumpFilter(
+        time_from=1.7e9 + 3, time_to=1.7e9 + 12, levels=["ERROR"], names=["app"]
+    )
+
+    rows = _dump_csv(db, "Logs", dump_filter)
+
+    assert rows[0] == ["created", "levelname", "name", "msg"]
+    assert [row[3] for row in rows[1:]] == ["m 5", "m 7", "m 11"]
+
+
+def test_filter_by_type(db):
+    rows = _dump_csv(db, "Metrics", DumpFilter(types=["start", "stop"]))
+
+    assert [row[1:3] for row in rows[1:]] == [["query", "start"], ["query", "stop"]]
+
+
+def test_filter_by_the_name_of_environment_variables(db):
+    rows = _dump_csv(db, "MetadataEnvVars", DumpFilter(names=["LANG"]))
+
+    assert rows == [["key", "value"], ["LANG", "C"]]
+
+
+@pytest.mark.parametrize(
+    "table_name, dump_filter",
+    [
+        ("MetadataEnvVars", DumpFilter(time_from=0)),
+        ("Metrics", DumpFilter(levels=["ERROR"])),
+        ("Logs", DumpFilter(types=["value"])),
+        ("StatusHistory", DumpFilter(names=["app"])),
+    ],
+)
+def test_filter_without_a_column_is_an_error(table_name, dump_filter):
+    with pytest.raises(ValueError):
+        dump_filter.where(table_name)
+
+
+def test_filter_values_are_parameters():
+    where, parameters = DumpFilter(names=["x' OR '1'='1"]).where("Logs")
+
+    assert where == " WHERE name IN (?)"
+    assert parameters == ["x' OR '1'='1"]
+    assert DumpFilter().where("Logs") == ("", [])
+
+
+def test_batches_in_the_order_stored(db, monkeypatch):
+    monkeypatch.setattr(dump, "BATCH_ROWS", 3)
+
+    output = io.StringIO()
+    rows_written = dump_table(db, "Logs", output, "ndjson")
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert rows_written == len(records) == 20
+    assert [record["msg"] for record in records] == [f"m {i}" for i in range(20)]
+    assert records[0] == {
+        "created": 1.7e9,
+        "levelname": "INFO",
+        "name": "db",
+        "msg": "m 0",
+    }
+
+
+@pytest.mark.parametrize("batch_rows", [1, 2, 10000])
+def test_metrics_pivoted(db, monkeypatch, batch_rows):
+    # the rows at the same time are merged over the batches too
+    monkeypatch.setattr(dump, "BATCH_ROWS", batch_rows)
+
+    output = io.StringIO()
+    rows_written = dump_metrics_pivoted(db, output, "ndjson")
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert rows_written == len(records) == 4
+    columns = ["timestamp", "load", "hits", "query (start)", "query (stop)"]
+    assert records == [
+        dict(zip(columns, [1.7e9 + 1, 0.5, 1, None, None])),
+        dict(zip(columns, [1.7e9 + 2, None, 1, 1, None])),
+        dict(zip(columns, [1.7e9 + 3, "high", None, None, 1])),
+        dict(zip(columns, [1.7e9 + 4, 0.25, None, None, None])),
+    ]
+
+
+def test_metrics_pivoted_with_a_filter(db):
+    output = io.StringIO()
+    dump_filter = DumpFilter(time_from=1.7e9 + 2, names=["load"])
+
+    rows_written = dump_metrics_pivoted(db, output, "csv", dump_filter)
+
+    assert output.getvalue() == "timestamp,load\n1700000003.0,high\n1700000004.0,0.25\n"
+    assert rows_written == 2
+
+
+def test_parse_time():
+    assert parse_time("1700000000.5") == 1700000000.5
+    assert parse_time("2024-01-02T03:04:05") == (
+        datetime(2024, 1, 2, 3, 4, 5).timestamp()
+    )
+    with pytest.raises(ValueError):
+        parse_time("yesterday")
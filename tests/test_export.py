@@ -0,0 +1,165 @@
+import os
+import re
+import gzip
+import json
+import base64
+import sqlite3
+
+import pytest
+
+import export
+from db import open_db
+from db import DatabaseThreads
+from export import _Exporter
+from export import _write_chunk_js
+from export import DATA_DIRECTORY
+from columnar import encode_rows
+from columnar import decode_numbers
+
+
+def _read_chunk_js(output_directory, url):
+    with open(os.path.join(output_directory, url), encoding="ascii") as f:
+        script = f.read()
+
+    match = re.fullmatch(r'exportedChunk\("([^"]+)", "([^"]+)"\);\n', script)
+    assert match and match[1] == url
+
+    return json.loads(gzip.decompress(base64.b64decode(match[2])))
+
+
+def _read_rows(db, after_rowid, limit):
+    return [
+        dict(row)
+        for row in db.execute(
+            "SELECT rowid, created, msg FROM Logs WHERE rowid > ? "
+            "ORDER BY rowid LIMIT ?",
+            (after_rowid, limit),
+        )
+    ]
+
+
+class FakeGrid:
+    """A paginated grid, read from the database when exported."""
+
+    def __init__(self, db, grid_id, count):
+        self.db = db
+        self.id = grid_id
+        self.count = count
+        self.options = {"rowData": []}
+
+    def export_rows(self, chunk_rows):
+        for after_rowid in range(0, self.count, chunk_rows):
+            yield _read_rows(self.db, after_rowid, chunk_rows)
+
+    def export_chunks(self, chunk_rows):
+        for after_rowid in range(0, self.count, chunk_rows):
+            yield _read_rows, (after_rowid, chunk_rows)
+
+
+@pytest.fixture
+def output_directory(tmp_path):
+    os.makedirs(tmp_path / DATA_DIRECTORY)
+    return str(tmp_path)
+
+
+@pytest.fixture
+def db(tmp_path):
+    sqlite_path = str(tmp_path / "result.sqlite")
+    db = sqlite3.connect(sqlite_path)
+    db.execute("CREATE TABLE Logs (created REAL, msg TEXT)")
+    db.executemany(
+        "INSERT INTO Logs VALUES (?, ?)",
+        [(1.7e9 + i, f"message {i}") for i in range(250)],
+    )
+    db.commit()
+    db.close()
+
+    db = open_db(sqlite_path)
+    yield db
+    db.close()
+
+
+def test_chunk_script_round_trip(output_directory):
+    data = {"text": "</script> ü", "numbers": [1, 2.5, None]}
+    path = os.path.join(output_directory, DATA_DIRECTORY, "chunk.js")
+
+    _write_chunk_js(path, data)
+
+    assert _read_chunk_js(output_directory, f"{DATA_DIRECTORY}/chunk.js") == data
+
+
+def test_html_is_escaped_and_server_parts_skipped(output_directory):
+    exporter = _Exporter(output_directory, {})
+    component = {
+        "html_tag": "div",
+        "id": 12,
+        "classes": "p-2",
+        "attrs": {"id": "x", "title": 'a "b"', "target": "_blank", "empty": ""},
+        "text": "<b>",
+        "object_props": [
+            {"html_tag": "span", "text": "shown"},
+            {"html_tag": "span", "text": "hidden", "show": False},
+            {"html_tag": "span", "text": "skipped", "classes": "export-skip"},
+        ],
+    }
+
+    assert exporter.render(component) == (
+        '<div title="a &quot;b&quot;" class="p-2">&lt;b&gt;<span>shown</span></div>'
+    )
+
+
+def test_grid_rows_are_written_in_chunks(output_directory, monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_ROWS", 4)
+    exporter = _Exporter(output_directory, {})
+    rows = [{"a": i, "b": f"row {i}"} for i in range(10)]
+    component = {"vue_type": "grid", "id": 3, "def": {"rowData": rows}}
+
+    placeholder = exporter.render(component)
+
+    assert 'data-export-id="grid-3"' in placeholder
+    grid = exporter.grids["grid-3"]
+    assert "rowData" not in grid["options"]
+    chunks = [_read_chunk_js(output_directory, url) for url in grid["chunks"]]
+    assert chunks == [
+        encode_rows(rows[0:4]),
+        encode_rows(rows[4:8]),
+        encode_rows(rows[8:]),
+    ]
+
+
+def test_chart_series_are_written_apart(output_directory):
+    exporter = _Exporter(output_directory, {})
+    series = [{"name": "load", "data": [[1, 2.0], [2, 3.0]]}, {"name": "empty"}]
+    component = {"vue_type": "chart", "id": 5, "def": {"series": series}}
+
+    exporter.render(component)
+
+    chart = exporter.charts["chart-5"]
+    assert chart["options"]["series"] == [{"name": "load"}, {"name": "empty"}]
+    assert _read_chunk_js(output_directory, chart["data"]) == [[[1, 2.0], [2, 3.0]], []]
+    assert "data" in series[0]  # the page isn't changed
+
+
+@pytest.mark.parametrize("with_workers", [False, True])
+def test_paginated_grid_is_read_from_the_database(
+    db, output_directory, monkeypatch, with_workers
+):
+    monkeypatch.setattr(export, "CHUNK_ROWS", 100)
+    workers = DatabaseThreads(db) if with_workers else None
+    grid = FakeGrid(db, 7, 250)
+    exporter = _Exporter(output_directory, {7: grid}, workers)
+    component = {"vue_type": "grid", "id": 7, "def": {"rowData": []}}
+
+    try:
+        exporter.render(component)
+    finally:
+        if workers is not None:
+            workers.close()
+
+    grid_export = exporter.grids["grid-7"]
+    assert grid_export["options"]["pagination"]
+    rowids = []
+    for url in grid_export["chunks"]:
+        chunk = _read_chunk_js(output_directory, url)
+        rowids += decode_numbers(chunk["columns"]["rowid"]).tolist()
+    assert rowids == list(range(1, 251))
@@ -0,0 +1,173 @@
+import sqlite3
+
+import pytest
+
+from db import open_db
+from db import database_path
+from sidecar import attach_sidecar
+from sidecar import update_sidecar
+from add_section_logs import LogsPager
+from add_section_logs import read_logs
+from add_section_logs import SORT_COLUMNS
+
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+NAMES = ["app", "app.db", "app_db", None, "50%", "worker"]
+
+
+def _create_result_file(path, count=500):
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE Metadata (timestamp REAL, argv TEXT, pwd TEXT)")
+    db.execute("CREATE TABLE StatusHistory (timestamp REAL, status TEXT)")
+    db.execute("CREATE TABLE Metrics (timestamp REAL, name TEXT, type TEXT, value)")
+    db.execute(
+        "CREATE TABLE Logs (created REAL, levelname TEXT, msg TEXT, "
+        "filename TEXT, lineno INTEGER, funcName TEXT, module TEXT, name TEXT, "
+        "pathname TEXT, process INTEGER, processName TEXT, thread INTEGER, "
+        "threadName TEXT)"
+    )
+    db.execute("INSERT INTO Metadata VALUES (1.7e9, 'run', '/')")
+    db.executemany(
+        "INSERT INTO Logs VALUES (?, ?, ?, 'f.py', ?, 'fn', ?, ?, '/f.py', 1, "
+        "'MainProcess', ?, ?)",
+        [
+            (
+                # a few records out of order and at the same time
+                1.7e9 + (i // 3) - (i % 7 == 0),
+                LEVELS[i % len(LEVELS)],
+                f"message {i}",
+                i,
+                f"module{i % 5}",
+                NAMES[i % len(NAMES)],
+                i % 4,
+                None if i % 6 == 0 else f"Thread-{i % 4}",
+            )
+            for i in range(count)
+        ],
+    )
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    sqlite_path = str(tmp_path / "result.sqlite")
+    _create_result_file(sqlite_path)
+
+    db = open_db(sqlite_path)
+    yield db
+    db.close()
+
+
+def _messages(logs_list):
+    return [log["msg"] for log in logs_list]
+
+
+def _all_messages(pager):
+    sql, parameters = pager.select_sql()
+    return _messages(pager.db.execute(sql, parameters))
+
+
+def _query(pager):
+    sql, parameters = pager.select_sql()
+    return pager.db.execute(sql, parameters).fetchall()
+
+
+def _paged_messages(pager):
+    """Messages of all the pages, walked by the keys as "Next" does."""
+    messages = []
+    while True:
+        rows, has_next_page, _, last_key = read_logs(pager.db, *pager.read_arguments())
+        assert len(rows) <= pager.page_size
+        messages += [row["msg"] for row in rows]
+        if not has_next_page:
+            return messages
+
+        pager.previous_keys.append(pager.after_key)
+        pager.after_key = last_key
+
+
+@pytest.mark.parametrize("order_by", list(SORT_COLUMNS))
+@pytest.mark.parametrize("direction", ["ASC", "DESC"])
+def test_pages_walk_the_whole_sorted_query(db, order_by, direction):
+    pager = LogsPager(db, page_size=37)
+    pager.order_by = order_by
+    pager.direction = direction
+
+    assert _paged_messages(pager) == _all_messages(pager)
+
+
+@pytest.mark.parametrize("direction", ["ASC", "DESC"])
+def test_pages_walk_the_sidecar_index(db, tmp_path, direction):
+    attach_sidecar(db, update_sidecar(database_path(db), str(tmp_path / "sidecars")))
+    pager = LogsPager(db, page_size=37)
+    pager.direction = direction
+
+    assert pager.indexed and pager.order_by == "created"
+    assert _paged_messages(pager) == _all_messages(pager)
+
+
+@pytest.mark.parametrize("order_by", ["name", "threadName"])
+def test_sort_keeps_null_first_ascending(db, order_by):
+    pager = LogsPager(db)
+    pager.order_by = order_by
+
+    sql, parameters = pager.select_sql(f"Logs.{order_by}")
+    values = [value for value, in db.execute(sql, parameters)]
+
+    first_value = values.index(next(value for value in values if value is not None))
+    assert all(value is None for value in values[:first_value])
+    assert values[first_value:] == sorted(values[first_value:])
+
+
+def test_next_page_starts_after_the_last_row(db):
+    pager = LogsPager(db, page_size=40)
+    pager.order_by = "levelname"
+
+    first_page = read_logs(db, *pager.read_arguments())
+    rows, has_next_page, _, last_key = first_page
+    assert has_next_page
+    assert last_key == ("DEBUG", 40 * 4 - 3)  # every 4th record, from rowid 1
+
+    pager.after_key = last_key
+    next_rows, _, _, _ = read_logs(db, *pager.read_arguments())
+    assert _all_messages(pager)[40:80] == [row["msg"] for row in next_rows]
+
+
+def test_filters(db):
+    pager = LogsPager(db)
+    pager.level = "ERROR"
+    assert {log["levelname"] for log in _query(pager)} == {"ERROR"}
+
+    # LIKE wildcards in the prefix are matched literally
+    pager = LogsPager(db)
+    pager.name_prefix = "app_"
+    assert {log["name"] for log in _query(pager)} == {"app_db"}
+
+    pager = LogsPager(db)
+    pager.name_prefix = "50%"
+    assert {log["name"] for log in _query(pager)} == {"50%"}
+
+    pager = LogsPager(db)
+    pager.message = "ge 1"
+    assert all("ge 1" in log["msg"] for log in _query(pager))
+    assert len(_query(pager)) == 111  # 1, 10 – 19, 100 – 199
+
+    pager = LogsPager(db)
+    pager.column_filters = {"module": "module3", "threadName": "Thread-1"}
+    pager.created_range = (1.7e9 + 10, 1.7e9 + 100)
+    logs_list = _query(pager)
+    assert logs_list
+    assert {log["module"] for log in logs_list} == {"module3"}
+    assert {log["threadName"] for log in logs_list} == {"Thread-1"}
+    assert all(1.7e9 + 10 <= log["created"] < 1.7e9 + 100 for log in logs_list)
+
+
+def test_filters_are_parameters(db):
+    pager = LogsPager(db)
+    pager.message = "'; DROP TABLE Logs; --"
+    pager.column_filters = {"name": "x' OR '1'='1", "no such column": 1}
+
+    where, parameters = pager.where_clause()
+
+    assert "DROP" not in where and "no such column" not in where
+    assert _query(pager) == []
@@ -0,0 +1,153 @@
+import math
+import sqlite3
+
+import numpy as np
+import pytest
+
+from result_obj.metrics import Metric
+
+import rollups
+from rollups import ROLLUP_WIDTHS
+from rollups import ROLLUP_VALUE_COLUMNS
+from rollups import update_rollups
+
+
+def _create_result_file(path):
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE Metadata (timestamp REAL, argv TEXT, pwd TEXT)")
+    db.execute("CREATE TABLE Metrics (timestamp REAL, name TEXT, type TEXT, value)")
+    db.execute("INSERT INTO Metadata VALUES (1.7e9, 'run', '/')")
+    db.commit()
+
+    return db
+
+
+def _random_metrics(rng, count):
+    """Values, hits and some text values, a bit out of order over 3 days."""
+    timestamps = 1.7e9 + np.sort(rng.random(count)) * 3 * 86400
+    timestamps += rng.normal(0, 30, count)
+
+    rows = []
+    for timestamp in timestamps.tolist():
+        kind = rng.integers(4)
+        if kind == 0:
+            rows.append((timestamp, "hits", Metric.TYPE_INCREMENT, 1))
+        elif kind == 1:
+            rows.append((timestamp, "state", Metric.TYPE_VALUE, "text"))
+        else:
+            value = float(rng.normal(0, 100))
+            rows.append((timestamp, f"value_{kind}", Metric.TYPE_VALUE, value))
+
+    return rows
+
+
+def _read_rollup_table(sidecar_path):
+    sidecar = sqlite3.connect(sidecar_path)
+    cursor = sidecar.execute(
+        f"SELECT width, type, name, bucket, {', '.join(ROLLUP_VALUE_COLUMNS)} "
+        "FROM MetricsRollup"
+    )
+    rollup_table = {
+        tuple(row[:4]): dict(zip(ROLLUP_VALUE_COLUMNS, row[4:])) for row in cursor
+    }
+    sidecar.close()
+
+    return rollup_table
+
+
+def _recompute(db):
+    """The rollups computed from the raw rows, bucket by bucket."""
+    expected = {}
+    cursor = db.execute("SELECT rowid, timestamp, name, type, value FROM Metrics")
+    for rowid, timestamp, name, metric_type, value in cursor:
+        number = value if isinstance(value, (int, float)) else None
+        for width in ROLLUP_WIDTHS:
+            key = (width, metric_type, name, math.floor(timestamp) // width)
+            bucket = expected.setdefault(
+                key,
+                {
+                    "count": 0,
+                    "value_count": 0,
+                    "total": 0.0,
+                    "minimum": None,
+                    "minimum_timestamp": set(),
+                    "maximum": None,
+                    "maximum_timestamp": set(),
+                    "first_timestamp": timestamp,
+                    "last_timestamp": timestamp,
+                    "first_rowid": rowid,
+                    "last_rowid": rowid,
+                },
+            )
+            bucket["count"] += 1
+            bucket["first_timestamp"] = min(bucket["first_timestamp"], timestamp)
+            bucket["last_timestamp"] = max(bucket["last_timestamp"], timestamp)
+            bucket["first_rowid"] = min(bucket["first_rowid"], rowid)
+            bucket["last_rowid"] = max(bucket["last_rowid"], rowid)
+            if number is None:
+                continue
+
+            bucket["value_count"] += 1
+            bucket["total"] += number
+            # any of the rows with the same extreme value will do
+            if bucket["minimum"] is None or number < bucket["minimum"]:
+                bucket["minimum"] = number
+                bucket["minimum_timestamp"] = set()
+            if number == bucket["minimum"]:
+                bucket["minimum_timestamp"].add(timestamp)
+            if bucket["maximum"] is None or number > bucket["maximum"]:
+                bucket["maximum"] = number
+                bucket["maximum_timestamp"] = set()
+            if number == bucket["maximum"]:
+                bucket["maximum_timestamp"].add(timestamp)
+
+    return expected
+
+
+def _assert_same_rollups(rollup_table, expected):
+    assert rollup_table.keys() == expected.keys()
+    for key, bucket in expected.items():
+        for column, value in bucket.items():
+            if column in ("minimum_timestamp", "maximum_timestamp"):
+                # of any row when there are no numbers in the bucket
+                assert not value or rollup_table[key][column] in value, key
+            elif column == "total":
+                assert rollup_table[key][column] == pytest.approx(value), key
+            else:
+                assert rollup_table[key][column] == value, (key, column)
+
+
+def test_incremental_updates_match_a_recomputation(tmp_path, monkeypatch):
+    # small chunks, so the rows of one bucket are merged from several of them
+    monkeypatch.setattr(rollups, "ROLLUP_CHUNK_ROWS", 97)
+
+    sqlite_path = str(tmp_path / "result.sqlite")
+    sidecar_dir = str(tmp_path / "sidecars")
+    db = _create_result_file(sqlite_path)
+    rng = np.random.default_rng(0)
+
+    for _ in range(3):
+        db.executemany(
+            "INSERT INTO Metrics VALUES (?, ?, ?, ?)", _random_metrics(rng, 700)
+        )
+        db.commit()
+        sidecar_path = update_rollups(sqlite_path, sidecar_dir)
+
+        _assert_same_rollups(_read_rollup_table(sidecar_path), _recompute(db))
+
+    db.close()
+
+
+def test_update_without_new_rows_changes_nothing(tmp_path):
+    sqlite_path = str(tmp_path / "result.sqlite")
+    sidecar_dir = str(tmp_path / "sidecars")
+    db = _create_result_file(sqlite_path)
+    rng = np.random.default_rng(1)
+    db.executemany("INSERT INTO Metrics VALUES (?, ?, ?, ?)", _random_metrics(rng, 300))
+    db.commit()
+
+    first = _read_rollup_table(update_rollups(sqlite_path, sidecar_dir))
+    second = _read_rollup_table(update_rollups(sqlite_path, sidecar_dir))
+
+    assert first == second
+    db.close()
@@ -0,0 +1,152 @@
+import re
+import sqlite3
+from functools import partial
+
+import pytest
+
+import search
+from db import open_db
+from search import highlight
+from search import fts_query
+from search import search_terms
+from sidecar import update_search_index
+from add_section_logs import LogsPager
+from add_section_logs import read_logs
+
+MESSAGES = [
+    "connection opened",
+    "Connected to the database",
+    "reconnect in 5 s",
+    "disconnect",
+    'quoted "conn" word',
+    "nothing here",
+]
+
+
+def _create_result_file(path, count=300):
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE Metadata (timestamp REAL, argv TEXT, pwd TEXT)")
+    db.execute("CREATE TABLE StatusHistory (timestamp REAL, status TEXT)")
+    db.execute(
+        "CREATE TABLE Logs (created REAL, levelname TEXT, msg TEXT, "
+        "filename TEXT, lineno INTEGER, funcName TEXT, module TEXT, name TEXT, "
+        "pathname TEXT, process INTEGER, processName TEXT, thread INTEGER, "
+        "threadName TEXT)"
+    )
+    db.execute("INSERT INTO Metadata VALUES (1.7e9, 'run', '/')")
+    db.commit()
+    _append_logs(db, 0, count)
+
+    return db
+
+
+def _append_logs(db, start, count):
+    db.executemany(
+        "INSERT INTO Logs VALUES (?, 'INFO', ?, 'f.py', 1, ?, 'f', 'app', "
+        "'/f.py', 1, 'MainProcess', 1, 'MainThread')",
+        [
+            (
+                1.7e9 + i,
+                f"{MESSAGES[i % len(MESSAGES)]} #{i}",
+                "connect" if i % 7 == 0 else "run",
+            )
+            for i in range(start, start + count)
+        ],
+    )
+    db.commit()
+
+
+@pytest.fixture
+def result_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        search,
+        "update_search_index",
+        partial(update_search_index, sidecar_dir=str(tmp_path / "sidecars")),
+    )
+
+    sqlite_path = str(tmp_path / "result.sqlite")
+    writable_db = _create_result_file(sqlite_path)
+    db = open_db(sqlite_path)
+    yield db, writable_db
+    db.close()
+    writable_db.close()
+
+
+def _expected_rowids(db, prefix, columns=("msg", "pathname", "funcName")):
+    word_re = re.compile(rf"\b{prefix}\w*", re.IGNORECASE)
+    return {
+        rowid
+        for rowid, *texts in db.execute(f"SELECT rowid, {', '.join(columns)} FROM Logs")
+        if any(word_re.search(text) for text in texts)
+    }
+
+
+def _searched_rowids(db, terms):
+    pager = LogsPager(db, page_size=1000)
+    pager.search_terms = terms
+    rows, has_next_page, _, _ = read_logs(db, *pager.read_arguments())
+    assert not has_next_page
+
+    sql, parameters = pager.select_sql("Logs.rowid")
+    return {rowid for rowid, in db.execute(sql, parameters)}, rows
+
+
+def test_search_terms():
+    assert search_terms("conn-pool 'db' 5s") == ["conn", "pool", "db", "5s"]
+    assert search_terms(' "" ') == []
+
+
+def test_fts_query_quotes_the_terms():
+    assert fts_query([]) is None
+    assert fts_query(["connection", "op"]) == '"connection" "op"*'
+    assert fts_query(['a"b', "OR"]) == '"a""b" "OR"*'
+
+
+def test_highlight():
+    assert highlight(None, ["a"]) == ""
+    assert highlight("<conn>", []) == "&lt;conn&gt;"
+    assert highlight("Connected, reconnect <connection>", ["conn"]) == (
+        '<mark class="bg-yellow-200">Connected</mark>, reconnect '
+        '&lt;<mark class="bg-yellow-200">connection</mark>&gt;'
+    )
+
+
+def test_search_matches_word_prefixes(result_db):
+    db, _ = result_db
+
+    rowids, rows = _searched_rowids(db, ["conn"])
+
+    assert rowids == _expected_rowids(db, "conn")
+    assert len(rows) == len(rowids)
+    # the records found by the function name have nothing to mark
+    marked = [row for row in rows if '<mark class="bg-yellow-200">' in row["msg"]]
+    assert len(marked) == len(_expected_rowids(db, "conn", ["msg"]))
+
+
+def test_search_with_all_the_terms(result_db):
+    db, _ = result_db
+
+    rowids, _ = _searched_rowids(db, ["connection", "op"])
+
+    assert rowids == _expected_rowids(db, "connection") & _expected_rowids(db, "op")
+    assert rowids
+
+
+def test_syntax_of_the_input_is_not_an_error(result_db):
+    db, _ = result_db
+
+    for text in ['"conn', "conn AND", "NEAR(", "*", "a:b"]:
+        terms = search_terms(text)
+        if terms:
+            _searched_rowids(db, terms)
+
+
+def test_new_rows_are_searched(result_db):
+    db, writable_db = result_db
+    rowids, _ = _searched_rowids(db, ["conn"])
+
+    _append_logs(writable_db, 300, 60)
+    new_rowids, _ = _searched_rowids(db, ["conn"])
+
+    assert new_rowids > rowids
+    assert new_rowids == _expected_rowids(db, "conn")
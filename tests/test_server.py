@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from server import ReportCache
+
+
+class FakePage:
+    """What `ReportCache` uses of a justpy page."""
+
+    def __init__(self, sqlite_path, payload_bytes):
+        self.sqlite_path = sqlite_path
+        self.payload = "x" * payload_bytes
+        self.components = []
+        self.builds = 0
+        self.removed = False
+
+    def build_list(self):
+        self.builds += 1
+        return [self.payload]
+
+    def delete_components(self):
+        self.components = []
+
+    def remove_page(self):
+        self.removed = True
+
+
+class FakeConnection:
+    def __init__(self, name, closed):
+        self.name = name
+        self.closed = closed
+
+    def close(self):
+        self.closed.append(self.name)
+
+
+class FakeComponent:
+    def __init__(self, nbytes):
+        self.full_x_axis = np.zeros(nbytes // 8)
+
+
+@pytest.fixture
+def result_files(tmp_path):
+    paths = []
+    for name in "abcd":
+        path = tmp_path / f"{name}.sqlite"
+        path.write_bytes(b"run")
+        paths.append(str(path))
+
+    return paths
+
+
+def _cache(payload_bytes=100, **kwargs):
+    def build_report(sqlite_path):
+        return FakePage(sqlite_path, payload_bytes)
+
+    return ReportCache(build_report, **kwargs)
+
+
+def test_least_recently_used_page_is_evicted(result_files):
+    a, b, c, _ = result_files
+    cache = _cache(max_pages=2)
+
+    page_a = cache.get(a)
+    page_b = cache.get(b)
+    assert cache.get(a) is page_a  # now b is the least recently used
+    cache.get(c)
+
+    assert list(cache.entries) == [a, c]
+    assert page_b.removed and not page_a.removed
+
+
+def test_hit_doesnt_measure_the_page_again(result_files):
+    a, _, _, _ = result_files
+    cache = _cache()
+
+    page = cache.get(a)
+    builds = page.builds
+    for _ in range(3):
+        assert cache.get(a) is page
+
+    assert page.builds == builds
+
+
+def test_pages_over_the_size_are_evicted(result_files):
+    a, b, c, d = result_files
+    cache = _cache(payload_bytes=1000, max_bytes=3500)
+
+    for path in (a, b, c):
+        cache.get(path)
+    assert len(cache.entries) == 3
+
+    cache.get(d)
+    assert list(cache.entries) == [b, c, d]
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_newest_page_is_kept_over_the_size(result_files):
+    a, b, _, _ = result_files
+    cache = _cache(payload_bytes=1000, max_bytes=500)
+
+    cache.get(a)
+    cache.get(b)
+
+    assert list(cache.entries) == [b]
+
+
+def test_loaded_sections_grow_the_page(result_files):
+    a, b, _, _ = result_files
+    cache = _cache(payload_bytes=1000, max_bytes=10000)
+    page_a = cache.get(a)
+    cache.get(b)
+
+    # the arrays of the charts count too, see `_arrays_size()`
+    page_b_bytes = cache.entries[b][2]
+    page_a.components.append(FakeComponent(9000))
+    page_a.on_section_loaded()
+
+    assert list(cache.entries) == [a]
+    assert cache.entries[a][2] >= 10000
+    assert cache.total_bytes == cache.entries[a][2]
+    assert page_b_bytes < cache.entries[a][2]
+
+
+def test_changed_file_is_built_again(result_files):
+    a, _, _, _ = result_files
+    cache = _cache()
+    page = cache.get(a)
+
+    with open(a, "ab") as f:
+        f.write(b" appended")
+
+    assert cache.get(a) is not page
+    assert page.removed
+    assert len(cache.entries) == 1
+
+
+def test_evicted_page_closes_its_connections(result_files):
+    a, b, _, _ = result_files
+    cache = _cache(max_pages=1)
+    closed = []
+
+    page = cache.get(a)
+    page.db = FakeConnection("db", closed)
+    page.db_workers = FakeConnection("workers", closed)
+    cache.get(b)
+
+    assert sorted(closed) == ["db", "workers"]
+    assert list(cache.entries) == [b]
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+
+import pytest
+
+import sidecar
+from sidecar import get_meta
+from sidecar import update_sidecar
+from sidecar import update_time_index
+from sidecar import update_search_index
+
+
+def _create_result_file(path, start=1.7e9, logs=100):
+    if os.path.exists(path):
+        os.remove(path)
+
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE Metadata (timestamp REAL, argv TEXT, pwd TEXT)")
+    db.execute("CREATE TABLE StatusHistory (timestamp REAL, status TEXT)")
+    db.execute("CREATE TABLE Metrics (timestamp REAL, name TEXT, type TEXT, value)")
+    db.execute(
+        "CREATE TABLE Logs (created REAL, msg TEXT, pathname TEXT, funcName TEXT)"
+    )
+    db.execute("INSERT INTO Metadata VALUES (?, 'run', '/')", (start,))
+    db.execute("INSERT INTO Metrics VALUES (?, 'load', 'value', 1.0)", (start,))
+    db.commit()
+    _append_logs(db, logs)
+
+    return db
+
+
+def _append_logs(db, count):
+    db.executemany(
+        "INSERT INTO Logs VALUES (?, ?, '/f.py', 'fn')",
+        [(1.7e9 + i, f"message {i}") for i in range(count)],
+    )
+    db.commit()
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "result.sqlite"), str(tmp_path / "sidecars")
+
+
+def _read_sidecar(sidecar_path, sql):
+    sidecar_db = sqlite3.connect(sidecar_path)
+    try:
+        return sidecar_db.execute(sql).fetchall()
+    finally:
+        sidecar_db.close()
+
+
+def _high_water_mark(sidecar_path, table_name):
+    sidecar_db = sqlite3.connect(sidecar_path)
+    try:
+        return get_meta(sidecar_db, f"{table_name}.rowid")
+    finally:
+        sidecar_db.close()
+
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_only_the_new_rows_are_indexed(paths):
+    sqlite_path, sidecar_dir = paths
+    db = _create_result_file(sqlite_path)
+
+    sidecar_path = update_sidecar(sqlite_path, sidecar_dir)
+    assert _high_water_mark(sidecar_path, "LogsByCreated") == 100
+
+    # a row changed after it was indexed stays as it was indexed
+    db.execute("UPDATE Logs SET created = 0 WHERE rowid = 1")
+    _append_logs(db, 50)
+    update_sidecar(sqlite_path, sidecar_dir)
+
+    assert _high_water_mark(sidecar_path, "LogsByCreated") == 150
+    rows = _read_sidecar(
+        sidecar_path, "SELECT created, source_rowid FROM LogsByCreated"
+    )
+    assert len(rows) == 150
+    assert (1.7e9, 1) in rows
+
+
+def test_up_to_date_sidecar_is_not_written(paths):
+    sqlite_path, sidecar_dir = paths
+    db = _create_result_file(sqlite_path)
+    sidecar_path = update_sidecar(sqlite_path, sidecar_dir)
+    update_search_index(sqlite_path, sidecar_dir)
+    content = _read_bytes(sidecar_path)
+
+    update_sidecar(sqlite_path, sidecar_dir)
+    update_time_index(sqlite_path, sidecar_dir)
+    update_search_index(sqlite_path, sidecar_dir)
+    assert _read_bytes(sidecar_path) == content
+
+    # the search tables are updated with the others once they exist
+    _append_logs(db, 1)
+    update_sidecar(sqlite_path, sidecar_dir)
+    assert _high_water_mark(sidecar_path, "LogsSearch") == 101
+
+
+def test_time_index_alone(paths):
+    sqlite_path, sidecar_dir = paths
+    _create_result_file(sqlite_path)
+
+    sidecar_path = update_time_index(sqlite_path, sidecar_dir)
+
+    assert _high_water_mark(sidecar_path, "LogsByCreated") == 100
+    assert _high_water_mark(sidecar_path, "MetricsByName") is None
+
+
+def test_replaced_file_is_indexed_again(paths):
+    sqlite_path, sidecar_dir = paths
+    _create_result_file(sqlite_path)
+    sidecar_path = update_sidecar(sqlite_path, sidecar_dir)
+
+    # a different run with more rows, at the same path
+    _create_result_file(sqlite_path, start=1.8e9, logs=120)
+    update_sidecar(sqlite_path, sidecar_dir)
+
+    assert _read_sidecar(sidecar_path, "SELECT count(*) FROM LogsByCreated") == [(120,)]
+    sidecar_db = sqlite3.connect(sidecar_path)
+    assert get_meta(sidecar_db, "source_start") == 1.8e9
+    sidecar_db.close()
+
+
+def test_truncated_file_is_indexed_again(paths):
+    sqlite_path, sidecar_dir = paths
+    db = _create_result_file(sqlite_path)
+    sidecar_path = update_sidecar(sqlite_path, sidecar_dir)
+
+    db.execute("DELETE FROM Logs WHERE rowid > 40")
+    db.commit()
+    update_sidecar(sqlite_path, sidecar_dir)
+
+    assert _high_water_mark(sidecar_path, "LogsByCreated") == 40
+    assert _read_sidecar(sidecar_path, "SELECT count(*) FROM LogsByCreated") == [(40,)]
+
+
+def test_sidecar_of_another_version_is_indexed_again(paths, monkeypatch):
+    sqlite_path, sidecar_dir = paths
+    _create_result_file(sqlite_path)
+    sidecar_path = update_sidecar(sqlite_path, sidecar_dir)
+
+    monkeypatch.setattr(sidecar, "SIDECAR_VERSION", sidecar.SIDECAR_VERSION + 1)
+    update_time_index(sqlite_path, sidecar_dir)
+
+    sidecar_db = sqlite3.connect(sidecar_path)
+    assert get_meta(sidecar_db, "version") == sidecar.SIDECAR_VERSION
+    # cleared, the metrics are indexed again by the next `update_sidecar()`
+    assert get_meta(sidecar_db, "MetricsByName.rowid") is None
+    sidecar_db.close()
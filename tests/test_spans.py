@@ -0,0 +1,61 @@
+import numpy as np
+
+from spans import Spans
+
+
+def test_stops_close_the_oldest_open_start():
+    # two overlapping calls, then one on its own
+    timestamps = [1, 2, 4, 7, 10, 11]
+    is_start = [True, True, False, False, True, False]
+
+    spans = Spans(timestamps, is_start)
+
+    assert len(spans) == 3
+    assert spans.starts.tolist() == [1, 2, 10]
+    assert spans.stops.tolist() == [4, 7, 11]
+    assert spans.durations.tolist() == [3, 5, 1]
+    assert spans.unclosed == 0
+    assert spans.unmatched_stops == 0
+
+
+def test_unmatched_stops_are_dropped():
+    # the run was started with a call in progress, the first stop has no start
+    timestamps = [1, 2, 3, 4, 5]
+    is_start = [False, True, False, False, True]
+
+    spans = Spans(timestamps, is_start)
+
+    assert spans.unmatched_stops == 2
+    assert spans.starts.tolist() == [2]
+    assert spans.stops.tolist() == [3]
+    assert spans.unclosed == 1
+
+
+def test_in_flight_depth_after_each_event():
+    timestamps = [1, 2, 3, 4, 5, 6]
+    is_start = [True, True, True, False, False, False]
+
+    spans = Spans(timestamps, is_start)
+
+    assert spans.event_timestamps.tolist() == timestamps
+    assert spans.in_flight.tolist() == [1, 2, 3, 2, 1, 0]
+
+
+def test_in_flight_never_below_zero():
+    rng = np.random.default_rng(0)
+    is_start = rng.random(1000) < 0.5
+    timestamps = np.arange(1000, dtype=np.float64)
+
+    spans = Spans(timestamps, is_start)
+
+    assert spans.in_flight.min() >= 0
+    assert np.all(spans.durations >= 0)
+    assert len(spans) + spans.unclosed == np.count_nonzero(is_start)
+    assert len(spans) + spans.unmatched_stops == np.count_nonzero(~is_start)
+
+
+def test_no_events():
+    spans = Spans([], [])
+
+    assert len(spans) == 0
+    assert spans.unclosed == 0 and spans.unmatched_stops == 0
@@ -0,0 +1,46 @@
+import numpy as np
+
+from utils import str_from_ts
+from utils import strs_from_ts
+from utils import iso_str_from_ts
+from utils import iso_strs_from_ts
+
+
+# whole seconds, microseconds on the rounding edges, before 1970 and far ahead
+TIMESTAMPS = [
+    0.0,
+    1.0,
+    1.5,
+    1700000000.0,
+    1700000000.000001,
+    1700000000.0000005,
+    1700000000.9999995,
+    1700000000.123456,
+    -86400.25,
+    4102444800.75,
+]
+
+
+def test_strs_from_ts_like_str_from_ts():
+    expected = [str_from_ts(ts) for ts in TIMESTAMPS]
+
+    assert strs_from_ts(np.array(TIMESTAMPS)) == expected
+
+
+def test_iso_strs_from_ts_like_iso_str_from_ts():
+    expected = [iso_str_from_ts(ts) for ts in TIMESTAMPS]
+
+    assert iso_strs_from_ts(np.array(TIMESTAMPS)) == expected
+
+
+def test_random_timestamps():
+    rng = np.random.default_rng(0)
+    timestamps = 1.7e9 + rng.random(1000) * 1e6
+
+    assert strs_from_ts(timestamps) == [str_from_ts(ts) for ts in timestamps]
+    assert iso_strs_from_ts(timestamps) == [iso_str_from_ts(ts) for ts in timestamps]
+
+
+def test_empty():
+    assert strs_from_ts(np.array([])) == []
+    assert iso_strs_from_ts(np.array([])) == []